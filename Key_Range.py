@@ -1,4 +1,6 @@
 import streamlit as st
+import json
+import math
 import os
 import sys
 import time
@@ -10,53 +12,45 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 if current_dir not in sys.path:
     sys.path.append(current_dir)
 
-from engine_manager import render_sidebar, WAREHOUSE, init_data
+from engine_manager import render_sidebar, WAREHOUSE, init_data, finish_rerun
+from perf_monitor import record
 from style_manager import apply_pro_style
+from selection_manager import sync_masks, build_active_pool
+from dedup_index import DEFAULT_THRESHOLD, find_duplicates, redundant_entries
 
 # ==========================================
 # 1. 核心逻辑：选择范围管理 (修复版)
 # ==========================================
 
+# 关键词网格每页可选的条数 (5 列)
+PAGE_SIZES = [40, 100, 200]
+
 def init_selection_state():
-    """初始化选择状态"""
+    """初始化选择状态：每个类目一个位图 (默认全选)，并与当前词库对齐"""
     if "selected_range" not in st.session_state:
         st.session_state.selected_range = {}
-        # 遍历所有类目
-        for cat in WAREHOUSE.keys():
-            all_words = st.session_state.db_all.get(cat, [])
-            # 初始化字典：词 -> 是否选中 (默认 True)
-            st.session_state.selected_range[cat] = {word: True for word in all_words}
+    sync_masks(st.session_state.selected_range, st.session_state.db_all, WAREHOUSE.keys())
 
 def handle_bulk_selection(cat, action):
     """
     全选/清空/反选 处理函数
-    关键修复：不仅要更新 selected_range 数据，还要强制更新 checkbox 的 widget key
+    位图整体翻转后递增 version，复选框换用新的 key 从位图重新取值，
+    不再逐词改写 widget 状态。
     """
-    all_words = st.session_state.db_all.get(cat, [])
-    
-    for word in all_words:
-        # 复选框的唯一 Key
-        widget_key = f"cb_{cat}_{word}"
-        
-        # 获取当前状态
-        current_state = st.session_state.selected_range[cat].get(word, True)
-        
-        # 计算新状态
-        if action == "all":
-            new_state = True
-        elif action == "none":
-            new_state = False
-        elif action == "invert":
-            new_state = not current_state # 取反
-        else:
-            new_state = current_state
-
-        # 1. 更新后台数据字典
-        st.session_state.selected_range[cat][word] = new_state
-        
-        # 2. 强制更新 Streamlit 组件状态 (这是修复按钮失效的关键!)
-        # 如果组件已经被渲染过，它的 key 会存在于 session_state 中
-        st.session_state[widget_key] = new_state
+    st.session_state.selected_range[cat].apply(action)
+
+def sync_checkbox(cat, i, widget_key):
+    """手动勾选回写到位图"""
+    st.session_state.selected_range[cat].set(i, st.session_state[widget_key])
+
+def get_dedup_report(threshold):
+    """查重报告按 (词库快照, 阈值) 缓存在会话里，词库变化后自动重算"""
+    db = st.session_state.db_all
+    cached = st.session_state.get("dedup_report")
+    if cached is None or cached[0] is not db or cached[1] != threshold:
+        cached = (db, threshold, find_duplicates(db, threshold=threshold))
+        st.session_state.dedup_report = cached
+    return cached[2]
 
 # ===========================
 # 2. 页面配置与初始化
@@ -77,7 +71,38 @@ st.markdown("## Key Range")
 st.caption("勾选你想要发送deepseek润色的关键词范围")
 st.markdown("---")
 
+# 词库查重：精确重复 (规范化后相同) + 近似重复 (MinHash)，类目内与跨类目
+with st.expander("词库查重 (重复 / 近似词)", expanded=False):
+    c_th, c_run = st.columns([3, 1])
+    with c_th:
+        threshold = st.slider("近似阈值 (Jaccard)", 0.3, 1.0, DEFAULT_THRESHOLD, 0.05)
+    with c_run:
+        st.markdown("<div style='margin-top:28px;'></div>", unsafe_allow_html=True)
+        run_dedup = st.button("扫描", key="dedup_run", use_container_width=True)
+
+    if run_dedup or "dedup_report" in st.session_state:
+        report = get_dedup_report(threshold)
+        st.caption(f"{report['terms']} 个词 · 规范化后 {report['unique']} 个 · "
+                   f"精确重复 {len(report['exact'])} 组 · 近似 {len(report['near'])} 对")
+        if report["exact"]:
+            st.dataframe([
+                {"scope": g["scope"], "normalized": g["normalized"],
+                 "entries": " | ".join(f"{e['category']}: {e['term']}" for e in g["entries"])}
+                for g in report["exact"]
+            ], use_container_width=True, hide_index=True)
+            if st.button("从选择范围中剔除精确重复 (保留首次出现)", key="dedup_drop"):
+                for cat, indices in redundant_entries(report).items():
+                    st.session_state.selected_range[cat].deselect(indices)
+                st.rerun()
+        if report["near"]:
+            st.dataframe([
+                {"similarity": p["similarity"], "scope": p["scope"],
+                 "a": f"{p['a']['category']}: {p['a']['term']}", "b": f"{p['b']['category']}: {p['b']['term']}"}
+                for p in report["near"]
+            ], use_container_width=True, hide_index=True)
+
 # 按类目平铺显示
+render_started = time.perf_counter()
 for cat in WAREHOUSE.keys():
     all_words = st.session_state.db_all.get(cat, [])
     if not all_words: continue
@@ -106,47 +131,47 @@ for cat in WAREHOUSE.keys():
                 handle_bulk_selection(cat, "invert")
                 st.rerun()
 
+        # 第二行：检索 + 分页 (只渲染当前页的复选框，翻页不会丢失其他页的勾选)
+        mask = st.session_state.selected_range[cat]
+        c_search, c_size, c_page = st.columns([4, 1, 1])
+        with c_search:
+            query = st.text_input("搜索", key=f"q_{cat}", placeholder="搜索关键词 (支持拼音/首字母)",
+                                  label_visibility="collapsed")
+        matched = mask.search(query)
+        with c_size:
+            page_size = st.selectbox("每页", PAGE_SIZES, key=f"ps_{cat}", label_visibility="collapsed")
+        total_pages = max(1, math.ceil(len(matched) / page_size))
+        page_key = f"pg_{cat}"
+        if st.session_state.get(page_key, 1) > total_pages:
+            st.session_state[page_key] = total_pages
+        with c_page:
+            page = st.number_input("页码", 1, total_pages, key=page_key, label_visibility="collapsed")
+
+        start = (page - 1) * page_size
+        visible = matched[start:start + page_size]
+        st.caption(f"第 {page}/{total_pages} 页 · 匹配 {len(matched)} · 已选 {mask.count()}/{len(all_words)}")
+
         st.markdown("<div style='margin-bottom:15px;'></div>", unsafe_allow_html=True)
 
-        # 第二行：平铺关键词复选框
+        # 第三行：平铺当前页的关键词复选框
         cols = st.columns(5)
-        for i, word in enumerate(all_words):
-            with cols[i % 5]:
-                # 构造唯一 Key
-                w_key = f"cb_{cat}_{word}"
-                
-                # 确保 Session State 里有这个 Key 的初始值 (防止报错)
-                if w_key not in st.session_state:
-                    st.session_state[w_key] = st.session_state.selected_range[cat].get(word, True)
-                
-                # 渲染复选框
-                # 注意：这里不再用 value=... 而是依赖 st.session_state[w_key] 的自动绑定
-                new_val = st.checkbox(word, key=w_key)
-                
-                # 监听手动点击：如果用户手动点了，同步回 selected_range
-                st.session_state.selected_range[cat][word] = new_val
-
+        for slot, i in enumerate(visible):
+            with cols[slot % 5]:
+                # 按下标构造 Key (重复词不再冲突)，批量操作后 version 变化即整体刷新
+                w_key = f"cb_{cat}_{mask.version}_{i}"
+                st.checkbox(all_words[i], key=w_key, value=mask.get(i),
+                            on_change=sync_checkbox, args=(cat, i, w_key))
+
+record("key_range.render", time.perf_counter() - render_started)
 st.markdown("---")
 
 # ===========================
 # 4. 发送指令
 # ===========================
 if st.button("将关键词范围发送至 Work Space", type="primary", use_container_width=True):
-    # 计算当前选中的有效数据
-    final_dispatch = {}
-    total_count = 0
-    
-    for cat, words_dict in st.session_state.selected_range.items():
-        # 这里要重新从 checkboxes 的实际状态取值，确保万无一失
-        selected_list = []
-        for w in words_dict.keys():
-            # 检查组件状态
-            w_key = f"cb_{cat}_{w}"
-            if st.session_state.get(w_key, True): # 默认为 True
-                selected_list.append(w)
-                
-        final_dispatch[cat] = selected_list
-        total_count += len(selected_list)
+    # 计算当前选中的有效数据：直接用位图筛选
+    final_dispatch = build_active_pool(st.session_state.selected_range)
+    total_count = sum(len(v) for v in final_dispatch.values())
     
     # 将过滤后的名单存入 session_state 供其他页面读取
     st.session_state.active_pool = final_dispatch
@@ -154,3 +179,14 @@ if st.button("将关键词范围发送至 Work Space", type="primary", use_conta
     st.toast(f"已选择共计 {total_count} 个关键词进入随机池", icon="🎯")
     time.sleep(1)
     st.switch_page("pages/01_Graphic_Lab.py")
+
+# 导出当前范围，供离线批量生成使用：python batch_generate.py --selection selection.json ...
+st.download_button(
+    "导出关键词范围 (batch_generate --selection)",
+    data=json.dumps(build_active_pool(st.session_state.selected_range), ensure_ascii=False, indent=2),
+    file_name="selection.json",
+    mime="application/json",
+    use_container_width=True
+)
+
+finish_rerun("key_range")
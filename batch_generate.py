@@ -0,0 +1,206 @@
+"""
+离线批量生成 (无需 Streamlit)：
+
+    python batch_generate.py --count 5000 --out runs/kv.jsonl --seed 42 --concurrency 8
+    python batch_generate.py --out runs/kv.jsonl --resume
+
+- 词库来自 WAREHOUSE，可用 --selection 指定 Key Range 导出的关键词范围 ({类目: [词]})；
+- 结果逐条追加写入 JSONL，同名的 .meta.json 记录种子等参数，--resume 时据此重建
+  完全相同的骨架序列并跳过已成功的条目；
+- API Key 读取环境变量 DEEPSEEK_KEY，未设置时按 (AI Offline) 回退；
+  --mock 改连本地模拟服务 (python mock_deepseek_server.py)，用于离线压测。
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+from vocab_store import WAREHOUSE, get_vocab
+from sampling_engine import PoolSampler, assemble_skeleton
+from combination_engine import COMBO_STRATEGIES, ComboGenerator
+from generation_engine import (
+    SYS_PROMPT, DEEPSEEK_BASE_URL, DEFAULT_MODEL, DEFAULT_TEMPERATURE, DEFAULT_CONCURRENCY,
+    make_async_client, iter_polished,
+)
+from prompt_cache import get_cache
+from rate_limiter import DEFAULT_RPM, DEFAULT_TPM, get_scheduler
+from perf_monitor import timer
+from usage_ledger import UsageMeter, get_ledger
+from mock_deepseek_server import MOCK_BASE_URL
+
+# ==========================================
+# 1. 参数与检查点
+# ==========================================
+# 这些参数决定骨架序列，续跑时必须与首次运行一致
+_META_FIELDS = ("count", "seed", "idea", "unique", "selection", "weights", "strategy")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="批量生成 KV 骨架并调用 DeepSeek 润色，结果写入 JSONL")
+    parser.add_argument("--out", required=True, help="输出 JSONL 路径")
+    parser.add_argument("--count", type=int, default=100, help="生成条数")
+    parser.add_argument("--idea", default="", help="Core Idea，拼在每个骨架最前面")
+    parser.add_argument("--selection", help="关键词范围 JSON ({类目: [词]})，缺省为全部词库")
+    parser.add_argument("--weights", help="词权重 JSON ({类目: {词: 权重}})")
+    parser.add_argument("--seed", type=int, help="随机种子 (缺省时随机生成并记录到 meta)")
+    parser.add_argument("--unique", action="store_true", help="同类目的词在整批内尽量不重复")
+    parser.add_argument("--strategy", choices=["random", *COMBO_STRATEGIES], default="random",
+                        help="组合策略：random 为独立随机抽样；round_robin / min_overlap 覆盖组合空间且整批不重复")
+    parser.add_argument("--skeletons-only", action="store_true", help="只输出骨架，不调用 DeepSeek")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="在途请求上限")
+    parser.add_argument("--rpm", type=int, default=DEFAULT_RPM, help="每分钟请求数上限")
+    parser.add_argument("--tpm", type=int, default=DEFAULT_TPM, help="每分钟 token 数上限")
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--temperature", type=float, default=DEFAULT_TEMPERATURE)
+    parser.add_argument("--base-url", default=DEEPSEEK_BASE_URL)
+    parser.add_argument("--mock", nargs="?", const=MOCK_BASE_URL, metavar="URL",
+                        help=f"改连本地模拟服务 (缺省地址 {MOCK_BASE_URL})")
+    parser.add_argument("--reuse-cached", action="store_true", help="命中本地结果缓存时直接复用")
+    parser.add_argument("--budget", type=int, default=0,
+                        help="本次运行的 token 上限 (输入 + 输出，0 不限)；超出后剩余条目记为 budget，--resume 时重试")
+    parser.add_argument("--resume", action="store_true", help="从已有的 JSONL/meta 续跑")
+    parser.add_argument("--report-every", type=float, default=5.0, help="吞吐量汇报间隔 (秒)")
+    return parser.parse_args(argv)
+
+
+def meta_path(out_path):
+    return out_path + ".meta.json"
+
+
+def load_meta(args):
+    """续跑时用 meta 覆盖决定骨架序列的参数；首次运行时写出 meta"""
+    path = meta_path(args.out)
+    if args.resume and os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        for field in _META_FIELDS:
+            setattr(args, field, meta.get(field))
+        return
+    if args.seed is None:
+        args.seed = random.randrange(2**31)
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({field: getattr(args, field) for field in _META_FIELDS}, f, ensure_ascii=False, indent=2)
+
+
+def load_done_ids(out_path):
+    """已成功的条目 id (出错的条目续跑时会重试)"""
+    done = set()
+    if not os.path.exists(out_path):
+        return done
+    with open(out_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue   # 中途崩溃留下的半行
+            if rec.get("status") in ("ok", "skeleton"):
+                done.add(rec["id"])
+    return done
+
+
+def read_json(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+# ==========================================
+# 2. 骨架生成
+# ==========================================
+def build_pool(selection_path):
+    """读取词库，按 selection 过滤 (未出现在 selection 里的类目不参与，与 Key Range 严格模式一致)"""
+    db = get_vocab()
+    if not selection_path:
+        return dict(db)
+    selection = read_json(selection_path)
+    pool = {}
+    for cat in WAREHOUSE:
+        known = set(db.get(cat, ()))
+        pool[cat] = [w for w in selection.get(cat, []) if w in known]
+    return pool
+
+
+def build_skeletons(args):
+    with timer("skeleton.build", items=args.count):
+        pool = build_pool(args.selection)
+        if args.strategy in COMBO_STRATEGIES:
+            # 组合生成器不使用词权重；空间不足 count 时只产出全部剩余组合
+            rows = ComboGenerator(pool, strategy=args.strategy, seed=args.seed).take(args.count)
+        else:
+            weights = read_json(args.weights) if args.weights else None
+            sampler = PoolSampler(pool, weights=weights, seed=args.seed)
+            rows = sampler.draw_batch(args.count, unique=args.unique)
+        return [assemble_skeleton(args.idea, row) for row in rows]
+
+# ==========================================
+# 3. 执行
+# ==========================================
+class Throughput:
+    """按固定间隔向 stderr 汇报进度与 items/sec"""
+
+    def __init__(self, total, every):
+        self.total = total
+        self.every = every
+        self.done = 0
+        self.started = time.perf_counter()
+        self._last = self.started
+
+    def tick(self, force=False):
+        self.done += 0 if force else 1
+        now = time.perf_counter()
+        if force or now - self._last >= self.every:
+            self._last = now
+            rate = self.done / max(now - self.started, 1e-9)
+            print(f"[{self.done}/{self.total}] {rate:.2f} items/sec", file=sys.stderr, flush=True)
+
+
+async def run(args):
+    skeletons = build_skeletons(args)
+    done_ids = load_done_ids(args.out) if args.resume else set()
+    jobs = [(i + 1, sk) for i, sk in enumerate(skeletons) if sk and i not in done_ids]
+    print(f"{len(skeletons)} skeletons, {len(done_ids)} already done, {len(jobs)} to run (seed={args.seed})",
+          file=sys.stderr)
+
+    meter = Throughput(len(jobs), args.report_every)
+    with open(args.out, "a", encoding="utf-8") as out:
+        def write(rec):
+            out.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            out.flush()
+            meter.tick()
+
+        if args.skeletons_only:
+            for idx, sk in jobs:
+                write({"id": idx - 1, "skeleton": sk, "text": "", "status": "skeleton"})
+        else:
+            api_key = os.environ.get("DEEPSEEK_KEY")
+            if args.mock:
+                client = make_async_client(api_key or "mock-key", base_url=args.mock)
+            else:
+                client = make_async_client(api_key, base_url=args.base_url) if api_key else None
+            usage = UsageMeter(get_ledger(), batch=os.path.basename(args.out), budget=args.budget,
+                               model=args.model)
+            async for res in iter_polished(
+                client, SYS_PROMPT, jobs, concurrency=args.concurrency,
+                model=args.model, temperature=args.temperature,
+                cache=get_cache(), reuse_cached=args.reuse_cached,
+                scheduler=get_scheduler(rpm=args.rpm, tpm=args.tpm), meter=usage
+            ):
+                write({"id": res["idx"] - 1, "skeleton": res["skeleton"], "text": res["text"],
+                       "status": res["status"], "cached": res["cached"],
+                       "ttft": res["ttft"], "elapsed": res["elapsed"], "usage": res["usage"]})
+            spent = usage.summary()
+            print(f"tokens: {spent['prompt_tokens']} in + {spent['completion_tokens']} out "
+                  f"(~¥{spent['cost']:.4f}), {spent['refused']} refused by budget", file=sys.stderr)
+    meter.tick(force=True)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    load_meta(args)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,313 @@
+"""
+热点路径基准测试 (无需 Streamlit 服务，也不访问网络)：
+
+    python benchmark_suite.py                                   # 全部规模 (每类目 100 ~ 100k 词)
+    python benchmark_suite.py --sizes 100 1000 --save benchmark_baseline.json
+    python benchmark_suite.py --check benchmark_baseline.json --tolerance 1.5
+
+- 词库为按种子生成的合成数据，12 个类目同规模；
+- DeepSeek 流式接口用进程内的模拟客户端代替，只测本地的调度/渲染开销；
+- --save 写出机器可读的基线，--check 与基线比较，中位数超过 基线 x tolerance 时以非 0 退出。
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import types
+
+from vocab_store import WAREHOUSE
+import vocab_snapshot
+from selection_manager import build_masks, build_active_pool
+from sampling_engine import PoolSampler, assemble_skeleton
+from combination_engine import COMBO_STRATEGIES, ComboGenerator
+from task_queue import TaskQueue
+from script_builder import PAYLOAD_ENCODINGS, build_safe_wait_script
+from task_parser import parse_tasks, task_texts
+from generation_engine import SYS_PROMPT, polish_batch
+from stream_renderer import ThrottledRenderer
+from perf_monitor import get_recorder
+
+# ==========================================
+# 1. 合成数据
+# ==========================================
+DEFAULT_SIZES = (100, 1000, 10000, 100000)
+DEFAULT_SEED = 20240601
+NOISE_FLOOR_MS = 1.0    # 低于该差值 (毫秒) 的变化视为噪声，不算回退
+
+_CJK = [chr(c) for c in range(0x4E00, 0x4E00 + 2500)]
+_LATIN = "abcdefghijklmnopqrstuvwxyz"
+
+
+def synthetic_vocab(size, seed=DEFAULT_SEED):
+    """{类目: tuple(词)}，中文词与英文短语约 3:1"""
+    rng = random.Random(f"{seed}-{size}")
+    vocab = {}
+    for cat in WAREHOUSE:
+        words = []
+        for i in range(size):
+            if rng.random() < 0.75:
+                words.append("".join(rng.choices(_CJK, k=rng.randint(2, 6))))
+            else:
+                words.append(" ".join("".join(rng.choices(_LATIN, k=rng.randint(3, 8)))
+                                      for _ in range(rng.randint(1, 3))).title())
+        vocab[cat] = tuple(words)
+    return vocab
+
+
+def synthetic_results(n, seed=DEFAULT_SEED):
+    """模拟 Work Space 的润色结果 (带 '**方案N：**' 前缀，少量带错误尾注)"""
+    rng = random.Random(seed)
+    texts = []
+    for i in range(n):
+        body = "".join(rng.choices(_CJK, k=rng.randint(60, 150)))
+        tail = " (Connection error)" if rng.random() < 0.05 else ""
+        texts.append(f"**方案{i + 1}：** {body}{tail}")
+    return texts
+
+# ==========================================
+# 2. 模拟 DeepSeek 流式接口
+# ==========================================
+class _MockStream:
+    def __init__(self, text, chunk_chars, delay):
+        self._parts = [text[i:i + chunk_chars] for i in range(0, len(text), chunk_chars)]
+        self._delay = delay
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self._parts:
+            raise StopAsyncIteration
+        if self._delay:
+            await asyncio.sleep(self._delay)
+        content = self._parts.pop(0)
+        delta = types.SimpleNamespace(content=content)
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(delta=delta)], usage=None)
+
+
+class MockStreamingClient:
+    """与 AsyncOpenAI 的 chat.completions.create(stream=True) 接口兼容的本地替身"""
+
+    def __init__(self, reply_chars=300, chunk_chars=4, delay=0.0):
+        self.reply_chars = reply_chars
+        self.chunk_chars = chunk_chars
+        self.delay = delay
+        self.chat = types.SimpleNamespace(completions=types.SimpleNamespace(create=self._create))
+
+    async def _create(self, **kwargs):
+        seed = kwargs["messages"][-1]["content"]
+        text = (seed * (self.reply_chars // max(len(seed), 1) + 1))[:self.reply_chars]
+        return _MockStream(text, self.chunk_chars, self.delay)
+
+
+class _NullTarget:
+    def markdown(self, text):
+        pass
+
+# ==========================================
+# 3. 计时
+# ==========================================
+def measure(fn, repeat=5, setup=None):
+    """运行 repeat 次 (每次前可选 setup)，返回毫秒级的中位数/最小值"""
+    samples = []
+    for _ in range(repeat):
+        state = setup() if setup else None
+        started = time.perf_counter()
+        fn(state) if setup else fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return {"median_ms": round(statistics.median(samples), 4), "min_ms": round(min(samples), 4), "repeat": repeat}
+
+
+def _repeat_for(size):
+    return 20 if size <= 1000 else 5 if size <= 10000 else 3
+
+# ==========================================
+# 4. 基准项
+# ==========================================
+def bench_selection(size, results):
+    vocab = synthetic_vocab(size)
+    repeat = _repeat_for(size)
+    masks = build_masks(vocab, WAREHOUSE.keys())
+
+    # handle_bulk_selection：对每个类目做 全选 / 清空 / 反选
+    def bulk():
+        for mask in masks.values():
+            mask.apply("none")
+            mask.apply("all")
+            mask.apply("invert")
+    results[f"selection.bulk[size={size}]"] = measure(bulk, repeat)
+
+    # Key Range 的分发循环：位图 -> active_pool
+    for mask in masks.values():
+        mask.apply("all")
+    results[f"selection.dispatch[size={size}]"] = measure(lambda: build_active_pool(masks), repeat)
+
+    if size <= 10000:   # 检索键需要逐词生成拼音，只测到 10k
+        mask = masks["Mood"]
+        mask.search("a")
+        results[f"selection.search[size={size}]"] = measure(lambda: mask.search("ab"), repeat)
+    return vocab
+
+
+def bench_sampling(size, vocab, results):
+    repeat = _repeat_for(size)
+    rng = random.Random(size)
+    weights = {cat: {w: rng.uniform(0.5, 3.0) for w in words} for cat, words in vocab.items()}
+    # 带权类目需要预建 alias 表，等权时构造几乎无开销
+    results[f"sampling.compile_weighted[size={size}]"] = measure(
+        lambda: PoolSampler(vocab, weights=weights, seed=1), repeat)
+    samplers = {"": PoolSampler(vocab, seed=1), "_weighted": PoolSampler(vocab, weights=weights, seed=1)}
+
+    # smart_pick 的替代：整批抽取 + 拼装
+    def draw(sampler, unique):
+        rows = sampler.draw_batch(100, unique=unique)
+        return [assemble_skeleton("核心创意", row) for row in rows]
+    for suffix, sampler in samplers.items():
+        results[f"sampling.draw100{suffix}[size={size}]"] = measure(lambda: draw(sampler, False), repeat)
+        results[f"sampling.draw100_unique{suffix}[size={size}]"] = measure(lambda: draw(sampler, True), repeat)
+
+    # 覆盖组合空间的生成器 (每次新建，包含已发出集合与词对计数桶的初始化)
+    for strategy in COMBO_STRATEGIES:
+        results[f"sampling.combo100_{strategy}[size={size}]"] = measure(
+            lambda: [assemble_skeleton("核心创意", row)
+                     for row in ComboGenerator(vocab, strategy=strategy, seed=1).take(100)], repeat)
+
+
+def bench_vocab_snapshot(size, vocab, results, workdir):
+    path = os.path.join(workdir, f"vocab-{size}.snapshot")
+    sources = {"synthetic": [size]}
+    repeat = _repeat_for(size)
+    results[f"vocab.snapshot_write[size={size}]"] = measure(
+        lambda: vocab_snapshot.write_snapshot(path, vocab, sources), repeat)
+
+    def load():
+        snap = vocab_snapshot.open_snapshot(path, sources)
+        try:
+            return {cat: snap.category(cat) for cat in vocab}
+        finally:
+            snap.close()
+    results[f"vocab.snapshot_load[size={size}]"] = measure(load, repeat)
+
+
+def bench_queue(n, results, workdir):
+    texts = synthetic_results(n)
+    repeat = 3
+
+    created = itertools.count()
+
+    def fresh():
+        # 每次 setup 一个新库：workdir 是本次运行独占的临时目录，按序号命名即可
+        return TaskQueue(os.path.join(workdir, f"queue-{n}-{next(created)}.sqlite3"))
+    results[f"queue.enqueue[n={n}]"] = measure(lambda q: q.enqueue(texts), repeat, setup=fresh)
+
+    queue = fresh()
+    queue.enqueue(texts)
+    results[f"queue.page50[n={n}]"] = measure(lambda: queue.page(n // 2, 50), repeat * 5)
+    results[f"queue.counts[n={n}]"] = measure(queue.counts, repeat * 5)
+    results[f"queue.fetch_pending[n={n}]"] = measure(lambda: queue.fetch("pending"), repeat)
+    ids = [t["id"] for t in queue.fetch("pending")]
+    results[f"queue.set_status[n={n}]"] = measure(lambda: queue.set_status(ids, "sent"), repeat)
+
+    # 03_Automation 的清洗 (与页面同一条路径：parse_tasks 单遍解析) + 脚本编码
+    results[f"tasks.clean[n={n}]"] = measure(lambda: task_texts(parse_tasks(enumerate(texts))), repeat)
+    tasks = task_texts(parse_tasks(enumerate(texts)))
+    for encoding in PAYLOAD_ENCODINGS:
+        stats = measure(lambda: build_safe_wait_script(tasks, encoding=encoding), repeat)
+        stats["bytes"] = len(build_safe_wait_script(tasks, encoding=encoding).encode("utf-8"))
+        results[f"tasks.build_script_{encoding}[n={n}]"] = stats
+
+
+def bench_streaming(results, items=32, reply_chars=600, chunk_chars=4):
+    """模拟流式批量润色：测每个 chunk 的本地开销 (回调 + 节流渲染)"""
+    client = MockStreamingClient(reply_chars=reply_chars, chunk_chars=chunk_chars)
+    skeletons = [f"骨架 {i} 主体 动作 场景" for i in range(items)]
+
+    def run(interval_ms):
+        renderer = ThrottledRenderer([_NullTarget() for _ in skeletons], interval_ms=interval_ms)
+        asyncio.run(polish_batch(client, SYS_PROMPT, skeletons, concurrency=8,
+                                 on_delta=renderer.on_delta, on_done=renderer.on_done))
+        renderer.close()
+        return renderer
+
+    chunks = run(0).chunks
+    for interval_ms in (0, 150):
+        stats = measure(lambda: run(interval_ms), 5)
+        stats["chunks"] = chunks
+        stats["us_per_chunk"] = round(stats["median_ms"] * 1000 / max(chunks, 1), 3)
+        results[f"stream.polish_batch[interval_ms={interval_ms}]"] = stats
+
+# ==========================================
+# 5. 入口
+# ==========================================
+def run_suite(sizes):
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in sizes:
+            print(f"size={size} ...", file=sys.stderr, flush=True)
+            vocab = bench_selection(size, results)
+            bench_sampling(size, vocab, results)
+            bench_vocab_snapshot(size, vocab, results, workdir)
+        for n in sorted({min(s, 10000) for s in sizes}):
+            bench_queue(n, results, workdir)
+        bench_streaming(results)
+    return results
+
+
+def check(results, baseline, tolerance):
+    """返回回退项列表 [(名称, 基线 ms, 当前 ms)]"""
+    regressions = []
+    for name, base in baseline.get("results", {}).items():
+        now = results.get(name)
+        if now is None:
+            continue
+        if now["median_ms"] > base["median_ms"] * tolerance and \
+                now["median_ms"] - base["median_ms"] > NOISE_FLOOR_MS:
+            regressions.append((name, base["median_ms"], now["median_ms"]))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="选择/抽样/队列/流式热点路径的基准测试")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES), help="每个类目的词数")
+    parser.add_argument("--save", help="把结果写成基线 JSON")
+    parser.add_argument("--check", help="与基线 JSON 比较")
+    parser.add_argument("--tolerance", type=float, default=1.5, help="允许的中位数倍数")
+    args = parser.parse_args(argv)
+
+    get_recorder().log = False   # 基准数据不写入 perf 日志
+    results = run_suite(args.sizes)
+    report = {
+        "meta": {"python": platform.python_version(), "platform": platform.platform(),
+                 "created": time.strftime("%Y-%m-%dT%H:%M:%S"), "sizes": args.sizes, "seed": DEFAULT_SEED},
+        "results": results,
+    }
+
+    width = max(len(name) for name in results)
+    for name, stats in results.items():
+        print(f"{name:<{width}}  median {stats['median_ms']:>10.3f} ms  min {stats['min_ms']:>10.3f} ms")
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"baseline written to {args.save}", file=sys.stderr)
+
+    if args.check:
+        with open(args.check, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = check(results, baseline, args.tolerance)
+        for name, before, after in regressions:
+            print(f"REGRESSION {name}: {before:.3f} ms -> {after:.3f} ms", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print(f"no regressions (tolerance x{args.tolerance})", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+DeepSeek (OpenAI 兼容) 客户端的进程级复用。
+
+原先每次 rerun / 每个会话都新建 AsyncOpenAI，随之新建 HTTP 连接池，每次交互都要重新
+TCP + TLS 握手。现在 make_async_client 返回一个轻量句柄，真正的客户端在首次请求时
+从 ClientPool 取：同一个 key + base_url 在同一个事件循环里共用一个客户端与连接池
+(长连接保活，装了 h2 时启用 HTTP/2)。
+
+httpx 的异步连接绑定在创建它的事件循环上，不能跨循环复用，所以按事件循环分别缓存；
+job_runner 的工作线程各自保留一个常驻事件循环，后台任务之间的连接因此得以复用。
+"""
+import asyncio
+import hashlib
+import importlib.util
+import threading
+
+# ==========================================
+# 1. 连接池参数
+# ==========================================
+MAX_CONNECTIONS = 32          # 单个客户端的连接上限 (高于最大并发，避免排队等连接)
+MAX_KEEPALIVE = 16            # 保活的空闲连接数
+KEEPALIVE_EXPIRY = 120.0      # 空闲连接保留秒数
+CONNECT_TIMEOUT = 10.0
+READ_TIMEOUT = 120.0          # 流式输出两个片段之间的最长间隔
+HTTP2 = importlib.util.find_spec("h2") is not None   # httpx 的 HTTP/2 依赖 h2 (pip install "httpx[http2]")
+
+
+def _key_id(api_key):
+    """缓存键与指标里只出现 key 的摘要"""
+    return hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:12]
+
+# ==========================================
+# 2. 客户端缓存
+# ==========================================
+class ClientPool:
+    """
+    {(key 摘要, base_url, 事件循环): AsyncOpenAI}，线程安全，可在会话线程与后台任务线程间共享。
+    事件循环关闭后，其下的客户端在下次取用时清理。
+    """
+
+    def __init__(self, max_connections=MAX_CONNECTIONS, max_keepalive=MAX_KEEPALIVE,
+                 keepalive_expiry=KEEPALIVE_EXPIRY, http2=HTTP2):
+        self.max_connections = max_connections
+        self.max_keepalive = max_keepalive
+        self.keepalive_expiry = keepalive_expiry
+        self.http2 = http2
+        self._lock = threading.Lock()
+        self._clients = {}     # key -> (loop, AsyncOpenAI, http_client)
+        self.stats = {"created": 0, "reused": 0, "dropped": 0, "requests": 0, "responses": 0, "versions": {}}
+
+    def get(self, api_key, base_url, loop=None):
+        """当前 (或指定) 事件循环下的共享客户端；须在协程中调用"""
+        loop = loop or asyncio.get_running_loop()
+        key = (_key_id(api_key), base_url, id(loop))
+        with self._lock:
+            self._prune()
+            entry = self._clients.get(key)
+            if entry is not None and entry[0] is loop:
+                self.stats["reused"] += 1
+                return entry[1]
+            client, http_client = self._create(api_key, base_url)
+            self._clients[key] = (loop, client, http_client)
+            self.stats["created"] += 1
+            return client
+
+    def _prune(self):
+        closed = [k for k, (loop, _, _) in self._clients.items() if loop.is_closed()]
+        for k in closed:
+            # 循环已关闭，无法再 aclose；连接随对象回收
+            del self._clients[k]
+        self.stats["dropped"] += len(closed)
+
+    def _create(self, api_key, base_url):
+        from openai import DEFAULT_CONNECTION_LIMITS, AsyncOpenAI, DefaultAsyncHttpxClient, Timeout
+        # 用 SDK 默认值所属的 Limits 类型，不直接依赖某个 httpx 版本
+        limits = type(DEFAULT_CONNECTION_LIMITS)(max_connections=self.max_connections,
+                                                 max_keepalive_connections=self.max_keepalive,
+                                                 keepalive_expiry=self.keepalive_expiry)
+        http_client = DefaultAsyncHttpxClient(
+            limits=limits, http2=self.http2, timeout=Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+            event_hooks={"request": [self._on_request], "response": [self._on_response]},
+        )
+        # 重试交给 rate_limiter.RequestScheduler 统一处理，客户端自身不再重试
+        client = AsyncOpenAI(api_key=api_key, base_url=base_url, max_retries=0, http_client=http_client)
+        return client, http_client
+
+    # --- 指标 ---
+    async def _on_request(self, request):
+        with self._lock:
+            self.stats["requests"] += 1
+
+    async def _on_response(self, response):
+        with self._lock:
+            self.stats["responses"] += 1
+            versions = self.stats["versions"]
+            versions[response.http_version] = versions.get(response.http_version, 0) + 1
+
+    def metrics(self):
+        """
+        {"clients", "created", "reused", "dropped", "requests", "responses", "versions",
+         "connections", "idle", "http2"}；connections / idle 为各连接池当前打开 / 空闲的连接数
+        """
+        with self._lock:
+            entries = list(self._clients.values())
+            result = dict(self.stats, versions=dict(self.stats["versions"]))
+        result.update(clients=len(entries), http2=self.http2, connections=0, idle=0)
+        for _, _, http_client in entries:
+            open_, idle = _connections(http_client)
+            result["connections"] += open_
+            result["idle"] += idle
+        return result
+
+
+def _connections(http_client):
+    """连接池里打开 / 空闲的连接数 (读取 httpcore 连接池，取不到时记 0)"""
+    pool = getattr(getattr(http_client, "_transport", None), "_pool", None)
+    try:
+        conns = list(pool.connections)
+        return len(conns), sum(1 for c in conns if c.is_idle())
+    except Exception:
+        return 0, 0
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def get_pool():
+    """进程级共享的客户端缓存"""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = ClientPool()
+        return _shared
+
+# ==========================================
+# 3. 客户端句柄
+# ==========================================
+class SharedAsyncClient:
+    """
+    make_async_client 返回的句柄：与 AsyncOpenAI 用法相同 (client.chat.completions.create ...)，
+    属性访问时按当前事件循环从 ClientPool 取真正的客户端，可以放心存进会话或跨线程传递。
+    """
+
+    def __init__(self, api_key, base_url, pool=None):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.pool = pool or get_pool()
+
+    def __getattr__(self, name):
+        if name.startswith("_") or name in ("api_key", "base_url", "pool"):
+            raise AttributeError(name)
+        return getattr(self.pool.get(self.api_key, self.base_url), name)
@@ -0,0 +1,236 @@
+"""
+关键词组合生成器：在 active_pool 各类目的笛卡尔积上惰性产出骨架行，尽量覆盖整个组合空间。
+
+    gen = ComboGenerator(pool, strategy="min_overlap", seed=42)
+    rows = gen.take(100)          # 之后再 take 也不会与已发出的组合重复
+
+- round_robin: 每个类目按打乱后的顺序轮转，一轮用完每个词后才重新打乱，词的使用次数均衡；
+- min_overlap: 在轮转的基础上每行生成若干候选，挑与已发出骨架 "同时出现的词对" 最少的一个，
+  减少只差一两个词的近似骨架。
+已发出的组合只记 64 位指纹 (set[int])，词对计数放在定长的 array 桶里，内存与词库大小无关。
+"""
+import hashlib
+import math
+import random
+from array import array
+
+from sampling_engine import SKELETON_ORDER
+
+# ==========================================
+# 1. 参数
+# ==========================================
+COMBO_STRATEGIES = ("round_robin", "min_overlap")
+DEFAULT_CANDIDATES = 8     # min_overlap 每行比较的候选数
+DEFAULT_LOOKAHEAD = 8      # 候选在各类目轮转队列中最多往后看几个词
+PAIR_BUCKET_BITS = 20      # 词对计数桶 2^20 个 (uint32，约 4MB)，冲突只会让打分略偏保守
+MAX_TRIES = 256            # 单行撞上已发出组合时的最大重试次数，之后改走组合空间的步长排列
+_GOLDEN = 0.6180339887     # 步长取组合空间的黄金分割附近，相邻两步的各类目下标都大幅跳动
+
+_MASK64 = (1 << 64) - 1
+_MIX_A = 0x9E3779B97F4A7C15
+_MIX_B = 0xBF58476D1CE4E5B9
+_MIX_C = 0x94D049BB133111EB
+
+# ==========================================
+# 2. 轮转队列
+# ==========================================
+class _Cycle:
+    """
+    单个类目的轮转：惰性 Fisher-Yates 洗牌，只确定实际用到的位置 (构造 O(1)，与词数无关)；
+    一轮取完再重新洗牌。
+    """
+
+    def __init__(self, n, rng):
+        self.n = n
+        self.rng = rng
+        self._reset()
+
+    def _reset(self):
+        self.slots = {}    # 位置 -> 词下标 (未出现的位置 p 上是 p 本身)
+        self.where = {}    # 词下标 -> 位置 (未出现的词 i 在位置 i 上)
+        self.fixed = 0     # [0, fixed) 的位置已洗定
+        self.pos = 0
+
+    def _fix(self, upto):
+        slots, where, rand, n = self.slots, self.where, self.rng.randrange, self.n
+        for q in range(self.fixed, upto):
+            r = rand(q, n)
+            a, b = slots.get(q, q), slots.get(r, r)
+            slots[q], slots[r] = b, a
+            where[b], where[a] = q, r
+        self.fixed = max(self.fixed, upto)
+
+    def window(self, lookahead):
+        """本轮剩余中可供挑选的个数"""
+        return min(lookahead, self.n - self.pos)
+
+    def peek(self, j):
+        p = self.pos + j
+        if p >= self.fixed:
+            self._fix(p + 1)
+        return self.slots[p]
+
+    def take(self, i):
+        """取用词 i：换到当前位置并前进；本轮已用过 (只在重试失败、改走步长排列时发生) 则不动"""
+        pos = self.pos
+        if pos >= self.fixed:
+            self._fix(pos + 1)
+        p = self.where.get(i, i)
+        if p < pos:
+            return
+        # 未洗定的位置上放哪个词不影响之后洗牌的均匀性，直接交换即可
+        slots, where = self.slots, self.where
+        cur = slots[pos]
+        slots[pos], slots[p] = i, cur
+        where[i], where[cur] = pos, p
+        self.pos += 1
+        if self.pos == self.n:
+            self._reset()
+
+# ==========================================
+# 3. 组合生成器
+# ==========================================
+class ComboGenerator:
+    """
+    基于一次 active_pool 快照的组合生成器 (空类目在行中为 None，不参与组合)。
+    同一个实例多次 take / rows 之间共享已发出集合，可跨批次保持不重复；
+    组合空间用尽时 rows 提前结束。
+    """
+
+    def __init__(self, pool, categories=SKELETON_ORDER, strategy="round_robin", seed=None,
+                 candidates=DEFAULT_CANDIDATES, lookahead=DEFAULT_LOOKAHEAD):
+        if strategy not in COMBO_STRATEGIES:
+            raise ValueError(f"Unknown combination strategy: {strategy}")
+        self.rng = random.Random(seed)
+        self.strategy = strategy
+        self.categories = list(categories)
+        self.items = {cat: tuple(pool.get(cat) or ()) for cat in self.categories}
+        self.active = [cat for cat in self.categories if self.items[cat]]
+        self.cycles = [_Cycle(len(self.items[cat]), self.rng) for cat in self.active]
+        self.candidates = max(1, int(candidates))
+        self.lookahead = max(1, int(lookahead))
+        self.issued = set()
+        self.pairs = array("I", bytes(4 << PAIR_BUCKET_BITS)) if strategy == "min_overlap" else None
+        self._keys = [{} for _ in self.active]
+        self._used = [set() for _ in self.active]
+        self._walk = None    # (起点, 步长, 已走步数)，首次重试失败时才确定
+
+    # --- 统计 ---
+    @property
+    def space_size(self):
+        """组合空间大小 (各非空类目词数之积)"""
+        size = 1
+        for cat in self.active:
+            size *= len(self.items[cat])
+        return size if self.active else 0
+
+    def coverage(self):
+        """{类目: 已用过的词占比}"""
+        return {cat: len(used) / len(self.items[cat]) for cat, used in zip(self.active, self._used)}
+
+    # --- 指纹 ---
+    def _key(self, c, i):
+        """类目 c 第 i 个词的 64 位指纹 (按词文本计算，惰性缓存)"""
+        keys = self._keys[c]
+        key = keys.get(i)
+        if key is None:
+            # 词文本取 64 位 blake2b 再按类目混合 (各步都是 64 位上的双射，不丢熵)；
+            # crc32 只有 32 位，十万级词库里就会有词撞上同一指纹，不同组合被当成已发出
+            word = hashlib.blake2b(self.items[self.active[c]][i].encode("utf-8"), digest_size=8).digest()
+            key = (int.from_bytes(word, "little") * _MIX_A ^ (c + 1) * _MIX_B) & _MASK64
+            key ^= key >> 31
+            keys[i] = key = (key * _MIX_C) & _MASK64
+        return key
+
+    def _row_key(self, picks):
+        return sum(self._key(c, i) for c, i in enumerate(picks)) & _MASK64
+
+    def _pair_buckets(self, picks):
+        keys = [self._key(c, i) for c, i in enumerate(picks)]
+        shift = 64 - PAIR_BUCKET_BITS
+        return [(((keys[a] ^ (keys[b] >> 1)) * _MIX_A) & _MASK64) >> shift
+                for a in range(len(keys)) for b in range(a + 1, len(keys))]
+
+    # --- 候选 ---
+    def _candidate(self, spread):
+        """每个类目在轮转队列的前 spread 个词里随机挑一个；spread=0 即纯轮转"""
+        if not spread:
+            return [cyc.peek(0) for cyc in self.cycles]
+        rand = self.rng.randrange
+        return [cyc.peek(rand(cyc.window(spread))) for cyc in self.cycles]
+
+    def _walk_next(self):
+        """
+        随机重试都撞上已发出组合时，沿组合空间的步长排列 (起点 + k x 步长) mod 空间大小 往下走，
+        步长与空间大小互质，k 走满一圈恰好访问每个组合一次；跳过已发出的，走完一圈即组合空间用尽。
+        各次调用共用同一个游标，总开销 O(组合空间)。
+        """
+        size = self.space_size
+        if self._walk is None:
+            stride = max(1, int(size * _GOLDEN))
+            while math.gcd(stride, size) != 1:
+                stride += 1
+            self._walk = [self.rng.randrange(size), stride, 0]
+        walk = self._walk
+        start, stride = walk[0], walk[1]
+        sizes = [len(self.items[cat]) for cat in self.active]
+        while walk[2] < size:
+            n = (start + walk[2] * stride) % size
+            walk[2] += 1
+            picks = []
+            for s in sizes:
+                n, i = divmod(n, s)
+                picks.append(i)
+            if self._row_key(picks) not in self.issued:
+                return picks
+        return None
+
+    def _pick(self):
+        """
+        选出本行各类目的词下标：round_robin 取第一个未发出的候选；
+        min_overlap 比较 candidates 个未发出的候选，取词对计数之和最小的。
+        撞上已发出组合时逐步扩大前瞻窗口重试，MAX_TRIES 次都不行时改走步长排列 (_walk_next)。
+        """
+        wanted = self.candidates if self.pairs is not None else 1
+        best, best_score = None, None
+        for attempt in range(MAX_TRIES):
+            picks = self._candidate(0 if attempt == 0 else self.lookahead * (1 + attempt // 16))
+            if self._row_key(picks) in self.issued:
+                continue
+            if self.pairs is None:
+                return picks
+            pairs = self.pairs
+            score = sum(pairs[b] for b in self._pair_buckets(picks))
+            if best_score is None or score < best_score:
+                best, best_score = picks, score
+            wanted -= 1
+            if wanted <= 0 or best_score == 0:
+                break
+        return best if best is not None else self._walk_next()
+
+    # --- 产出 ---
+    def rows(self, limit=None):
+        """惰性产出 {类目: 词 | None}，最多 limit 行 (None 表示直到组合空间用尽)"""
+        produced = 0
+        space = self.space_size
+        while (limit is None or produced < limit) and len(self.issued) < space:
+            picks = self._pick()
+            if picks is None:
+                return
+            for c, (cyc, i) in enumerate(zip(self.cycles, picks)):
+                cyc.take(i)
+                self._used[c].add(i)
+            self.issued.add(self._row_key(picks))
+            if self.pairs is not None:
+                pairs = self.pairs
+                for b in self._pair_buckets(picks):
+                    if pairs[b] < 0xFFFFFFFF:
+                        pairs[b] += 1
+            row = dict.fromkeys(self.categories)
+            row.update((cat, self.items[cat][i]) for cat, i in zip(self.active, picks))
+            produced += 1
+            yield row
+
+    def take(self, n):
+        """取 n 行 (组合空间不足时少于 n 行)"""
+        return list(self.rows(n))
@@ -0,0 +1,206 @@
+"""
+词库查重：精确重复 (规范化后相同) + 近似重复 (字符 n-gram 的 MinHash / LSH)。
+
+    from dedup_index import find_duplicates
+    report = find_duplicates(get_vocab(), threshold=0.6)
+
+    python dedup_index.py --threshold 0.6      # 命令行输出报告
+
+类目内与跨类目的重复都会报告 (scope = within / cross)。
+"""
+import re
+import unicodedata
+import zlib
+
+import numpy as np
+
+# ==========================================
+# 1. 规范化与切片
+# ==========================================
+DEFAULT_THRESHOLD = 0.6
+DEFAULT_NGRAM = 2
+NUM_PERM = 32          # MinHash 签名长度
+BANDS = 8              # 默认阈值下的 LSH 分段数 (每段 NUM_PERM / BANDS 行)，命中阈值约 (1/8)^(1/4) ≈ 0.6
+MAX_BUCKET = 200       # 同桶词数上限，超过视为过于泛化的片段，跳过以免平方级比对
+
+_SPACE_RE = re.compile(r"\s+")
+_EDGE_PUNCT = " \t-_·•,，.。;；:：/|、"
+
+
+def normalize_term(term):
+    """NFKC (全角转半角) + 忽略大小写 + 合并空白 + 去掉首尾标点"""
+    text = unicodedata.normalize("NFKC", term).casefold()
+    return _SPACE_RE.sub(" ", text).strip(_EDGE_PUNCT)
+
+
+def shingles(norm, n=DEFAULT_NGRAM):
+    """字符 n-gram 集合；首尾加边界符，短词 (如两三个汉字) 也能得到多个片段"""
+    text = "\x02" + norm.replace(" ", "") + "\x03"
+    if len(text) <= n:
+        return {text}
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+def jaccard(a, b):
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+# ==========================================
+# 2. MinHash / LSH
+# ==========================================
+def _minhash(shingle_sets, num_perm, seed):
+    """
+    对每个 shingle 集合计算 MinHash 签名，返回 (num_perm, n) 的 uint64 数组。
+    片段先 crc32 成 32 位整数，再用 multiply-shift 哈希族 ((a*x + b) mod 2^64) >> 32
+    模拟置换；每个置换是一次整列向量运算，按词分段用 minimum.reduceat 取最小值。
+    """
+    lengths = np.fromiter((len(s) for s in shingle_sets), dtype=np.int64, count=len(shingle_sets))
+    starts = np.zeros(len(shingle_sets), dtype=np.int64)
+    np.cumsum(lengths[:-1], out=starts[1:])
+    flat = np.fromiter((zlib.crc32(g.encode("utf-8")) for s in shingle_sets for g in s),
+                       dtype=np.uint64, count=int(lengths.sum()))
+
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, 2**63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+    b = rng.integers(0, 2**63, size=num_perm, dtype=np.uint64)
+    sig = np.empty((num_perm, len(shingle_sets)), dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        for k in range(num_perm):
+            hashed = (flat * a[k] + b[k]) >> np.uint64(32)
+            sig[k] = np.minimum.reduceat(hashed, starts)
+    return sig
+
+
+def lsh_bands(threshold, num_perm=NUM_PERM):
+    """
+    按阈值选分段数：LSH 的 S 曲线拐点约为 (1/b)^(1/r) (b 段、每段 r 行)，
+    在不少于 BANDS 的 num_perm 约数里取拐点不高于 threshold 的最小分段数，保证阈值附近的词对
+    大概率成为候选。阈值 >= 0.6 时为 8 段 x 4 行；0.3~0.55 时为 16 段 x 2 行。
+    """
+    best = num_perm
+    for bands in range(min(BANDS, num_perm), num_perm + 1):
+        if num_perm % bands:
+            continue
+        if (1.0 / bands) ** (bands / num_perm) <= threshold:
+            best = bands
+            break
+    return best
+
+
+def _lsh_candidates(sig, bands, max_bucket):
+    """同一分段签名完全相同的词互为候选，返回 (候选对集合, 被跳过的桶数)"""
+    rows = sig.shape[0] // bands
+    pairs = set()
+    skipped = 0
+    with np.errstate(over="ignore"):
+        for band in range(bands):
+            # 把一个分段的若干行折叠成一个 64 位键
+            key = np.zeros(sig.shape[1], dtype=np.uint64)
+            for row in sig[band * rows:(band + 1) * rows]:
+                key = key * np.uint64(0x100000001B3) ^ row
+            order = np.argsort(key, kind="stable")
+            sorted_key = key[order]
+            starts = np.flatnonzero(np.r_[True, sorted_key[1:] != sorted_key[:-1]])
+            sizes = np.diff(np.r_[starts, len(order)])
+            # 绝大多数桶只有一个词，只在 Python 层遍历多成员的桶
+            multi = sizes > 1
+            skipped += int(np.count_nonzero(sizes > max_bucket))
+            for start, size in zip(starts[multi].tolist(), sizes[multi].tolist()):
+                if size > max_bucket:
+                    continue
+                members = sorted(order[start:start + size].tolist())
+                for x in range(len(members)):
+                    for y in range(x + 1, len(members)):
+                        pairs.add((members[x], members[y]))
+    return pairs, skipped
+
+# ==========================================
+# 3. 查重报告
+# ==========================================
+def _entry(cat, i, term):
+    return {"category": cat, "index": i, "term": term}
+
+
+def _scope(entries):
+    return "within" if len({e["category"] for e in entries}) == 1 else "cross"
+
+
+def find_duplicates(vocab, threshold=DEFAULT_THRESHOLD, ngram=DEFAULT_NGRAM,
+                    num_perm=NUM_PERM, bands=None, max_bucket=MAX_BUCKET, seed=0):
+    """
+    vocab: {类目: [词]}。返回
+        {"exact": [{"normalized", "scope", "entries": [...]}],
+         "near":  [{"similarity", "scope", "a": entry, "b": entry}],
+         "terms", "unique", "skipped_buckets"}
+    entry = {"category", "index", "term"}。近似对只在规范化后不同的词之间报告，
+    每个规范化形式取首次出现的词作代表；相似度为 n-gram 集合的精确 Jaccard。
+    bands 为 None 时按 threshold 选取 (见 lsh_bands)。
+    """
+    groups = {}   # 规范化形式 -> [entry]，dict 保持首次出现顺序
+    total = 0
+    for cat, words in vocab.items():
+        for i, term in enumerate(words):
+            norm = normalize_term(term)
+            if norm:
+                groups.setdefault(norm, []).append(_entry(cat, i, term))
+                total += 1
+
+    exact = [{"normalized": norm, "scope": _scope(entries), "entries": entries}
+             for norm, entries in groups.items() if len(entries) > 1]
+
+    norms = list(groups)
+    sets = [shingles(norm, ngram) for norm in norms]
+    near = []
+    skipped = 0
+    if len(norms) > 1:
+        sig = _minhash(sets, num_perm, seed)
+        pairs, skipped = _lsh_candidates(sig, bands or lsh_bands(threshold, num_perm), max_bucket)
+        for x, y in sorted(pairs):
+            sim = jaccard(sets[x], sets[y])
+            if sim >= threshold:
+                a, b = groups[norms[x]][0], groups[norms[y]][0]
+                near.append({"similarity": round(sim, 3), "scope": _scope([a, b]), "a": a, "b": b})
+        near.sort(key=lambda p: -p["similarity"])
+
+    return {"exact": exact, "near": near, "terms": total, "unique": len(norms), "skipped_buckets": skipped}
+
+
+def redundant_entries(report):
+    """精确重复组里除首个之外的条目 {类目: [下标]}，可用于从选择范围中剔除"""
+    result = {}
+    for group in report["exact"]:
+        for e in group["entries"][1:]:
+            result.setdefault(e["category"], []).append(e["index"])
+    return result
+
+# ==========================================
+# 4. 命令行
+# ==========================================
+def main(argv=None):
+    import argparse
+    import json
+    from vocab_store import get_vocab
+
+    parser = argparse.ArgumentParser(description="词库精确/近似重复检测")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="近似重复的 Jaccard 阈值")
+    parser.add_argument("--ngram", type=int, default=DEFAULT_NGRAM)
+    parser.add_argument("--json", action="store_true", help="输出完整 JSON 报告")
+    args = parser.parse_args(argv)
+
+    report = find_duplicates(get_vocab(), threshold=args.threshold, ngram=args.ngram)
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return
+    print(f"{report['terms']} terms, {report['unique']} unique after normalization")
+    for group in report["exact"]:
+        where = ", ".join(f"{e['category']}[{e['index']}] {e['term']}" for e in group["entries"])
+        print(f"EXACT ({group['scope']}): {where}")
+    for pair in report["near"]:
+        a, b = pair["a"], pair["b"]
+        print(f"NEAR  {pair['similarity']:.2f} ({pair['scope']}): "
+              f"{a['category']}/{a['term']}  ~  {b['category']}/{b['term']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,75 +1,43 @@
 import streamlit as st
 import os
+import time
 
-# ==========================================
-# 1. 本地仓库映射 (已移除 Text Studio 相关路径)
-# ==========================================
-WAREHOUSE = {
-    # --- Graphic Core ---
-    "Subject":       "data/graphic/subjects.txt",
-    "Action":        "data/graphic/actions.txt",
-    "Lighting":        "data/graphic/lighting.txt",
-    "LensLanguage":     "data/graphic/lens_language.txt",
-    
-    # --- Style Matrix ---
-    "Reference":   "data/graphic/styles_reference.txt",
-    "Color":         "data/graphic/styles_color.txt",
-    "Scene":       "data/graphic/styles_scene.txt",
-    "Composition":   "data/graphic/styles_composition.txt",
-    "Elements":        "data/graphic/styles_elements.txt",
-    "LookLike":        "data/graphic/styles_lookLike.txt",
-    
-    # --- Atmosphere ---
-    "Mood":          "data/common/moods.txt",
-    "Usage":         "data/common/usage.txt"
-}
+from vocab_store import WAREHOUSE, PATH_TO_KEY, read_local_file, get_vocab, get_counts, save_list
+from perf_monitor import get_recorder, current_session
+from usage_ledger import get_ledger, today
+from client_pool import get_pool
 
 # ==========================================
-# 2. 数据读取与初始化
+# 1. 数据读取与初始化 (仓库映射与共享缓存见 vocab_store)
 # ==========================================
-def read_local_file(filepath):
-    """直接读取本地 txt 文件"""
-    if os.path.exists(filepath):
-        try:
-            with open(filepath, "r", encoding="utf-8") as f:
-                return [line.strip() for line in f.readlines() if line.strip()]
-        except:
-            return []
-    return []
-
 def init_data():
-    if "db_all" not in st.session_state:
-        st.session_state.db_all = {}
-        
-    for key, path in WAREHOUSE.items():
-        if key not in st.session_state.db_all or not st.session_state.db_all[key]:
-            data = read_local_file(path)
-            st.session_state.db_all[key] = data if data else []
+    """挂载进程级共享词库的只读视图 (文件未变化时不产生任何磁盘读取)"""
+    with get_recorder().timer("init_data"):
+        st.session_state.db_all = get_vocab()
 
 # ==========================================
-# 3. 数据保存
+# 2. 数据保存
 # ==========================================
 def save_data(file_key, new_list):
-    target_key = None
-    for k, v in WAREHOUSE.items():
-        if v == file_key:
-            target_key = k
-            break
-            
-    if target_key:
-        st.session_state.db_all[target_key] = new_list
-    
-    os.makedirs(os.path.dirname(file_key), exist_ok=True)
+    """
+    保存词库：增删走增量日志，其余情况原子整表重写 (见 vocab_store.save_list)，
+    可在多个会话/进程间安全并发。
+    """
     try:
-        with open(file_key, "w", encoding="utf-8") as f:
-            f.write("\n".join(new_list))
+        save_list(file_key, new_list)
     except Exception as e:
         st.error(f"Save failed: {e}")
 
+    # 共享缓存已失效，重新挂载；其他会话在下次 rerun 时自动拿到新数据
+    if file_key in PATH_TO_KEY:
+        st.session_state.db_all = get_vocab()
+
 # ==========================================
-# 4. 侧边栏 (已清理 Text 统计)
+# 3. 侧边栏 (已清理 Text 统计)
 # ==========================================
 def render_sidebar():
+    # 页面在脚本末尾调用 finish_rerun()，两者之差即本次 rerun 耗时
+    st.session_state.rerun_started = time.perf_counter()
     with st.sidebar:
         logo_path = "images/logo/logo.svg"
         
@@ -77,15 +45,16 @@ def render_sidebar():
             st.logo(logo_path, icon_image=logo_path)
         
         if "db_all" in st.session_state:
-            db = st.session_state.db_all
+            # 数量直接取自快照文件头，不依赖词表内容
+            db = get_counts()
             
             # --- Part 1: Graphic ---
             st.markdown("### Graphic Core")
             st.markdown(f"""
-            **Subject:** {len(db.get('Subject', []))}  
-            **Action:** {len(db.get('Action', []))}
-            **Lighting:** {len(db.get('Lighting', []))}
-            **LensLanguage:** {len(db.get('LensLanguage', []))}
+            **Subject:** {db.get('Subject', 0)}  
+            **Action:** {db.get('Action', 0)}
+            **Lighting:** {db.get('Lighting', 0)}
+            **LensLanguage:** {db.get('LensLanguage', 0)}
             """)
             
             st.markdown("---")
@@ -93,20 +62,89 @@ def render_sidebar():
             # --- Part 2: Style ---
             st.markdown("### Style Matrix")
             st.markdown(f"""
-            **Reference:** {len(db.get('Reference', []))}  
-            **LookLike:** {len(db.get('LookLike', []))}  
-            **Scene:** {len(db.get('Scene', []))}  
-            **Color:** {len(db.get('Color', []))}  
-            **Composition:** {len(db.get('Composition', []))}  
-            **Elements:** {len(db.get('Elements', []))}
-            **Usage:** {len(db.get('Usage', []))}
+            **Reference:** {db.get('Reference', 0)}  
+            **LookLike:** {db.get('LookLike', 0)}  
+            **Scene:** {db.get('Scene', 0)}  
+            **Color:** {db.get('Color', 0)}  
+            **Composition:** {db.get('Composition', 0)}  
+            **Elements:** {db.get('Elements', 0)}
+            **Usage:** {db.get('Usage', 0)}
             """)
             
             st.markdown("---")
             
             # --- Part 3: Atmosphere ---
             st.markdown("### Atmosphere")
-            st.markdown(f"**Mood:** {len(db.get('Mood', []))}")
+            st.markdown(f"**Mood:** {db.get('Mood', 0)}")
+
+        render_usage_totals()
+        render_perf_panel()
+
+# ==========================================
+# 4. 用量与性能面板
+# ==========================================
+# 毫秒显示的耗时类指标；其余 (tokens_per_sec 等计数类) 原样显示
+_RATE_METRICS = ("deepseek.tokens_per_sec", "deepseek.batch.tokens_saved")
+
+
+def render_usage_totals():
+    """侧边栏：今日 / 本会话的 DeepSeek token 用量与估算费用 (来自 usage_ledger)"""
+    ledger = get_ledger()
+    day = ledger.totals(day=today())
+    if not day["calls"]:
+        return
+    mine = ledger.totals(session=current_session())
+    st.markdown("---")
+    st.markdown("### Token Usage")
+    st.markdown(f"""
+    **Today:** {day['total_tokens']:,} (¥{day['cost']:.2f})  
+    **Session:** {mine['total_tokens']:,} (¥{mine['cost']:.2f})  
+    **Calls:** {day['calls']}
+    """)
+
+
+def finish_rerun(page):
+    """页面脚本末尾调用，记录本次 rerun 的总耗时"""
+    started = st.session_state.get("rerun_started")
+    if started is not None:
+        get_recorder().record(f"rerun.{page}", time.perf_counter() - started)
+
+
+def _fmt(name, value):
+    if value is None:
+        return "-"
+    return f"{value:.1f}" if name in _RATE_METRICS else f"{value * 1000:.0f}"
+
+
+def render_perf_panel():
+    """侧边栏：本会话 / 整个进程的 p50、p95 (耗时单位 ms)"""
+    recorder = get_recorder()
+    process = recorder.summary()
+    if not process:
+        return
+    session = recorder.summary(session=current_session())
+    st.markdown("---")
+    with st.expander("⏱ Performance", expanded=False):
+        rows = []
+        for name, stats in process.items():
+            mine = session.get(name, {})
+            rows.append({
+                "metric": name,
+                "n": mine.get("n", 0),
+                "p50": _fmt(name, mine.get("p50")),
+                "p95": _fmt(name, mine.get("p95")),
+                "proc n": stats["n"],
+                "proc p50": _fmt(name, stats["p50"]),
+                "proc p95": _fmt(name, stats["p95"]),
+            })
+        st.dataframe(rows, use_container_width=True, hide_index=True)
+        st.caption(f"耗时单位 ms，tokens_per_sec 为估算值 · 日志：{recorder.path}")
+        pool = get_pool().metrics()
+        if pool["created"]:
+            versions = " / ".join(f"{v} × {n}" for v, n in sorted(pool["versions"].items())) or "-"
+            st.caption(f"HTTP 连接池：{pool['clients']} 个客户端 (新建 {pool['created']} · 复用 {pool['reused']}) · "
+                       f"连接 {pool['connections']} (空闲 {pool['idle']}) · {pool['requests']} 次请求 · {versions}"
+                       + ("" if pool["http2"] else " · HTTP/2 未启用 (缺少 h2)"))
 
 # ==========================================
 # 5. 图库扫描
@@ -0,0 +1,438 @@
+import asyncio
+import importlib.util
+import json
+import re
+import time
+
+from client_pool import SharedAsyncClient
+from perf_monitor import get_recorder
+from prompt_cache import cache_key, strip_header, with_header
+from rate_limiter import estimate_tokens
+
+# ==========================================
+# 1. 默认参数 & 指令模板
+# ==========================================
+DEEPSEEK_BASE_URL = "https://api.deepseek.com"
+DEFAULT_MODEL = "deepseek-chat"
+DEFAULT_TEMPERATURE = 0.85
+DEFAULT_CONCURRENCY = 4
+EST_OUTPUT_TOKENS = 300    # 150 字以内的描述词，按输出上限预估
+DEFAULT_BATCH_SIZE = 1     # 每个请求打包的骨架数，1 表示逐条请求
+MAX_BATCH_SIZE = 8
+
+# --- DeepSeek 创意总监指令 (DJI/GoPro 风格适配) ---
+SYS_PROMPT = """你是一名曾服务于 DJI 和 GoPro 和 Apple等顶级消费电子公司的资深创意总监。
+    任务：将给定的【关键词】转化为极具冲击力的产品 Key Visual (KV) 预热海报描述词。
+    规则：
+    1. 必须保留用户输入的关键词，并理解关键词的属性分类
+    2. 将不同类别的描述词先按：{这是一张[图片属性]，图中描述了用“镜头语言”拍摄的“主体”在“地点”发生了“动作”}
+    这一基本顺序描述出主干,其它关键词补充在最后
+    3. 整体服务于关键词中提到的核心卖点和核心创意点（如有提到）
+    """
+
+
+def build_user_prompt(sk, idx):
+    """单个骨架的用户指令"""
+    return f"【视觉骨架】：{sk} \n 请基于此骨架生成一段 150 字以内的专业 KV 描述词，以 '**方案{idx}：**' 开头。"
+
+
+# 打包模式追加在 sys_prompt 之后：要求按 JSON 返回，便于拆回逐条结果
+BATCH_SYS_SUFFIX = """
+    本次会一次给出多个【视觉骨架】，每个带有编号 id。请逐个独立完成上述任务，
+    只输出一个 json 对象，格式为 {"items": [{"id": 编号, "text": "150 字以内的 KV 描述词"}]}，
+    每个 id 恰好一条，text 中不要包含 '**方案N：**' 前缀。
+    """
+
+
+def build_batch_prompt(items):
+    """多个 (idx, 骨架) 打包成一条用户指令"""
+    lines = [f"{{\"id\": {idx}, \"skeleton\": {json.dumps(sk, ensure_ascii=False)}}}" for idx, sk in items]
+    return "【视觉骨架列表】(json)：\n" + "\n".join(lines) + f"\n请输出 {len(items)} 条结果。"
+
+
+def make_async_client(api_key, base_url=DEEPSEEK_BASE_URL):
+    """
+    异步 OpenAI 客户端句柄 (见 client_pool)：同一个 key + base_url 在进程内共用连接池，
+    rerun 与会话之间不再重复握手。openai 在首次请求时才由 client_pool 导入，方便无 openai 环境下复用本模块；
+    重试交给 rate_limiter.RequestScheduler 统一处理，客户端自身不再重试。
+    """
+    if importlib.util.find_spec("openai") is None:    # 未安装时在这里报错，调用方回退离线模式
+        raise ImportError("openai is not installed")
+    return SharedAsyncClient(api_key, base_url)
+
+# ==========================================
+# 2. 单条润色
+# ==========================================
+async def polish_one(client, sys_prompt, sk, idx, model=DEFAULT_MODEL,
+                     temperature=DEFAULT_TEMPERATURE, on_delta=None, cache=None, reuse_cached=False,
+                     scheduler=None, meter=None):
+    """
+    流式润色单个骨架，返回结果字典：
+    - text:    最终文本 (失败时回退为 '(Error)' / '(AI Offline)' / '(Over Budget)' 骨架)
+    - status:  ok / error / offline / budget
+    - ttft:    首 token 延迟 (秒)，未收到任何 token 时为 None
+    - elapsed: 总耗时 (秒)
+    - cached:  是否直接由本地缓存回放
+    - batch:   打包请求的批号 (见 polish_group)，逐条请求时为 None
+    - usage:   {"prompt_tokens", "completion_tokens", "estimated"}，没有发出请求时为 None
+    on_delta(delta) 在每个流式片段到达时被调用。
+    传入 cache 时成功结果会写入缓存；reuse_cached=True 时优先回放缓存。
+    传入 scheduler 时请求经由其限速，并在首个 token 之前的失败上按退避策略重试。
+    传入 meter (usage_ledger.UsageMeter) 时先按预估占用预算，超出预算则不发请求；结束后按实际 usage 记账，
+    被取消时已流式收到的部分同样记账。
+    """
+    result = _new_result(idx, sk)
+    started = time.perf_counter()
+    key = cache_key(sys_prompt, sk, model, temperature) if cache is not None else None
+
+    if key and reuse_cached and _replay_cached(result, cache, key, started, on_delta):
+        return result
+
+    if client is None:
+        result["text"] = f"**方案{idx}：** {sk} (AI Offline)"
+        result["status"] = "offline"
+        result["elapsed"] = time.perf_counter() - started
+        return result
+
+    user_prompt = build_user_prompt(sk, idx)
+    # 预估本次消耗 (输入 + 输出上限)，供 tokens/min 令牌桶扣减
+    est_tokens = estimate_tokens(sys_prompt + user_prompt) + EST_OUTPUT_TOKENS
+    if meter is not None and not await meter.reserve(est_tokens):
+        result["text"] = f"**方案{idx}：** {sk} (Over Budget)"
+        result["status"] = "budget"
+        result["elapsed"] = time.perf_counter() - started
+        return result
+    parts = []
+    usage = None
+    cancelled = True    # 正常结束或出错时置 False；仍为 True 说明协程被取消
+    try:
+        attempt = 0
+        while True:
+            if scheduler is not None:
+                await scheduler.acquire(est_tokens)
+            try:
+                stream = await client.chat.completions.create(
+                    model=model,
+                    messages=[{"role": "system", "content": sys_prompt},
+                              {"role": "user", "content": user_prompt}],
+                    temperature=temperature,
+                    stream=True,
+                    stream_options={"include_usage": True}
+                )
+                async for chunk in stream:
+                    # include_usage 时最后一个片段 choices 为空，只带 usage
+                    if getattr(chunk, "usage", None) is not None:
+                        usage = chunk.usage
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if not delta:
+                        continue
+                    if result["ttft"] is None:
+                        result["ttft"] = time.perf_counter() - started
+                    parts.append(delta)
+                    if on_delta:
+                        on_delta(delta)
+                break
+            except Exception as e:
+                # 已经输出过内容的流不再重试，避免 placeholder 里出现重复文本
+                delay = scheduler.backoff(e, attempt) if scheduler is not None and not parts else None
+                if delay is None:
+                    raise
+                attempt += 1
+                await asyncio.sleep(delay)
+        result["text"] = "".join(parts)
+        if scheduler is not None:
+            # 按实际输出长度把预估多扣的 token 退回令牌桶
+            scheduler.tokens.refund(EST_OUTPUT_TOKENS - estimate_tokens(result["text"]))
+        if key and result["text"]:
+            cache.put(key, result["text"])
+        cancelled = False
+    except Exception:
+        result["text"] = f"**方案{idx}：** {sk} (Error)"
+        result["status"] = "error"
+        cancelled = False
+    finally:
+        # 取消 (CancelledError) 也要走到这里：已收到的片段照样记账，否则在途预占永远不会释放
+        if usage is not None or parts:
+            result["usage"] = _usage_of(usage, sys_prompt + user_prompt, "".join(parts))
+        if meter is not None:
+            if result["usage"] is not None:
+                meter.commit(est_tokens, result["usage"]["prompt_tokens"], result["usage"]["completion_tokens"],
+                             estimated=result["usage"]["estimated"], idx=idx, model=model,
+                             status="cancelled" if cancelled else result["status"])
+            else:
+                meter.release(est_tokens)
+
+    result["elapsed"] = time.perf_counter() - started
+    _record_call(result, model)
+    return result
+
+
+def _new_result(idx, sk):
+    return {"idx": idx, "skeleton": sk, "text": "", "status": "ok", "ttft": None, "elapsed": None,
+            "cached": False, "batch": None, "usage": None}
+
+
+def _usage_of(usage, prompt_text, completion_text):
+    """服务端 usage -> {"prompt_tokens", "completion_tokens", "estimated"}；没有 usage 时本地估算"""
+    prompt = getattr(usage, "prompt_tokens", None)
+    completion = getattr(usage, "completion_tokens", None)
+    if prompt is None or completion is None:
+        return {"prompt_tokens": estimate_tokens(prompt_text), "completion_tokens": estimate_tokens(completion_text),
+                "estimated": True}
+    return {"prompt_tokens": int(prompt), "completion_tokens": int(completion), "estimated": False}
+
+
+def _replay_cached(result, cache, key, started, on_delta=None):
+    """命中缓存时填好 result 并返回 True"""
+    body = cache.get(key)
+    if body is None:
+        return False
+    result["text"] = with_header(body, result["idx"])
+    result["cached"] = True
+    result["ttft"] = time.perf_counter() - started
+    if on_delta:
+        on_delta(result["text"])
+    result["elapsed"] = time.perf_counter() - started
+    return True
+
+
+def _record_call(result, model):
+    """真实请求的耗时、TTFT、输出速度写入性能日志 (缓存回放与离线不计)"""
+    recorder = get_recorder()
+    recorder.count(f"deepseek.{result['status']}")
+    recorder.record("deepseek.elapsed", result["elapsed"], model=model, status=result["status"])
+    if result["ttft"] is not None:
+        recorder.record("deepseek.ttft", result["ttft"], model=model)
+        generating = result["elapsed"] - result["ttft"]
+        if generating > 0:
+            recorder.record("deepseek.tokens_per_sec", estimate_tokens(result["text"]) / generating, model=model)
+
+# ==========================================
+# 3. 多骨架打包请求
+# ==========================================
+# 逐条请求时每个骨架都要重复发送一遍 sys_prompt；打包后 K 个骨架共用一次 sys_prompt 与一次往返。
+# 回复按 JSON 解析，缺失或解析失败的条目由调用方逐条补发 (polish_one)。
+_FENCE_RE = re.compile(r"^\s*```(?:json)?\s*|\s*```\s*$")
+
+
+def parse_batch_reply(text, ids):
+    """
+    解析打包请求的 JSON 回复，返回 {id: 正文} (不含 '**方案N：**' 前缀)；
+    只保留 ids 中的编号，空文本与无法解析的条目不出现在结果里。
+    """
+    text = _FENCE_RE.sub("", text or "")
+    start, end = text.find("{"), text.rfind("}")
+    try:
+        data = json.loads(text[start:end + 1]) if start >= 0 else None
+    except ValueError:
+        data = None
+    items = data.get("items") if isinstance(data, dict) else None
+    wanted = set(ids)
+    bodies = {}
+    for item in items if isinstance(items, list) else ():
+        if not isinstance(item, dict) or not isinstance(item.get("text"), str):
+            continue
+        try:
+            idx = int(item.get("id"))
+        except (TypeError, ValueError):
+            continue
+        body = strip_header(item["text"]).strip()
+        if idx in wanted and body and idx not in bodies:
+            bodies[idx] = body
+    return bodies
+
+
+async def polish_group(client, sys_prompt, items, batch_no=None, model=DEFAULT_MODEL,
+                       temperature=DEFAULT_TEMPERATURE, scheduler=None, meter=None):
+    """
+    把多个 (idx, 骨架) 打包成一个 JSON 模式请求，返回 (bodies, report)：
+    - bodies: {idx: 正文}，只含解析成功的条目
+    - report: {"batch", "items", "parsed", "fallback", "prompt_tokens", "completion_tokens",
+               "single_prompt_tokens", "tokens_saved", "requests_saved", "elapsed", "error", "usage"}
+    tokens_saved = 逐条请求的输入 token - (本次输入 + 补发条目的输入)，按 estimate_tokens 估算；
+    服务端返回 usage 时按 实际/估算 的比例校准。补发的条目由调用方处理。
+    传入 meter 时整个打包请求占用一次预算并记一笔账 (items = 条目数)；预算不足时不发请求，全部交给补发。
+    """
+    started = time.perf_counter()
+    batch_prompt = sys_prompt + BATCH_SYS_SUFFIX
+    user_prompt = build_batch_prompt(items)
+    batch_est = estimate_tokens(batch_prompt + user_prompt)
+    single_est = {idx: estimate_tokens(sys_prompt + build_user_prompt(sk, idx)) for idx, sk in items}
+    est_tokens = batch_est + EST_OUTPUT_TOKENS * len(items)
+    usage, text, error = None, "", None
+    reserved = meter is None or await meter.reserve(est_tokens)
+    try:
+        if not reserved:
+            raise RuntimeError("over budget")
+        attempt = 0
+        while True:
+            if scheduler is not None:
+                await scheduler.acquire(est_tokens)
+            try:
+                resp = await client.chat.completions.create(
+                    model=model,
+                    messages=[{"role": "system", "content": batch_prompt},
+                              {"role": "user", "content": user_prompt}],
+                    temperature=temperature,
+                    response_format={"type": "json_object"},
+                    stream=False
+                )
+                break
+            except Exception as e:
+                delay = scheduler.backoff(e, attempt) if scheduler is not None else None
+                if delay is None:
+                    raise
+                attempt += 1
+                await asyncio.sleep(delay)
+        text = (resp.choices[0].message.content or "") if resp.choices else ""
+        usage = getattr(resp, "usage", None)
+        if scheduler is not None:
+            scheduler.tokens.refund(EST_OUTPUT_TOKENS * len(items) - estimate_tokens(text))
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    except asyncio.CancelledError:
+        # 非流式请求被取消时拿不到 usage，只释放预占
+        if meter is not None and reserved:
+            meter.release(est_tokens)
+        raise
+
+    bodies = parse_batch_reply(text, [idx for idx, _ in items])
+    spent = _usage_of(usage, batch_prompt + user_prompt, text) if usage is not None or text else None
+    if meter is not None and reserved:
+        if spent is not None:
+            meter.commit(est_tokens, spent["prompt_tokens"], spent["completion_tokens"], estimated=spent["estimated"],
+                         items=len(items), model=model, status="ok" if bodies else "error")
+        else:
+            meter.release(est_tokens)
+    prompt_tokens = getattr(usage, "prompt_tokens", None) or batch_est
+    scale = prompt_tokens / batch_est
+    single_total = sum(single_est.values())
+    fallback_total = sum(v for idx, v in single_est.items() if idx not in bodies)
+    report = {
+        "batch": batch_no, "items": len(items), "parsed": len(bodies), "fallback": len(items) - len(bodies),
+        "prompt_tokens": prompt_tokens, "completion_tokens": getattr(usage, "completion_tokens", None),
+        "single_prompt_tokens": round(single_total * scale),
+        "tokens_saved": round((single_total - batch_est - fallback_total) * scale),
+        "requests_saved": len(bodies) - 1,
+        "elapsed": time.perf_counter() - started, "error": error, "usage": spent,
+    }
+    recorder = get_recorder()
+    recorder.count("deepseek.batch.fallback", report["fallback"])
+    recorder.record("deepseek.batch.elapsed", report["elapsed"], model=model, items=len(items),
+                    parsed=len(bodies))
+    recorder.record("deepseek.batch.tokens_saved", report["tokens_saved"], model=model)
+    return bodies, report
+
+# ==========================================
+# 4. 批量并发润色
+# ==========================================
+async def polish_batch(client, sys_prompt, skeletons, concurrency=DEFAULT_CONCURRENCY,
+                       model=DEFAULT_MODEL, temperature=DEFAULT_TEMPERATURE,
+                       on_delta=None, on_done=None, cache=None, reuse_cached=False, scheduler=None,
+                       batch_size=DEFAULT_BATCH_SIZE, on_batch=None, meter=None):
+    """
+    并发润色一批骨架 (并发上限 concurrency)，结果按输入顺序返回。
+    on_delta(i, delta) / on_done(i, result) 中的 i 为骨架在批次中的下标。
+    batch_size > 1 时每 batch_size 个骨架打包成一个请求 (见 polish_group)，打包的结果整段回调一次
+    on_delta；解析失败的条目逐条补发，凑不成组的单条直接逐条流式请求。每个打包请求结束后调用 on_batch(report)。
+    meter 见 polish_one / polish_group：预算用尽后剩余条目以 status="budget" 返回。
+    """
+    sem = asyncio.Semaphore(max(1, int(concurrency)))
+
+    async def worker(i, sk):
+        async with sem:
+            res = await polish_one(
+                client, sys_prompt, sk, i + 1, model=model, temperature=temperature,
+                on_delta=(lambda d: on_delta(i, d)) if on_delta else None,
+                cache=cache, reuse_cached=reuse_cached, scheduler=scheduler, meter=meter
+            )
+        if on_done:
+            on_done(i, res)
+        return res
+
+    batch_size = max(1, min(int(batch_size), MAX_BATCH_SIZE))
+    if batch_size == 1 or client is None:
+        return await asyncio.gather(*(worker(i, sk) for i, sk in enumerate(skeletons)))
+
+    results = [None] * len(skeletons)
+    todo = []
+    for i, sk in enumerate(skeletons):
+        res = _new_result(i + 1, sk)
+        key = cache_key(sys_prompt, sk, model, temperature) if cache is not None else None
+        if key and reuse_cached and _replay_cached(res, cache, key, time.perf_counter()):
+            results[i] = res
+            if on_delta:
+                on_delta(i, res["text"])
+            if on_done:
+                on_done(i, res)
+        else:
+            todo.append(i)
+
+    async def group_worker(batch_no, group):
+        started = time.perf_counter()
+        async with sem:
+            bodies, report = await polish_group(
+                client, sys_prompt, [(i + 1, skeletons[i]) for i in group], batch_no=batch_no,
+                model=model, temperature=temperature, scheduler=scheduler, meter=meter
+            )
+        elapsed = time.perf_counter() - started
+        # 打包请求的用量按条目平均分摊到各条结果上
+        spent = report["usage"]
+        share = ({"prompt_tokens": spent["prompt_tokens"] // len(group),
+                  "completion_tokens": spent["completion_tokens"] // len(group), "estimated": spent["estimated"]}
+                 if spent else None)
+        missing = []
+        for i in group:
+            body = bodies.get(i + 1)
+            if body is None:
+                missing.append(i)
+                continue
+            res = _new_result(i + 1, skeletons[i])
+            res.update(text=with_header(body, i + 1), ttft=elapsed, elapsed=elapsed, batch=batch_no, usage=share)
+            if cache is not None:
+                cache.put(cache_key(sys_prompt, skeletons[i], model, temperature), body)
+            results[i] = res
+            if on_delta:
+                on_delta(i, res["text"])
+            if on_done:
+                on_done(i, res)
+        if on_batch:
+            on_batch(report)
+        for i, res in zip(missing, await asyncio.gather(*(worker(i, skeletons[i]) for i in missing))):
+            results[i] = res
+
+    async def single_worker(i):
+        results[i] = await worker(i, skeletons[i])
+
+    # 只剩一条的组 (末尾余数) 打包只会多付 JSON 指令开销、失去流式输出，直接逐条请求
+    groups = [todo[k:k + batch_size] for k in range(0, len(todo), batch_size)]
+    await asyncio.gather(*(group_worker(n + 1, group) if len(group) > 1 else single_worker(group[0])
+                           for n, group in enumerate(groups)))
+    return results
+
+
+async def iter_polished(client, sys_prompt, jobs, concurrency=DEFAULT_CONCURRENCY, **kwargs):
+    """
+    流水线式润色：jobs 为 (idx, 骨架) 的可迭代对象 (可以是惰性生成器)，
+    在途请求不超过 concurrency 个，按完成顺序逐条产出结果。
+    适合成千上万条的离线批量任务，不会一次性创建全部协程。
+    """
+    limit = max(1, int(concurrency))
+    pending = set()
+    for idx, sk in jobs:
+        pending.add(asyncio.ensure_future(polish_one(client, sys_prompt, sk, idx, **kwargs)))
+        if len(pending) >= limit:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield task.result()
+    while pending:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            yield task.result()
+
+
+def run_batch(client, sys_prompt, skeletons, **kwargs):
+    """同步入口：在当前线程跑完整个批次 (供 Streamlit 脚本线程调用)"""
+    return asyncio.run(polish_batch(client, sys_prompt, skeletons, **kwargs))
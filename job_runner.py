@@ -0,0 +1,213 @@
+"""
+后台生成任务：DeepSeek 批量润色交给进程级线程池执行，不再依附于某一次脚本运行。
+Streamlit 的任何控件交互或 st.switch_page 都会中断正在执行的脚本，原先在按钮分支里
+run_batch 时在途结果随之丢失；现在页面只提交任务、按 job id 轮询进度，
+结果留在任务表里直到页面取走 (或超过 JOB_TTL)。
+
+    runner = get_runner()
+    job_id = runner.submit(client, SYS_PROMPT, skeletons, session=current_session(), concurrency=4)
+    job = runner.get(job_id)      # 快照：status / done / texts / results ...
+"""
+import asyncio
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from generation_engine import polish_batch
+from perf_monitor import bind_session
+from stream_renderer import DEFAULT_INTERVAL_MS, ThrottledRenderer
+from task_queue import get_queue
+
+# ==========================================
+# 1. 参数
+# ==========================================
+DEFAULT_WORKERS = 2          # 同时运行的任务数 (每个任务内部仍按 concurrency 并发请求)
+JOB_TTL = 6 * 3600           # 结束后的任务在表中保留的秒数
+JOB_STATUSES = ("queued", "running", "done", "failed", "cancelled")
+FINISHED = ("done", "failed", "cancelled")
+MIN_POLL_MS = 250            # 页面轮询任务进度的最短间隔
+
+
+_local = threading.local()
+
+
+def _thread_loop():
+    """工作线程的常驻事件循环：任务之间复用，client_pool 按循环缓存的连接因此不会每个任务重建"""
+    loop = getattr(_local, "loop", None)
+    if loop is None or loop.is_closed():
+        loop = _local.loop = asyncio.new_event_loop()
+    return loop
+
+
+def queueable(results):
+    """可以送进自动化队列的结果文本 (未完成与因预算未发出的条目除外)"""
+    return [r["text"] for r in results if r is not None and r["status"] != "budget"]
+
+# ==========================================
+# 2. 任务表
+# ==========================================
+class JobRunner:
+    """
+    任务表 {job id: 任务}，任务字段：
+    {id, session, status, created, started, finished, total, done, skeletons, texts, results,
+     batch_reports, render_stats, usage, error, send_to_queue, queued, meta}
+    texts 为各条目当前已生成的文本 (按 interval_ms 节流刷新)，results 为已完成条目的结果 dict。
+    所有读写都在锁内进行，get() 返回快照，页面线程与后台线程互不干扰。
+    """
+
+    def __init__(self, workers=DEFAULT_WORKERS, ttl=JOB_TTL):
+        self.ttl = ttl
+        self._pool = ThreadPoolExecutor(max_workers=max(1, int(workers)), thread_name_prefix="kv-job")
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._tasks = {}    # 运行中的任务 id -> (事件循环, asyncio 任务)，用于取消
+
+    def submit(self, client, sys_prompt, skeletons, session=None, interval_ms=DEFAULT_INTERVAL_MS,
+               send_to_queue=False, meta=None, **kwargs):
+        """
+        提交一批骨架，立即返回 job id。kwargs 原样传给 polish_batch (concurrency / cache / scheduler /
+        batch_size / meter ...)；send_to_queue=True 时任务结束后直接把结果写入自动化队列，
+        即使页面已关闭也不会丢失。meta 随任务保存，供页面渲染结果时使用。
+        """
+        skeletons = list(skeletons)
+        job_id = uuid.uuid4().hex[:12]
+        job = {"id": job_id, "session": session, "status": "queued", "created": time.time(), "started": None,
+               "finished": None, "total": len(skeletons), "done": 0, "skeletons": skeletons,
+               "texts": [""] * len(skeletons), "results": [None] * len(skeletons), "batch_reports": [],
+               "render_stats": None, "usage": None, "error": None, "send_to_queue": bool(send_to_queue),
+               "queued": [], "meta": dict(meta or {}), "cancel": False}
+        with self._lock:
+            self._prune()
+            self._jobs[job_id] = job
+        self._pool.submit(self._run, job, client, sys_prompt, interval_ms, kwargs)
+        return job_id
+
+    # --- 查询 ---
+    def get(self, job_id):
+        """任务快照 (不存在或已过期时为 None)"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return self._snapshot(job) if job is not None else None
+
+    def jobs(self, session=None):
+        """按提交时间排列的任务快照；session 不为空时只列该会话的任务"""
+        with self._lock:
+            return [self._snapshot(job) for job in sorted(self._jobs.values(), key=lambda j: j["created"])
+                    if session is None or job["session"] == session]
+
+    @staticmethod
+    def _snapshot(job):
+        return dict(job, texts=list(job["texts"]), results=list(job["results"]),
+                    batch_reports=list(job["batch_reports"]), queued=list(job["queued"]))
+
+    # --- 控制 ---
+    def cancel(self, job_id):
+        """取消排队中或运行中的任务，已完成的条目保留；返回是否有任务被取消"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job["status"] in FINISHED:
+                return False
+            job["cancel"] = True
+            if job["status"] == "queued":
+                job.update(status="cancelled", finished=time.time())
+            handle = self._tasks.get(job_id)
+        if handle is not None:
+            loop, task = handle
+            try:
+                loop.call_soon_threadsafe(task.cancel)
+            except RuntimeError:    # 事件循环刚好结束
+                pass
+        return True
+
+    def forget(self, job_id):
+        """页面取走结果后删除已结束的任务"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and job["status"] in FINISHED:
+                del self._jobs[job_id]
+
+    def _prune(self):
+        cutoff = time.time() - self.ttl
+        for job_id in [k for k, job in self._jobs.items() if job["status"] in FINISHED and job["finished"] < cutoff]:
+            del self._jobs[job_id]
+
+    # --- 执行 (后台线程) ---
+    def _publish(self, job, i, text):
+        with self._lock:
+            job["texts"][i] = text
+
+    def _run(self, job, client, sys_prompt, interval_ms, kwargs):
+        with self._lock:
+            if job["status"] != "queued":   # 排队期间已被取消
+                return
+            job.update(status="running", started=time.time())
+        # 性能日志与用量按提交任务的会话归属
+        bind_session(job["session"])
+        renderer = ThrottledRenderer(list(range(job["total"])), interval_ms=interval_ms,
+                                     render=lambda i, text: self._publish(job, i, text))
+
+        def on_done(i, result):
+            renderer.on_done(i, result)
+            with self._lock:
+                job["results"][i] = result
+                job["done"] += 1
+
+        def on_batch(report):
+            with self._lock:
+                job["batch_reports"].append(report)
+
+        async def main():
+            with self._lock:
+                self._tasks[job["id"]] = (asyncio.get_running_loop(), asyncio.current_task())
+                if job["cancel"]:
+                    raise asyncio.CancelledError
+            return await polish_batch(client, sys_prompt, job["skeletons"], on_delta=renderer.on_delta,
+                                      on_done=on_done, on_batch=on_batch, **kwargs)
+
+        status, error, results = "done", None, None
+        loop = _thread_loop()
+        try:
+            results = loop.run_until_complete(main())
+        except asyncio.CancelledError:
+            status = "cancelled"
+        except Exception as e:
+            status, error = "failed", f"{type(e).__name__}: {e}"
+        finally:
+            # 让已结束的流式响应完成收尾 (异步生成器的 aclose)，循环留给下一个任务
+            loop.run_until_complete(asyncio.sleep(0))
+            bind_session(None)
+        renderer.close()
+        meter = kwargs.get("meter")
+
+        with self._lock:
+            self._tasks.pop(job["id"], None)
+            if results is not None:
+                job["results"] = list(results)
+                job["done"] = len(results)
+            job.update(render_stats=renderer.stats(), usage=meter.summary() if meter is not None else None)
+            texts = queueable(job["results"]) if job["send_to_queue"] else []
+        if texts:
+            try:
+                queued = get_queue().enqueue(texts)
+            except Exception as e:
+                error = error or f"Enqueue failed: {e}"
+                queued = []
+        else:
+            queued = []
+        # status 最后写入：页面看到任务结束时，队列与统计都已就绪
+        with self._lock:
+            job.update(queued=queued, error=error, status=status, finished=time.time())
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def get_runner(workers=DEFAULT_WORKERS):
+    """进程级共享的任务执行器：所有会话的后台生成任务共用一个线程池"""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = JobRunner(workers)
+        return _shared
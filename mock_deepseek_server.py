@@ -0,0 +1,273 @@
+"""
+本地模拟 DeepSeek (OpenAI 兼容) 服务，用于离线压测生成链路：
+
+    python mock_deepseek_server.py --port 8765 --latency 0.8 --token-rate 40 --error-rate 0.02 --rate-limit-rate 0.05
+
+- POST /chat/completions (或 /v1/chat/completions)，支持 stream=True 的 SSE 协议
+  与 stream_options.include_usage；
+- 可配置首 token 延迟、输出速度、5xx 错误率、随机 429 注入，以及服务端 RPM 上限
+  (超过时返回 429 + Retry-After)；
+- response_format = json_object 时按打包请求 (generation_engine.polish_group) 返回
+  {"items": [{"id", "text"}]}，batch_drop_rate 控制随机漏掉条目的概率，用于验证逐条补发；
+- GET /stats 返回请求数、429/5xx 次数、峰值并发与累计 TCP 连接数 (验证客户端连接复用)。
+
+Work Space 中在 secrets 里设置 DEEPSEEK_MOCK = true (或直接写地址) 即改连本服务；
+batch_generate.py 使用 --mock。
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# ==========================================
+# 1. 配置
+# ==========================================
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+MOCK_BASE_URL = f"http://{DEFAULT_HOST}:{DEFAULT_PORT}"
+
+DEFAULT_MOCK_CONFIG = {
+    "latency": 0.5,          # 首 token 前的延迟 (秒)
+    "jitter": 0.2,           # 延迟的随机浮动 (秒)
+    "token_rate": 50.0,      # 输出速度 (tokens/秒)，0 表示不限速
+    "reply_tokens": 120,     # 每次回复的 token 数
+    "error_rate": 0.0,       # 返回 500 的概率
+    "rate_limit_rate": 0.0,  # 随机注入 429 的概率
+    "rpm": 0,                # 服务端每分钟请求上限，0 表示不限
+    "retry_after": 2.0,      # 429 时的 Retry-After (秒)
+    "batch_drop_rate": 0.0,  # JSON 模式下每个条目被漏掉的概率
+}
+
+_HEADER_RE = re.compile(r"\*\*方案\d+：\*\*")
+_BATCH_ID_RE = re.compile(r'"id":\s*(\d+)')
+_FILLER = ("电影级光影", "极简构图", "金属质感", "高对比", "浅景深", "动态模糊", "冷暖撞色", "微距细节",
+           "环境光晕", "产品居中", "留白", "速度感")
+
+# ==========================================
+# 2. 服务状态
+# ==========================================
+class MockState:
+    """线程安全的计数与 RPM 窗口"""
+
+    def __init__(self, config):
+        self.config = config
+        self._lock = threading.Lock()
+        self._window = deque()
+        self.in_flight = 0
+        self.stats = {"requests": 0, "completed": 0, "rate_limited": 0, "errors": 0, "peak_concurrency": 0,
+                      "tokens": 0, "connections": 0}
+
+    def admit(self):
+        """返回 None 表示放行，否则返回 (状态码, Retry-After)"""
+        cfg = self.config
+        now = time.monotonic()
+        with self._lock:
+            self.stats["requests"] += 1
+            while self._window and now - self._window[0] >= 60:
+                self._window.popleft()
+            if cfg["rpm"] and len(self._window) >= cfg["rpm"]:
+                self.stats["rate_limited"] += 1
+                return 429, max(0.1, 60 - (now - self._window[0]))
+            if random.random() < cfg["rate_limit_rate"]:
+                self.stats["rate_limited"] += 1
+                return 429, cfg["retry_after"]
+            if random.random() < cfg["error_rate"]:
+                self.stats["errors"] += 1
+                return 500, None
+            self._window.append(now)
+            self.in_flight += 1
+            self.stats["peak_concurrency"] = max(self.stats["peak_concurrency"], self.in_flight)
+        return None
+
+    def connected(self):
+        with self._lock:
+            self.stats["connections"] += 1
+
+    def release(self, tokens):
+        with self._lock:
+            self.in_flight -= 1
+            self.stats["completed"] += 1
+            self.stats["tokens"] += tokens
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats, in_flight=self.in_flight)
+
+
+def fake_reply(messages, n_tokens):
+    """按用户指令拼一段假的 KV 描述 (保留 '**方案N：**' 开头)，返回 token 列表"""
+    prompt = messages[-1].get("content", "") if messages else ""
+    header = _HEADER_RE.search(prompt)
+    tokens = [header.group(0) + " "] if header else []
+    rng = random.Random(prompt)
+    while len(tokens) < n_tokens:
+        tokens.append(rng.choice(_FILLER) + ("，" if rng.random() < 0.7 else "。"))
+    return tokens[:n_tokens]
+
+def fake_batch_reply(messages, n_tokens, drop_rate):
+    """打包请求：按用户指令里的每个 id 生成一条，返回切成小段的 JSON 文本"""
+    prompt = messages[-1].get("content", "") if messages else ""
+    rng = random.Random(prompt)
+    items = [{"id": int(idx), "text": "".join(fake_reply([{"content": f"{prompt}#{idx}"}], n_tokens))}
+             for idx in _BATCH_ID_RE.findall(prompt) if rng.random() >= drop_rate]
+    text = json.dumps({"items": items}, ensure_ascii=False)
+    return [text[i:i + 8] for i in range(0, len(text), 8)]
+
+# ==========================================
+# 3. HTTP 处理
+# ==========================================
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    state = None   # 由 make_server 注入
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def setup(self):
+        # 每个 TCP 连接调用一次 (keep-alive 的后续请求不再经过这里)
+        super().setup()
+        self.state.connected()
+
+    def _json(self, status, payload, headers=None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _chunk(self, data):
+        self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/stats":
+            self._json(200, self.state.snapshot())
+        elif self.path.rstrip("/") in ("/models", "/v1/models"):
+            self._json(200, {"object": "list", "data": [{"id": "deepseek-chat", "object": "model"}]})
+        else:
+            self._json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        if self.path.rstrip("/") not in ("/chat/completions", "/v1/chat/completions"):
+            self._json(404, {"error": {"message": "not found"}})
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            req = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._json(400, {"error": {"message": "invalid json"}})
+            return
+
+        rejected = self.state.admit()
+        if rejected is not None:
+            status, retry_after = rejected
+            headers = {"Retry-After": f"{retry_after:.1f}"} if retry_after is not None else None
+            kind = "rate_limit_exceeded" if status == 429 else "server_error"
+            self._json(status, {"error": {"message": f"mock {kind}", "type": kind}}, headers)
+            return
+
+        cfg = self.state.config
+        if (req.get("response_format") or {}).get("type") == "json_object":
+            tokens = fake_batch_reply(req.get("messages", []), int(cfg["reply_tokens"]), cfg["batch_drop_rate"])
+        else:
+            tokens = fake_reply(req.get("messages", []), int(cfg["reply_tokens"]))
+        prompt_tokens = sum(len(m.get("content", "")) for m in req.get("messages", [])) // 2 + 1
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(tokens),
+                 "total_tokens": prompt_tokens + len(tokens)}
+        try:
+            time.sleep(max(0.0, cfg["latency"] + random.uniform(-cfg["jitter"], cfg["jitter"])))
+            if req.get("stream"):
+                self._stream(req, tokens, usage)
+            else:
+                self._json(200, self._completion(req, "".join(tokens), usage))
+        except (BrokenPipeError, ConnectionResetError):
+            pass   # 客户端中途断开
+        finally:
+            self.state.release(len(tokens))
+
+    def _completion(self, req, text, usage):
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:12]}", "object": "chat.completion", "created": int(time.time()),
+            "model": req.get("model", "deepseek-chat"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": usage,
+        }
+
+    def _stream(self, req, tokens, usage):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        base = {"id": f"chatcmpl-{uuid.uuid4().hex[:12]}", "object": "chat.completion.chunk",
+                "created": int(time.time()), "model": req.get("model", "deepseek-chat")}
+        include_usage = bool((req.get("stream_options") or {}).get("include_usage"))
+
+        def event(choices, extra=None):
+            payload = dict(base, choices=choices, **(extra or {}))
+            self._chunk(b"data: " + json.dumps(payload, ensure_ascii=False).encode("utf-8") + b"\n\n")
+
+        rate = self.state.config["token_rate"]
+        event([{"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None}])
+        for tok in tokens:
+            if rate:
+                time.sleep(1.0 / rate)
+            event([{"index": 0, "delta": {"content": tok}, "finish_reason": None}])
+        event([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+        if include_usage:
+            event([], {"usage": usage})
+        self._chunk(b"data: [DONE]\n\n")
+        self._chunk(b"")
+
+# ==========================================
+# 4. 启动
+# ==========================================
+def make_server(host=DEFAULT_HOST, port=DEFAULT_PORT, **config):
+    """创建服务 (未启动)；config 覆盖 DEFAULT_MOCK_CONFIG 中的同名字段"""
+    cfg = dict(DEFAULT_MOCK_CONFIG)
+    unknown = set(config) - set(cfg)
+    if unknown:
+        raise ValueError(f"Unknown mock options: {', '.join(sorted(unknown))}")
+    cfg.update(config)
+    handler = type("BoundMockHandler", (MockHandler,), {"state": MockState(cfg)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def start_in_thread(host=DEFAULT_HOST, port=0, **config):
+    """后台线程启动 (port=0 时随机端口)，返回 (server, base_url)；用 server.shutdown() 停止"""
+    server = make_server(host, port, **config)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="本地模拟 DeepSeek (OpenAI 兼容) 流式服务")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    for key, default in DEFAULT_MOCK_CONFIG.items():
+        parser.add_argument("--" + key.replace("_", "-"), dest=key, type=type(default), default=default)
+    args = vars(parser.parse_args(argv))
+    host, port = args.pop("host"), args.pop("port")
+    server = make_server(host, port, **args)
+    print(f"Mock DeepSeek listening on http://{host}:{port}  {json.dumps(args)}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
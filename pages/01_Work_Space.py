@@ -1,9 +1,8 @@
 import streamlit as st
 import sys
 import os
-import random
 import time
-from openai import OpenAI
+import uuid
 
 # ===========================
 # 0. 环境路径设置
@@ -13,8 +12,20 @@ parent_dir = os.path.abspath(os.path.join(current_dir, '..'))
 if parent_dir not in sys.path:
     sys.path.append(parent_dir)
 
-from engine_manager import init_data, render_sidebar
+from engine_manager import init_data, render_sidebar, finish_rerun
+from perf_monitor import timer, current_session
 from style_manager import apply_pro_style
+from generation_engine import (SYS_PROMPT, DEFAULT_CONCURRENCY, DEFAULT_BATCH_SIZE, MAX_BATCH_SIZE,
+                               make_async_client)
+from sampling_engine import PoolSampler, assemble_skeleton
+from combination_engine import COMBO_STRATEGIES, ComboGenerator
+from prompt_cache import get_cache
+from rate_limiter import DEFAULT_RPM, DEFAULT_TPM, get_scheduler
+from task_queue import get_queue
+from stream_renderer import DEFAULT_INTERVAL_MS
+from mock_deepseek_server import MOCK_BASE_URL
+from usage_ledger import BUDGET_SCOPES, UsageMeter, get_ledger
+from job_runner import FINISHED, MIN_POLL_MS, get_runner
 
 # ===========================
 # 1. 页面配置与初始化
@@ -24,43 +35,60 @@ apply_pro_style()
 render_sidebar()
 init_data()
 
+# 进程级共享调度器：所有会话共用同一组 requests/min、tokens/min 限额
+scheduler = get_scheduler(rpm=int(st.secrets.get("DEEPSEEK_RPM", DEFAULT_RPM)),
+                          tpm=int(st.secrets.get("DEEPSEEK_TPM", DEFAULT_TPM)))
+
 client = None
-if "DEEPSEEK_KEY" in st.secrets:
+# DEEPSEEK_MOCK = true (或 "http://host:port") 时改连本地模拟服务，离线压测并发与限流
+mock = st.secrets.get("DEEPSEEK_MOCK", False)
+if mock:
     try:
-        client = OpenAI(api_key=st.secrets["DEEPSEEK_KEY"], base_url="https://api.deepseek.com")
+        client = make_async_client(st.secrets.get("DEEPSEEK_KEY", "mock-key"),
+                                   base_url=mock if isinstance(mock, str) else MOCK_BASE_URL)
+    except:
+        pass
+elif "DEEPSEEK_KEY" in st.secrets:
+    try:
+        client = make_async_client(st.secrets["DEEPSEEK_KEY"])
     except:
         pass
 
 # ==========================================
 # 2. 核心智能抽取引擎 (已修改为严格模式)
 # ==========================================
-def smart_pick(category, count=1):
+def get_sampler():
     """
-    智能挑选函数 (逻辑修正版)：
+    取当前关键词范围对应的抽样器 (同一份 active_pool 快照只编译一次)：
     1. 如果用户设定了筛选范围 (active_pool 存在)：
        - 严格从 active_pool 里取词。
-       - 如果 active_pool 里该分类为空（用户全不选），则返回空列表 []。
+       - 如果 active_pool 里该分类为空（用户全不选），该类目不参与拼装。
        - ❌ 绝不回退到全局数据库。
        
     2. 如果用户完全没设定过范围 (active_pool 不存在)：
        - 为了防止程序跑空，才回退到全局 db_all 随机抽取。
     """
-    # 获取活动池，如果没设置过，默认为 None
     active_pool = st.session_state.get("active_pool", None)
+    source = active_pool if active_pool is not None else st.session_state.get("db_all", {})
+    cached = st.session_state.get("pool_sampler", None)
+    if cached is None or cached[0] is not source:
+        cached = (source, PoolSampler(source))
+        st.session_state.pool_sampler = cached
+    return cached[1]
 
-    if active_pool is not None:
-        # 【严格模式】用户已经锁定了范围
-        # 直接获取，如果是空的，items 就是空列表
-        items = active_pool.get(category, [])
-    else:
-        # 【全随机模式】用户没设置范围，使用全局库保底
-        db = st.session_state.get("db_all", {})
-        items = db.get(category, [])
-        
-    if not items: return []
-    
-    actual_count = min(count, len(items))
-    return random.sample(items, actual_count)
+
+def get_combo_generator(strategy, seed):
+    """
+    同一份关键词范围 + 策略 + 种子共用一个组合生成器 (保存在会话里)，
+    多次点击生成时延续已发出集合，整个会话内的骨架组合不重复。
+    """
+    active_pool = st.session_state.get("active_pool", None)
+    source = active_pool if active_pool is not None else st.session_state.get("db_all", {})
+    cached = st.session_state.get("combo_generator", None)
+    if cached is None or cached[0] is not source or cached[1] != (strategy, seed):
+        cached = (source, (strategy, seed), ComboGenerator(source, strategy=strategy, seed=seed or None))
+        st.session_state.combo_generator = cached
+    return cached[2]
 
 # ===========================
 # 3. 界面交互
@@ -81,108 +109,252 @@ else:
     else:
         st.success(f"🎯 范围已锁定，所有类目均有备选词。")
 
-c1, c2 = st.columns([3, 1])
+c1, c2, c3 = st.columns([3, 1, 1])
 with c1:
     user_idea = st.text_input("Core Idea", placeholder="输入核心创意点", label_visibility="collapsed")
 with c2:
     qty = st.number_input("Batch", 1, 8, 4, label_visibility="collapsed")
+with c3:
+    concurrency = st.number_input("并发上限", 1, 8, DEFAULT_CONCURRENCY, help="同时向 DeepSeek 发起的请求数")
+
+c_unique, c_seed, c_cache, c_render, c_pack = st.columns([1, 1, 1, 1, 1])
+with c_unique:
+    no_repeat = st.checkbox("批次内不重复", value=True, help="同一批草案中，同类目的词尽量不重复")
+with c_seed:
+    seed = st.number_input("随机种子", 0, 2**31 - 1, 0, help="0 表示不固定；固定种子可复现同一批骨架")
+with c_cache:
+    reuse_cached = st.checkbox("复用缓存结果", value=False,
+                               help="相同骨架 + 指令 + 模型参数命中本地缓存时直接回放，不再请求 DeepSeek")
+with c_render:
+    render_ms = st.number_input("刷新间隔 (ms)", MIN_POLL_MS, 2000, max(DEFAULT_INTERVAL_MS, MIN_POLL_MS), step=50,
+                                help=f"页面按这个间隔轮询后台任务并重绘全部草案；不低于 {MIN_POLL_MS} ms")
+with c_pack:
+    batch_size = st.number_input("打包条数", 1, MAX_BATCH_SIZE, DEFAULT_BATCH_SIZE,
+                                 help="每个请求打包的骨架数：多条共用一次系统指令 (JSON 返回)，解析失败的条目自动逐条补发；"
+                                      "1 表示逐条流式请求")
+
+c_strategy, c_cover = st.columns([1, 4])
+with c_strategy:
+    strategy = st.selectbox(
+        "组合策略", ["random", *COMBO_STRATEGIES],
+        format_func=lambda s: {"random": "随机抽样", "round_robin": "轮转覆盖", "min_overlap": "最小重叠"}[s],
+        help="轮转覆盖：每个词轮流出场；最小重叠：再挑与已生成骨架共用词对最少的组合。两者在会话内都不会重复已发出的组合")
+with c_cover:
+    gen_state = st.session_state.get("combo_generator")
+    if strategy != "random" and gen_state is not None and gen_state[1][0] == strategy:
+        gen = gen_state[2]
+        cover = gen.coverage()
+        st.caption(f"已发出 {len(gen.issued)} 个组合 / 组合空间 {gen.space_size:.3g} · "
+                   f"词覆盖率最低 {min(cover.values(), default=0):.0%}")
+
+with st.expander("Token 预算", expanded=False):
+    c_budget, c_scope, c_action = st.columns(3)
+    with c_budget:
+        token_budget = st.number_input("预算 (tokens)", 0, 10**9, int(st.secrets.get("DEEPSEEK_TOKEN_BUDGET", 0)),
+                                       step=1000, help="输入 + 输出 token 上限，0 表示不限。请求前按预估占用额度，"
+                                                       "额度不足的请求不再发出")
+    with c_scope:
+        budget_scope = st.selectbox("预算范围", BUDGET_SCOPES,
+                                    format_func=lambda s: {"batch": "本批", "session": "本会话",
+                                                           "day": "今日 (所有会话)"}[s])
+    with c_action:
+        on_exhausted = st.radio("超出预算时", ["stop", "defer"], horizontal=True,
+                                format_func=lambda a: {"stop": "停止", "defer": "暂缓，稍后继续"}[a],
+                                help="暂缓的骨架保留在本会话里，调高预算或次日后可一键继续生成")
 
 # ===========================
-# 4. 执行生成 (DeepSeek 商业视觉润色)
+# 4. 执行生成 (DeepSeek 商业视觉润色，后台任务)
 # ===========================
-if st.button("开始提示词生成", type="primary", use_container_width=True):
-    
-    st.session_state.graphic_solutions = [] 
-    placeholders = []   
-    skeletons = []      
-    
-    for i in range(qty):
-        ph = st.empty()
-        placeholders.append(ph)
-        
-        # 核心逻辑：从智能抽取的词库中拼装
-        # 如果 smart_pick 返回空列表，对应的变量就是 None 或空
-        r_subject = smart_pick("Subject", 1)
-        r_reference = smart_pick("Reference", 1)
-        r_scene = smart_pick("Scene", 1)
-        r_action = smart_pick("Action", 1)
-        r_lighting = smart_pick("Lighting", 1)
-        r_lensLanguage = smart_pick("LensLanguage", 1)
-        r_elements = smart_pick("Elements", 1)
-        r_composition = smart_pick("Composition", 1)
-        r_color = smart_pick("Color", 1)
-        r_mood = smart_pick("Mood", 1)
-        r_usage = smart_pick("Usage", 1)
-        r_lookLike = smart_pick("LookLike", 1)
-        
-        # 语义拼装 (Only append if the list is valid)
-        sk_parts = []
-        if user_idea: sk_parts.append(user_idea.strip())
-        if r_subject: sk_parts.append(r_subject[0])
-        if r_reference: sk_parts.append(r_reference[0])
-        if r_scene: sk_parts.append(r_scene[0])
-        if r_action: sk_parts.append(r_action[0])
-        if r_lighting: sk_parts.append(r_lighting[0])
-        if r_lensLanguage: sk_parts.append(r_lensLanguage[0])
-        if r_elements: sk_parts.append(r_elements[0])
-        if r_composition: sk_parts.append(r_composition[0])
-        if r_color: sk_parts.append(r_color[0])
-        if r_mood: sk_parts.append(r_mood[0])
-        if r_usage: sk_parts.append(r_usage[0])
-        if r_lookLike: sk_parts.append(r_lookLike[0])
-        
-        # 只有当骨架不为空时才生成
-        if sk_parts:
-            sk = ", ".join(sk_parts)
-            skeletons.append(sk)
-            
-            with ph.container(border=True):
-                st.markdown(f"**草案{i+1}：** `{sk}`")
+# 生成交给 job_runner 的后台线程：等待期间可以继续调整控件、切换页面，rerun 不会打断在途请求。
+# 本会话的任务 id 保存在 graphic_job，任务结束后结果写入 graphic_solutions 等会话字段。
+runner = get_runner()
+job_id = st.session_state.get("graphic_job")
+if job_id is not None and runner.get(job_id) is None:
+    # 任务已过期或进程重启过
+    st.session_state.pop("graphic_job", None)
+    job_id = None
+
+
+def collect_job(job):
+    """后台任务结束：结果写入会话，未完成的条目并入暂缓列表，并从任务表移除"""
+    meta = job["meta"]
+    by_draft = dict(zip(meta["positions"], job["results"]))
+    entries, solutions, deferred = [], [], []
+    for n, sk in enumerate(meta["drafts"]):
+        res = by_draft.get(n)
+        if not sk:
+            entries.append({"no": n + 1, "status": "empty"})
+        elif res is None:
+            # 任务取消 / 失败时尚未完成的条目
+            entries.append({"no": n + 1, "status": "unfinished", "skeleton": sk})
+            deferred.append(sk)
+        elif res["status"] == "budget":
+            entries.append(dict(res, no=n + 1, deferred=meta["on_exhausted"] == "defer"))
+            if meta["on_exhausted"] == "defer":
+                deferred.append(sk)
+        else:
+            entries.append(dict(res, no=n + 1))
+            solutions.append(res["text"])
+    if deferred:
+        st.session_state.deferred_skeletons = st.session_state.get("deferred_skeletons", []) + deferred
+
+    st.session_state.graphic_results = entries
+    st.session_state.graphic_metrics = [
+        {"idx": r["idx"], "status": r["status"], "ttft": r["ttft"], "elapsed": r["elapsed"], "cached": r["cached"],
+         "batch": r["batch"]}
+        for r in job["results"] if r is not None
+    ]
+    st.session_state.graphic_solutions = solutions
+    st.session_state.graphic_render_stats = job["render_stats"]
+    polling = st.session_state.pop("graphic_polling", None)
+    if polling:
+        polling["elapsed"] = time.time() - polling["started"]
+    st.session_state.graphic_poll_stats = polling
+    st.session_state.graphic_batch_reports = sorted(job["batch_reports"], key=lambda r: r["batch"])
+    st.session_state.graphic_usage = job["usage"]
+    st.session_state.graphic_sent = len(job["queued"]) if job["send_to_queue"] else None
+    st.session_state.graphic_job_state = {"status": job["status"], "error": job["error"]}
+    st.session_state.pop("graphic_job", None)
+    runner.forget(job["id"])
+
+
+def show_job_progress():
+    """轮询本会话的后台任务：展示实时进度，结束后取走结果并整页刷新"""
+    job = runner.get(st.session_state.get("graphic_job"))
+    if job is None or job["status"] in FINISHED:
+        if job is not None:
+            collect_job(job)
+        else:
+            st.session_state.pop("graphic_job", None)
+        st.rerun()
+
+    c_prog, c_cancel = st.columns([4, 1])
+    with c_prog:
+        state = "排队中" if job["status"] == "queued" else f"{job['done']}/{job['total']}"
+        st.progress(job["done"] / max(job["total"], 1), text=f"后台生成中：{state} · 任务 `{job['id']}`")
+    with c_cancel:
+        if st.button("取消生成", use_container_width=True):
+            runner.cancel(job["id"])
+
+    texts = dict(zip(job["meta"]["positions"], job["texts"]))
+    sent = 0
+    for n, sk in enumerate(job["meta"]["drafts"]):
+        with st.container(border=True):
+            if not sk:
+                st.warning(f"**草案{n+1}：** 关键词为空，请至少勾选一个类目或输入 Core Idea。")
+            elif texts.get(n):
+                st.markdown(texts[n])
+                sent += len(texts[n].encode("utf-8"))
+            else:
+                waiting = f"**草案{n+1}：** `{sk}`"
+                st.markdown(waiting)
                 st.caption("提示词生成中...")
+                sent += len(waiting.encode("utf-8"))
+    # 每次轮询都重绘全部草案，前端实际收到的就是这些文本；按轮询累计
+    polling = st.session_state.setdefault("graphic_polling", {"polls": 0, "bytes": 0, "started": time.time()})
+    polling["polls"] += 1
+    polling["bytes"] += sent
+
+
+auto_send = st.checkbox("完成后自动发送至自动化流水线", value=False,
+                        help="后台任务结束时直接写入队列，即使已离开本页或关闭浏览器也不会丢失")
+
+run_drafts = None
+if st.button("开始提示词生成", type="primary", use_container_width=True, disabled=job_id is not None):
+    # 核心逻辑：一次抽出整批 qty x 类目 的关键词表
+    # 空类目在表中为 None，拼装时自动跳过
+    with timer("skeleton.build", items=qty, strategy=strategy):
+        if strategy == "random":
+            sampler = get_sampler()
+            sampler.reseed(seed or None)
+            rows = sampler.draw_batch(qty, unique=no_repeat)
         else:
-            with ph.container(border=True):
-                st.warning(f"**草案{i+1}：** 关键词为空，请至少勾选一个类目或输入 Core Idea。")
-    
-    # --- DeepSeek 创意总监指令 (DJI/GoPro 风格适配) ---
-    sys_prompt = """你是一名曾服务于 DJI 和 GoPro 和 Apple等顶级消费电子公司的资深创意总监。
-    任务：将给定的【关键词】转化为极具冲击力的产品 Key Visual (KV) 预热海报描述词。
-    规则：
-    1. 必须保留用户输入的关键词，并理解关键词的属性分类
-    2. 将不同类别的描述词先按：{这是一张[图片属性]，图中描述了用“镜头语言”拍摄的“主体”在“地点”发生了“动作”}
-    这一基本顺序描述出主干,其它关键词补充在最后
-    3. 整体服务于关键词中提到的核心卖点和核心创意点（如有提到）
-    """
+            rows = get_combo_generator(strategy, seed).take(qty)
+        run_drafts = [assemble_skeleton(user_idea, row) for row in rows]
+    if len(rows) < qty:
+        st.warning(f"组合空间已用尽：本次只生成 {len(rows)} 个新组合。可扩大关键词范围或更换种子。")
+
+deferred = st.session_state.get("deferred_skeletons", [])
+if deferred and run_drafts is None and job_id is None:
+    if st.button(f"继续生成暂缓的 {len(deferred)} 个骨架", use_container_width=True):
+        run_drafts = deferred
+        st.session_state.deferred_skeletons = []
+
+if run_drafts is not None:
+    # 只有骨架不为空的草案才发请求，positions 记录其在草案中的位置
+    positions = [i for i, sk in enumerate(run_drafts) if sk]
+    # 每次生成一个计量器：按 usage 记账到本地账本，并按预算拦截后续请求
+    meter = UsageMeter(get_ledger(), session=current_session(), batch=uuid.uuid4().hex[:8],
+                       budget=token_budget, scope=budget_scope)
+    job_id = runner.submit(client, SYS_PROMPT, [run_drafts[i] for i in positions], session=current_session(),
+                           interval_ms=render_ms, send_to_queue=auto_send,
+                           meta={"drafts": run_drafts, "positions": positions, "on_exhausted": on_exhausted},
+                           concurrency=concurrency, cache=get_cache(), reuse_cached=reuse_cached,
+                           scheduler=scheduler, batch_size=batch_size, meter=meter)
+    st.session_state.graphic_job = job_id
+    st.session_state.graphic_solutions = []
+    for key in ("graphic_results", "graphic_render_stats", "graphic_poll_stats", "graphic_polling",
+                "graphic_batch_reports", "graphic_usage", "graphic_sent", "graphic_job_state"):
+        st.session_state.pop(key, None)
+
+if job_id is not None:
+    # 只重跑这一段：轮询期间页面其余部分照常可操作
+    st.fragment(run_every=max(render_ms, MIN_POLL_MS) / 1000)(show_job_progress)()
+
+job_state = st.session_state.get("graphic_job_state")
+if job_state and job_state["status"] == "failed":
+    st.error(f"后台任务失败：{job_state['error']}")
+elif job_state and job_state["status"] == "cancelled":
+    st.info("已取消生成：已完成的结果保留，未完成的骨架已暂缓。")
 
-    final_results = []
-
-    # 仅处理有效的骨架
-    for i, sk in enumerate(skeletons):
-        idx = i + 1
-        ph = placeholders[i]
-        
-        user_prompt = f"【视觉骨架】：{sk} \n 请基于此骨架生成一段 150 字以内的专业 KV 描述词，以 '**方案{idx}：**' 开头。"
-        
-        try:
-            ph.empty()
-            with ph.container(border=True):
-                if client:
-                    stream = client.chat.completions.create(
-                        model="deepseek-chat",
-                        messages=[{"role": "system", "content": sys_prompt},{"role": "user", "content": user_prompt}],
-                        temperature=0.85, 
-                        stream=True 
-                    )
-                    full_response = st.write_stream(stream)
-                else:
-                    full_response = f"**方案{idx}：** {sk} (AI Offline)"
-                    st.write(full_response)
-        except Exception as e:
-            full_response = f"**方案{idx}：** {sk} (Error)"
-            ph.markdown(full_response)
-
-        final_results.append(full_response)
-
-    st.session_state.graphic_solutions = final_results
+for entry in st.session_state.get("graphic_results", []):
+    with st.container(border=True):
+        no = entry["no"]
+        if entry["status"] == "empty":
+            st.warning(f"**草案{no}：** 关键词为空，请至少勾选一个类目或输入 Core Idea。")
+            continue
+        if entry["status"] == "unfinished":
+            st.info(f"**草案{no}：** 未完成，已暂缓")
+            continue
+        if entry["status"] == "budget":
+            st.warning(f"**草案{no}：** 超出 token 预算，未发出请求" + ("，已暂缓" if entry["deferred"] else ""))
+            continue
+        st.markdown(entry["text"])
+        used = entry["usage"]
+        used = (f" · {used['prompt_tokens']} + {used['completion_tokens']} tokens" + ("*" if used["estimated"] else "")
+                if used else "")
+        if entry["cached"]:
+            st.caption("⚡ 缓存回放")
+        elif entry["batch"] is not None:
+            st.caption(f"📦 打包请求 #{entry['batch']} · 总耗时 {entry['elapsed']:.2f}s{used}")
+        elif entry["ttft"] is not None:
+            st.caption(f"TTFT {entry['ttft']:.2f}s · 总耗时 {entry['elapsed']:.2f}s{used}")
+
+if st.session_state.get("graphic_usage"):
+    us = st.session_state.graphic_usage
+    budget_note = (f" · 预算 ({us['scope']}) 已用 {us['spent']}/{us['budget']}" if us["budget"] else "")
+    refused_note = f" · {us['refused']} 个请求因预算未发出" if us["refused"] else ""
+    st.caption(f"Token 用量：输入 {us['prompt_tokens']} · 输出 {us['completion_tokens']} · "
+               f"{us['calls']} 次请求 · 约 ¥{us['cost']:.4f}{budget_note}{refused_note}")
+
+if st.session_state.get("graphic_render_stats"):
+    rs = st.session_state.graphic_render_stats
+    # 后台只把节流后的文本写进任务表；前端流量由页面轮询决定 (每次重绘全部草案)
+    poll = st.session_state.get("graphic_poll_stats")
+    poll_note = (f" · 页面轮询 {poll['polls']} 次 ({poll['polls'] / max(poll['elapsed'], 1e-9):.1f}/s)"
+                 f"，发往前端 {poll['bytes'] / 1024:.1f} KB" if poll else "")
+    st.caption(f"流式渲染：{rs['chunks']} chunks ({rs['chunks_per_sec']:.1f}/s) · 接收 {rs['bytes_received'] / 1024:.1f} KB · "
+               f"写入任务表 {rs['updates']} 次{poll_note}")
+
+if st.session_state.get("graphic_batch_reports"):
+    reports = st.session_state.graphic_batch_reports
+    st.caption(f"打包请求：{len(reports)} 个请求覆盖 {sum(r['items'] for r in reports)} 条 · "
+               f"补发 {sum(r['fallback'] for r in reports)} 条 · 少发 {sum(r['requests_saved'] for r in reports)} 次请求 · "
+               f"节省输入约 {sum(r['tokens_saved'] for r in reports)} tokens")
+    with st.expander("打包明细", expanded=False):
+        st.dataframe([{k: r[k] for k in ("batch", "items", "parsed", "fallback", "prompt_tokens",
+                                         "single_prompt_tokens", "tokens_saved", "elapsed", "error")}
+                      for r in reports], use_container_width=True, hide_index=True)
 
 # ===========================
 # 5. 结果处理
@@ -192,10 +364,14 @@ if "graphic_solutions" in st.session_state and st.session_state.graphic_solution
     
     c_send, c_clear = st.columns([3, 1])
     with c_send:
-        if st.button("发送至自动化流水线", type="primary", use_container_width=True):
-            if "global_queue" not in st.session_state:
-                st.session_state.global_queue = []
-            st.session_state.global_queue.extend(st.session_state.graphic_solutions)
+        sent = st.session_state.get("graphic_sent")
+        if sent is not None:
+            # 后台任务已直接写入队列，不再重复发送
+            st.caption(f"已自动添加 {sent} 组方案到队列")
+            if st.button("前往自动化流水线", type="primary", use_container_width=True):
+                st.switch_page("pages/03_Automation.py")
+        elif st.button("发送至自动化流水线", type="primary", use_container_width=True):
+            get_queue().enqueue(st.session_state.graphic_solutions)
             st.toast(f"已添加 {len(st.session_state.graphic_solutions)} 组方案到队列")
             time.sleep(0.5)
             st.switch_page("pages/03_Automation.py")
@@ -203,4 +379,7 @@ if "graphic_solutions" in st.session_state and st.session_state.graphic_solution
     with c_clear:
         if st.button("清空所有结果", use_container_width=True):
             st.session_state.graphic_solutions = []
+            st.session_state.pop("graphic_results", None)
             st.rerun()
+
+finish_rerun("work_space")
@@ -1,7 +1,5 @@
 import streamlit as st
-import json
-import urllib.parse
-import re
+import math
 import os
 import sys
 
@@ -13,8 +11,12 @@ parent_dir = os.path.abspath(os.path.join(current_dir, '..'))
 if parent_dir not in sys.path:
     sys.path.append(parent_dir)
 
-from engine_manager import render_sidebar, init_data
+from engine_manager import render_sidebar, init_data, finish_rerun
 from style_manager import apply_pro_style
+from script_builder import (DEFAULT_SCRIPT_CONFIG, DEFAULT_CHUNK_SIZE, PAYLOAD_ENCODINGS, build_chunked_scripts,
+                            new_run_id, parse_report)
+from task_parser import keep_records, parse_tasks
+from task_queue import STATUSES, get_queue
 
 # ===========================
 # 1. 页面配置与初始化
@@ -25,16 +27,28 @@ render_sidebar()
 init_data()
 
 # ===========================
-# 2. 队列数据同步
+# 2. 队列 (持久化，见 task_queue)
 # ===========================
-if "global_queue" not in st.session_state:
-    st.session_state.global_queue = []
-
 # 已移除：原本从 Text Studio 自动同步结果的补丁代码
-
-current_queue_text = ""
-if st.session_state.global_queue:
-    current_queue_text = "\n\n".join(st.session_state.global_queue)
+queue = get_queue()
+counts = queue.counts()
+
+if "queue_editor_version" not in st.session_state:
+    st.session_state.queue_editor_version = 0
+
+def apply_queue_edits(editor_key, rows):
+    """把表格里的增删改 (只含变动的行) 写回队列"""
+    changes = st.session_state[editor_key]
+    for row_idx, patch in changes.get("edited_rows", {}).items():
+        task_id = rows[int(row_idx)]["id"]
+        if "text" in patch:
+            queue.update_text(task_id, patch["text"] or "")
+        if patch.get("status") in STATUSES:
+            queue.set_status([task_id], patch["status"])
+    queue.delete([rows[i]["id"] for i in changes.get("deleted_rows", [])])
+    queue.enqueue([r.get("text") or "" for r in changes.get("added_rows", [])])
+    # 换 key 让表格按新数据重建，避免旧编辑被重复叠加
+    st.session_state.queue_editor_version += 1
 
 # ===========================
 # 3. 界面布局
@@ -44,174 +58,191 @@ st.caption("Universal AI Platform Adaptor (Safe Wait Mode)")
 
 col_info, col_clear = st.columns([4, 1])
 with col_info:
-    st.markdown(f"**Pending Tasks:** {len(st.session_state.global_queue)}")
+    st.markdown(" · ".join(f"**{k.title()}:** {v}" for k, v in counts.items()))
 with col_clear:
     if st.button("Clear Queue", use_container_width=True):
-        st.session_state.global_queue = []
+        queue.clear()
         # 已移除：对 text_solutions 的清空引用
         st.rerun()
 
-user_input = st.text_area(
-    "Queue Preview", 
-    value=current_queue_text, 
-    height=350, 
-    placeholder="Waiting for tasks from Graphic Lab...",
-    label_visibility="collapsed"
+c_filter, c_size, c_page = st.columns([2, 1, 1])
+with c_filter:
+    status_filter = st.selectbox("Status", ["all", *STATUSES], label_visibility="collapsed")
+with c_size:
+    page_size = st.selectbox("Page Size", [20, 50, 100], label_visibility="collapsed")
+total = sum(counts.values()) if status_filter == "all" else counts[status_filter]
+total_pages = max(1, math.ceil(total / page_size))
+if st.session_state.get("queue_page", 1) > total_pages:
+    st.session_state.queue_page = total_pages
+with c_page:
+    page = st.number_input("Page", 1, total_pages, key="queue_page", label_visibility="collapsed")
+
+page_rows = queue.page((page - 1) * page_size, page_size, None if status_filter == "all" else status_filter)
+editor_key = f"queue_editor_{st.session_state.queue_editor_version}"
+st.data_editor(
+    page_rows,
+    key=editor_key,
+    num_rows="dynamic",
+    use_container_width=True,
+    height=350,
+    disabled=["id"],
+    column_config={
+        "id": st.column_config.NumberColumn("ID", width="small"),
+        "status": st.column_config.SelectboxColumn("Status", options=list(STATUSES), width="small"),
+        "text": st.column_config.TextColumn("Task", width="large"),
+    },
+    on_change=apply_queue_edits,
+    args=(editor_key, page_rows)
 )
+st.caption(f"Page {page}/{total_pages} · {total} tasks" + ("" if total else " · Waiting for tasks from Graphic Lab..."))
+
+c_done, c_fail, c_requeue, c_clear_done = st.columns(4)
+with c_done:
+    if st.button("Mark Page Done", use_container_width=True):
+        queue.set_status([r["id"] for r in page_rows], "done")
+        st.rerun()
+with c_fail:
+    if st.button("Mark Page Failed", use_container_width=True):
+        queue.set_status([r["id"] for r in page_rows], "failed")
+        st.rerun()
+with c_requeue:
+    if st.button("Requeue Sent/Failed", use_container_width=True):
+        queue.set_status([r["id"] for r in queue.fetch("sent") + queue.fetch("failed")], "pending")
+        st.rerun()
+with c_clear_done:
+    if st.button("Clear Done", use_container_width=True):
+        queue.clear("done")
+        st.rerun()
 
-# 同步手动编辑的内容到 Session State
-if user_input != current_queue_text:
-    st.session_state.global_queue = [t.strip() for t in user_input.split('\n\n') if t.strip()]
+with st.expander("Add Tasks Manually", expanded=False):
+    manual_text = st.text_area("New Tasks", height=150, placeholder="一段一个任务，任务之间空一行",
+                               label_visibility="collapsed")
+    if st.button("Add to Queue", use_container_width=True) and manual_text.strip():
+        added = queue.enqueue_text(manual_text)
+        st.toast(f"Added {len(added)} tasks")
+        st.rerun()
 
 st.divider()
 
 # ===========================
-# 4. 核心逻辑 (30秒安全等待脚本)
+# 4. 核心逻辑 (安全等待脚本)
 # ===========================
-if st.button("Generate Safe-Wait Script (60s Delay)", type="primary", use_container_width=True):
-    task_list = []
-    if user_input:
-        if "**方案" in user_input:
-            segments = re.split(r"\*\*方案\d+：\*\*", user_input)
-            for seg in segments:
-                clean = seg.strip()
-                clean = clean.split("(Invalid")[0].split("(Connection")[0].strip()
-                if len(clean) > 2:
-                    task_list.append(clean.replace("\n", " "))
-        else:
-            task_list = [t.strip() for t in user_input.split('\n\n') if len(t.strip()) > 5]
-
-    if task_list:
-        encoded_data = urllib.parse.quote(json.dumps(task_list))
-        
-        # --- JS 自动化脚本 ---
-        js_code = f"""(async function() {{
-            console.clear();
-            console.log("%c Safe Automation Started (30s Delay) ", "background: #000; color: #0f0; font-size: 14px");
-            window.kill = false;
-            const tasks = JSON.parse(decodeURIComponent("{encoded_data}"));
-            
-            function showStatus(text, color = "#333") {{
-                let el = document.getElementById('magic-status-bar');
-                if (!el) {{
-                    el = document.createElement('div');
-                    el.id = 'magic-status-bar';
-                    el.style.cssText = "position:fixed; top:20px; left:50%; transform:translateX(-50%); z-index:999999; padding:8px 16px; border-radius:4px; font-family:sans-serif; font-size:13px; font-weight:bold; color:#fff; box-shadow:0 5px 15px rgba(0,0,0,0.3); transition: all 0.3s;";
-                    document.body.appendChild(el);
-                }}
-                el.textContent = text;
-                el.style.backgroundColor = color;
-            }}
-
-            function getInputBox() {{
-                const selectors = ['#prompt-textarea', '[contenteditable="true"]', 'textarea', '[data-testid="text-input"]', '.chat-input-textarea', '.rich-textarea'];
-                for (let s of selectors) {{
-                    let el = document.querySelector(s);
-                    if (el) return el;
-                }}
-                return null;
-            }}
-
-            function getSendBtn() {{
-                let btn = document.querySelector('[data-testid="send-button"]');
-                if (btn) return btn;
-                btn = document.querySelector('button[aria-label="Send prompt"]') || 
-                      document.querySelector('button[aria-label="发送"]') ||
-                      document.querySelector('button[aria-label="Send"]');
-                if (btn) return btn;
-                let allBtns = Array.from(document.querySelectorAll('button'));
-                return allBtns.find(b => {{
-                    let t = (b.innerText || b.ariaLabel || "").toLowerCase();
-                    let html = b.innerHTML;
-                    if (t.includes('stop') || t.includes('停止')) return false;
-                    return t.includes('send') || t.includes('发送') || html.includes('path') || html.includes('svg');
-                }});
-            }}
-
-            function isBusy() {{
-                let stopBtn = document.querySelector('[aria-label="Stop generating"]') || 
-                              document.querySelector('.stop-button') || 
-                              document.querySelector('button[aria-label="停止"]') ||
-                              document.querySelector('button[aria-label="Stop"]');
-                if (stopBtn) return true;
-
-                let sendBtn = getSendBtn();
-                if (sendBtn && sendBtn.disabled) return true;
-                
-                if (document.querySelector('.result-streaming')) return true;
-                return false;
-            }}
-
-            showStatus("Loaded " + tasks.length + " tasks", "#444"); 
-            
-            for (let i = 0; i < tasks.length; i++) {{
-                if (window.kill) {{ showStatus("🛑 Stopped", "#d32f2f"); break; }}
-                
-                let box = getInputBox();
-                if (!box) {{ 
-                    showStatus("Waiting for Input Box...", "#f57c00");
-                    await new Promise(r => setTimeout(r, 2000));
-                    box = getInputBox();
-                }}
-                
-                if (box) {{
-                    showStatus("Writing Task " + (i+1) + "/" + tasks.length, "#1976d2");
-                    box.focus();
-                    
-                    let success = false;
-                    try {{ success = document.execCommand('insertText', false, tasks[i]); }} catch(e){{}}
-                    
-                    if (!success) {{
-                        if (box.tagName === 'DIV' || box.contentEditable === "true") {{
-                            box.innerText = tasks[i]; 
-                        }} else {{
-                            box.value = tasks[i];
-                        }}
-                        box.dispatchEvent(new Event('input', {{ bubbles: true }}));
-                    }}
-                    
-                    await new Promise(r => setTimeout(r, 1000)); 
-
-                    let sendBtn = getSendBtn();
-                    if (sendBtn && !sendBtn.disabled) {{
-                        sendBtn.click();
-                    }} else {{
-                        box.dispatchEvent(new KeyboardEvent('keydown', {{ key: 'Enter', code: 'Enter', keyCode: 13, bubbles: true }}));
-                    }}
-                }}
-                
-                if (i < tasks.length - 1) {{
-                    showStatus("Starting...", "#616161");
-                    await new Promise(r => setTimeout(r, 5000));
-                    
-                    let waitSec = 0;
-                    while(true) {{
-                        if (window.kill) break;
-                        if (isBusy()) {{
-                            showStatus("Generating (" + waitSec + "s)...", "#7b1fa2");
-                            await new Promise(r => setTimeout(r, 1000));
-                            waitSec++;
-                        }} else {{
-                            await new Promise(r => setTimeout(r, 2000));
-                            if (!isBusy()) break; 
-                        }}
-                    }}
-
-                    // 强制 60s 冷却
-                    for (let s = 60; s > 0; s--) {{
-                         if (window.kill) break;
-                         showStatus("☕ Cooldown: " + s + "s", "#f57c00");
-                         await new Promise(r => setTimeout(r, 1000));
-                    }}
-                }}
-            }}
-            if(!window.kill) showStatus("All Done!", "#2e7d32");
-        }})();"""
-
-        st.success(f"✅ Ready! ({len(task_list)} Tasks Parsed)")
-        
-        with st.expander("Get Safe-Wait Script", expanded=True):
-            st.code(js_code, language="javascript")
-        st.caption("Tip: Copy the code, F12 on AI Platform, paste into Console and Enter.")
+with st.expander("Wait Strategy", expanded=False):
+    wait_mode = st.radio(
+        "Wait Mode",
+        ["fixed", "adaptive"],
+        format_func=lambda m: {"adaptive": "Adaptive (MutationObserver + 限流退避)",
+                               "fixed": "Fixed Cooldown"}[m],
+        horizontal=True
+    )
+    c_a, c_b, c_c = st.columns(3)
+    if wait_mode == "adaptive":
+        with c_a:
+            min_gap = st.number_input("Min Gap (s)", 0, 600, DEFAULT_SCRIPT_CONFIG["minGapSec"])
+        with c_b:
+            quiet_ms = st.number_input("Quiet Window (ms)", 500, 30000, DEFAULT_SCRIPT_CONFIG["quietMs"], step=500,
+                                       help="回复区域持续这么久没有 DOM 变化即视为生成结束")
+        with c_c:
+            backoff_base = st.number_input("Rate-limit Backoff (s)", 5, 3600, DEFAULT_SCRIPT_CONFIG["backoffBaseSec"],
+                                           help="检测到限流提示后的首次退避，之后每次翻倍")
+        container = st.text_input("Response Container Selector (optional)", placeholder="main")
+        script_options = {"mode": "adaptive", "minGapSec": min_gap, "quietMs": quiet_ms,
+                          "backoffBaseSec": backoff_base, "containerSelector": container.strip()}
+    else:
+        with c_a:
+            cooldown = st.number_input("Cooldown (s)", 0, 3600, DEFAULT_SCRIPT_CONFIG["cooldownSec"])
+        script_options = {"mode": "fixed", "cooldownSec": cooldown}
+
+with st.expander("Payload", expanded=False):
+    c_enc, c_chunk = st.columns(2)
+    with c_enc:
+        payload_encoding = st.selectbox(
+            "Encoding", PAYLOAD_ENCODINGS,
+            format_func=lambda e: {"gzip": "gzip + base64 (smallest)", "json": "Plain JSON",
+                                   "quote": "URL-encoded (legacy)"}[e],
+            help="gzip 需要浏览器支持 DecompressionStream (Chrome 80+ / Safari 16.4+ / Firefox 113+)")
+    with c_chunk:
+        chunk_size = st.number_input("Tasks per Script", 1, 5000, DEFAULT_CHUNK_SIZE,
+                                     help="长队列拆成多段脚本依次粘贴；进度游标存在浏览器 localStorage，中断后重贴当前段即可续跑")
+
+skip_flagged = st.checkbox("Skip tasks flagged (Error) / (AI Offline)", value=False,
+                           help="DeepSeek 失败时回退的原始骨架带有这些尾注")
+
+if st.button("Generate Safe-Wait Script (Pending Tasks)", type="primary", use_container_width=True):
+    pending = queue.fetch("pending")
+    # 单遍解析：每条记录带来源任务 id、原文偏移与错误标记
+    records = parse_tasks((item["id"], item["text"]) for item in pending)
+    kept = keep_records(records, skip_flags=("error", "offline") if skip_flagged else ())
+    flagged = {}
+    for r in records:
+        for flag in r["flags"]:
+            flagged[flag] = flagged.get(flag, 0) + 1
+
+    if kept:
+        run_id = new_run_id()
+        sources = [r["source"] for r in kept]
+        scripts = build_chunked_scripts([r["text"] for r in kept], chunk_size=chunk_size, encoding=payload_encoding,
+                                        run_id=run_id, sources=sources, **script_options)
+        # 只有进了脚本的任务标记为 sent，导入脚本的完成报告后自动标记 done / failed；
+        # 没有解析出任务或任务全被跳过的条目不在本次运行里，报告无从处理，留在 pending
+        sent = set(sources)
+        queue.record_run(run_id, sources)
+        queue.set_status(sorted(sent), "sent")
+        st.session_state.automation_scripts = {"scripts": scripts, "tasks": len(kept), "flagged": flagged,
+                                               "run": run_id, "left": len(pending) - len(sent)}
+        st.session_state.script_chunk = 1
     else:
+        st.session_state.pop("automation_scripts", None)
         st.error("No valid tasks found in the queue.")
+
+# 生成结果保存在会话里，切换分段时不需要重新生成
+generated = st.session_state.get("automation_scripts")
+if generated:
+    scripts = generated["scripts"]
+    st.success(f"✅ Ready! ({generated['tasks']} Tasks Parsed, {len(scripts)} Script(s), "
+               f"{sum(len(s.encode('utf-8')) for s in scripts) / 1024:.0f} KB)")
+    if generated["flagged"]:
+        st.warning("Error markers: " + ", ".join(f"{k} × {v}" for k, v in sorted(generated["flagged"].items())))
+    if generated.get("left"):
+        st.info(f"{generated['left']} pending item(s) produced no tasks (empty or skipped) and stay pending.")
+
+    with st.expander("Get Safe-Wait Script", expanded=True):
+        chunk_no = 1
+        if len(scripts) > 1:
+            chunk_no = st.number_input("Script Chunk", 1, len(scripts), key="script_chunk",
+                                       help="按顺序粘贴各段；同一批次共用进度游标")
+        js_code = scripts[chunk_no - 1]
+        st.download_button(f"Download chunk {chunk_no}/{len(scripts)} (.js)", js_code,
+                           file_name=f"kv_automation_{chunk_no:03d}.js", mime="text/javascript")
+        st.code(js_code, language="javascript")
+    st.caption(f"Tip: Copy the code, F12 on AI Platform, paste into Console and Enter (run `{generated['run']}`). "
+               "Progress is checkpointed in localStorage, so after a reload or `window.kill = true` paste the "
+               "same chunk again to resume. The completion report is copied to the clipboard when a chunk "
+               "finishes; `kvExport()` downloads it at any time.")
+
+# ===========================
+# 5. 导入完成报告
+# ===========================
+with st.expander("Import Completion Report", expanded=False):
+    report_file = st.file_uploader("Report File", type=["json"], label_visibility="collapsed")
+    report_text = st.text_area("Report JSON", height=120, placeholder="粘贴脚本复制到剪贴板的报告，或上传 kvExport() 下载的文件",
+                               label_visibility="collapsed")
+    if st.button("Apply Report", use_container_width=True) and (report_file or report_text.strip()):
+        try:
+            report = parse_report(report_file.getvalue() if report_file else report_text)
+        except ValueError as e:
+            st.error(str(e))
+        else:
+            result = queue.apply_report(report)
+            st.session_state.queue_editor_version += 1
+            st.session_state.report_result = dict(result, run=report["run"])
+            st.rerun()
+
+    result = st.session_state.get("report_result")
+    if result:
+        st.success(f"Run `{result['run']}`: {len(result['done'])} marked done, {len(result['failed'])} marked failed, "
+                   f"{result['unfinished']} still unfinished.")
+        if not result["known_run"]:
+            st.warning("This run was not generated here; tasks were matched by the ids carried in the report.")
+
+finish_rerun("automation")
@@ -0,0 +1,142 @@
+import functools
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+# ==========================================
+# 1. 配置
+# ==========================================
+# 每条计时写一行 JSON：{"ts", "name", "value", "session", ...附加字段}
+# 设置环境变量 KV_PERF_LOG=0 可关闭落盘 (内存中的统计照常)
+PERF_LOG_PATH = "data/perf/timings.jsonl"
+WINDOW = 1000   # 每个指标在内存中保留的最近样本数
+
+
+_bound = threading.local()
+
+
+def bind_session(session):
+    """后台任务线程代替某个会话执行时绑定其 id (见 job_runner)，传 None 解除"""
+    _bound.session = session
+
+
+def current_session():
+    """当前 Streamlit 会话 id；后台任务线程中为绑定的会话，命令行/其他线程中返回 None"""
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+    except ImportError:
+        return getattr(_bound, "session", None)
+    ctx = get_script_run_ctx(suppress_warning=True)
+    return ctx.session_id if ctx is not None else getattr(_bound, "session", None)
+
+
+def percentile(sorted_values, p):
+    """最近秩百分位 (与自动化脚本汇总的算法一致)"""
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(p * len(sorted_values)))]
+
+# ==========================================
+# 2. 记录器
+# ==========================================
+class PerfRecorder:
+    """
+    进程级计时/计数记录器：内存中按指标保留最近 WINDOW 个样本 (附带会话 id)，
+    同时逐行追加到 JSONL 日志，便于离线分析。
+    """
+
+    def __init__(self, path=PERF_LOG_PATH, log=True):
+        self.path = path
+        self.log = log
+        self._lock = threading.Lock()
+        self._samples = defaultdict(lambda: deque(maxlen=WINDOW))   # name -> deque[(session, value)]
+        self.counters = defaultdict(int)
+        self._file = None
+
+    def _write(self, record):
+        if not self.log:
+            return
+        try:
+            if self._file is None:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                self._file = open(self.path, "a", encoding="utf-8", buffering=1)
+            self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        except OSError:
+            self.log = False   # 日志不可写时只保留内存统计
+
+    def record(self, name, value, session=None, **fields):
+        """记录一个样本 (耗时类指标单位为秒)"""
+        if value is None:
+            return
+        session = session if session is not None else current_session()
+        with self._lock:
+            self._samples[name].append((session, value))
+            self._write({"ts": time.time(), "name": name, "value": value, "session": session, **fields})
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] += n
+
+    @contextmanager
+    def timer(self, name, **fields):
+        """with recorder.timer("init_data"): ..."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started, **fields)
+
+    def timed(self, name=None):
+        """装饰器版计时"""
+        def decorator(fn):
+            label = name or fn.__qualname__
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.timer(label):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def summary(self, session=None):
+        """
+        {指标: {"n", "p50", "p95", "max"}}；session 不为空时只统计该会话的样本，
+        为空时统计整个进程。
+        """
+        with self._lock:
+            snapshot = {name: list(samples) for name, samples in self._samples.items()}
+        result = {}
+        for name, samples in sorted(snapshot.items()):
+            values = sorted(v for s, v in samples if session is None or s == session)
+            if values:
+                result[name] = {"n": len(values), "p50": percentile(values, 0.5),
+                                "p95": percentile(values, 0.95), "max": values[-1]}
+        return result
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def get_recorder():
+    """进程级共享记录器"""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = PerfRecorder(log=os.environ.get("KV_PERF_LOG", "1") != "0")
+        return _shared
+
+
+def timer(name, **fields):
+    return get_recorder().timer(name, **fields)
+
+
+def timed(name=None):
+    return get_recorder().timed(name)
+
+
+def record(name, value, **fields):
+    get_recorder().record(name, value, **fields)
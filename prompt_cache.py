@@ -0,0 +1,127 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+# ==========================================
+# 1. 缓存配置
+# ==========================================
+CACHE_PATH = "data/cache/prompt_cache.sqlite3"
+DEFAULT_MAX_ENTRIES = 5000
+DEFAULT_MAX_AGE = 30 * 24 * 3600   # 30 天
+
+# 每 N 次写入做一次淘汰，避免每条都跑 DELETE
+_EVICT_EVERY = 50
+
+# 结果里的 '**方案N：**' 前缀与批次序号相关，入库前去掉，回放时按新序号补上
+_HEADER_RE = re.compile(r"^\s*\*\*方案\d+：\*\*\s*")
+
+
+def cache_key(sys_prompt, sk, model, temperature):
+    """sys_prompt + 骨架 + 模型参数 的 sha256"""
+    raw = json.dumps([sys_prompt, sk, model, float(temperature)], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def strip_header(text):
+    return _HEADER_RE.sub("", text, count=1)
+
+
+def with_header(body, idx):
+    return f"**方案{idx}：** {body}"
+
+# ==========================================
+# 2. SQLite 结果缓存
+# ==========================================
+class PromptCache:
+    """
+    本地持久化的润色结果缓存：
+    - 超过 max_age 秒的条目视为过期；
+    - 条目数超过 max_entries 时按最近使用时间淘汰 (LRU)。
+    单连接 + 锁，可在多个会话线程间共享；多进程由 SQLite WAL 保证一致。
+    """
+
+    def __init__(self, path=CACHE_PATH, max_entries=DEFAULT_MAX_ENTRIES, max_age=DEFAULT_MAX_AGE):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                " key TEXT PRIMARY KEY, body TEXT NOT NULL,"
+                " created REAL NOT NULL, last_used REAL NOT NULL, hits INTEGER NOT NULL DEFAULT 0)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_last_used ON cache(last_used)")
+            self._conn.commit()
+
+    def get(self, key):
+        """命中返回去掉前缀的正文，未命中/已过期返回 None"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT body, created FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > self.max_age:
+                self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE cache SET last_used = ?, hits = hits + 1 WHERE key = ?", (now, key))
+            self._conn.commit()
+        return row[0]
+
+    def put(self, key, text):
+        body = strip_header(text).strip()
+        if not body:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, body, created, last_used, hits) VALUES (?, ?, ?, ?, 0)",
+                (key, body, now, now)
+            )
+            self._conn.commit()
+            self._writes += 1
+            due = self._writes % _EVICT_EVERY == 0
+        if due:
+            self.evict()
+
+    def evict(self):
+        """删除过期条目，并把总量压回 max_entries 以内"""
+        with self._lock:
+            self._conn.execute("DELETE FROM cache WHERE created < ?", (time.time() - self.max_age,))
+            self._conn.execute(
+                "DELETE FROM cache WHERE key IN ("
+                " SELECT key FROM cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM cache")
+            self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            count, hits = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(hits), 0) FROM cache").fetchone()
+        return {"entries": count, "hits": hits}
+
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def get_cache(path=CACHE_PATH):
+    """进程级共享的缓存实例"""
+    with _shared_lock:
+        if path not in _shared:
+            _shared[path] = PromptCache(path)
+        return _shared[path]
@@ -0,0 +1,183 @@
+import asyncio
+import email.utils
+import random
+import threading
+import time
+
+# ==========================================
+# 1. 默认限额
+# ==========================================
+DEFAULT_RPM = 60            # 每分钟请求数
+DEFAULT_TPM = 120000        # 每分钟 token 数
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_BASE_DELAY = 1.0    # 指数退避起点 (秒)
+DEFAULT_MAX_DELAY = 60.0    # 单次等待上限 (秒)
+
+# 可重试的 HTTP 状态码：限流 + 服务端错误
+_RETRY_STATUS = {408, 409, 429}
+
+
+def estimate_tokens(text):
+    """粗略估算 token 数：中文约 0.6 token/字，其余约 0.3 token/字符"""
+    cjk = sum(1 for ch in text if "一" <= ch <= "鿿")
+    return int(cjk * 0.6 + (len(text) - cjk) * 0.3) + 1
+
+# ==========================================
+# 2. 令牌桶
+# ==========================================
+class TokenBucket:
+    """
+    线程安全的令牌桶，只依赖 time.monotonic，可在多个事件循环/会话线程间共享。
+    reserve() 立即扣减 (允许透支) 并返回需要等待的秒数，先到先得。
+    """
+
+    def __init__(self, rate_per_min, capacity=None):
+        self.rate = rate_per_min / 60.0
+        self.capacity = float(capacity if capacity is not None else rate_per_min)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount=1):
+        amount = min(float(amount), self.capacity)
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens -= amount
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def refund(self, amount):
+        """预估多扣的部分退回 (amount 为负时表示补扣)"""
+        with self._lock:
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+# ==========================================
+# 3. 重试判定
+# ==========================================
+def _retry_after(exc):
+    """从异常携带的响应头中读取 Retry-After (秒)，没有则返回 None"""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000.0
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        parsed = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None     # 格式不对的头按没有处理，退回指数退避
+    return max(0.0, parsed.timestamp() - time.time()) if parsed else None
+
+
+def is_retryable(exc):
+    status = getattr(exc, "status_code", None)
+    if status is not None:
+        return status in _RETRY_STATUS or status >= 500
+    # 连接失败 / 超时 (openai.APIConnectionError、APITimeoutError 等)
+    name = type(exc).__name__
+    return isinstance(exc, (asyncio.TimeoutError, ConnectionError)) or "Connection" in name or "Timeout" in name
+
+# ==========================================
+# 4. 调度器
+# ==========================================
+class RequestScheduler:
+    """
+    DeepSeek 请求调度器：
+    - requests/min 与 tokens/min 两个令牌桶共同限速；
+    - 429 / 5xx / 连接错误按指数退避 + 全抖动重试，带 Retry-After 时按服务端要求暂停，
+      且暂停对共享同一调度器的所有请求生效。
+    """
+
+    def __init__(self, rpm=DEFAULT_RPM, tpm=DEFAULT_TPM, max_retries=DEFAULT_MAX_RETRIES,
+                 base_delay=DEFAULT_BASE_DELAY, max_delay=DEFAULT_MAX_DELAY):
+        self.rpm, self.tpm = rpm, tpm
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._pause_until = 0.0
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "retries": 0, "rate_limited": 0, "throttled_sec": 0.0}
+
+    def configure(self, rpm, tpm):
+        """限额变化时重建令牌桶"""
+        if rpm != self.rpm:
+            self.rpm, self.requests = rpm, TokenBucket(rpm)
+        if tpm != self.tpm:
+            self.tpm, self.tokens = tpm, TokenBucket(tpm)
+
+    def pause(self, seconds):
+        with self._lock:
+            self._pause_until = max(self._pause_until, time.monotonic() + seconds)
+
+    async def acquire(self, est_tokens=1):
+        """等待直到允许再发一个请求"""
+        wait = max(self.requests.reserve(1), self.tokens.reserve(est_tokens),
+                   self._pause_until - time.monotonic())
+        with self._lock:
+            self.stats["requests"] += 1
+            if wait > 0:
+                self.stats["throttled_sec"] += wait
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def backoff(self, exc, attempt):
+        """返回本次失败后的等待秒数；不可重试或超过次数时返回 None"""
+        if attempt >= self.max_retries or not is_retryable(exc):
+            return None
+        retry_after = _retry_after(exc)
+        if getattr(exc, "status_code", None) == 429:
+            with self._lock:
+                self.stats["rate_limited"] += 1
+        if retry_after is not None:
+            delay = min(retry_after, self.max_delay) + random.uniform(0, 0.5)
+            self.pause(delay)
+        else:
+            delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        with self._lock:
+            self.stats["retries"] += 1
+        return delay
+
+    async def call(self, fn, est_tokens=1):
+        """限速 + 重试地执行 await fn()"""
+        attempt = 0
+        while True:
+            await self.acquire(est_tokens)
+            try:
+                return await fn()
+            except Exception as e:
+                delay = self.backoff(e, attempt)
+                if delay is None:
+                    raise
+                attempt += 1
+                await asyncio.sleep(delay)
+
+
+_schedulers = {}
+_schedulers_lock = threading.Lock()
+
+
+def get_scheduler(name="deepseek", rpm=DEFAULT_RPM, tpm=DEFAULT_TPM):
+    """进程级共享调度器：同一个 API 账号的所有会话/批任务共用一组限额"""
+    with _schedulers_lock:
+        scheduler = _schedulers.get(name)
+        if scheduler is None:
+            scheduler = _schedulers[name] = RequestScheduler(rpm, tpm)
+        else:
+            scheduler.configure(rpm, tpm)
+        return scheduler
@@ -0,0 +1,118 @@
+import heapq
+import random
+
+# ==========================================
+# 1. 骨架拼装顺序
+# ==========================================
+# 与 Work Space 原有的 12 次 smart_pick 顺序保持一致
+SKELETON_ORDER = [
+    "Subject", "Reference", "Scene", "Action", "Lighting", "LensLanguage",
+    "Elements", "Composition", "Color", "Mood", "Usage", "LookLike",
+]
+
+
+def assemble_skeleton(user_idea, row, order=SKELETON_ORDER):
+    """把一行抽样结果 {类目: 词 | None} 按固定顺序拼成骨架，空骨架返回 ''"""
+    parts = []
+    if user_idea and user_idea.strip():
+        parts.append(user_idea.strip())
+    for cat in order:
+        word = row.get(cat)
+        if word:
+            parts.append(word)
+    return ", ".join(parts)
+
+# ==========================================
+# 2. 加权抽样：Alias 表 (Vose)
+# ==========================================
+def build_alias_table(weights):
+    """O(n) 构建 alias 表，之后每次加权抽样 O(1)"""
+    n = len(weights)
+    total = float(sum(weights))
+    prob = [w * n / total for w in weights]
+    alias = [0] * n
+    small = [i for i, p in enumerate(prob) if p < 1.0]
+    large = [i for i, p in enumerate(prob) if p >= 1.0]
+    while small and large:
+        s, l = small.pop(), large.pop()
+        alias[s] = l
+        prob[l] -= 1.0 - prob[s]
+        (small if prob[l] < 1.0 else large).append(l)
+    for i in small + large:
+        prob[i] = 1.0
+    return prob, alias
+
+# ==========================================
+# 3. 抽样引擎
+# ==========================================
+class PoolSampler:
+    """
+    基于一次 active_pool 快照预编译的抽样器：
+    - 每个类目预先转成 tuple，带权类目预建 alias 表；
+    - draw_batch 一次产出 batch x 类目 的整张结果表；
+    - unique=True 时同一批次内同类目尽量不重复 (词不够时才开始复用)；
+    - 指定 seed 时结果可复现。
+    """
+
+    def __init__(self, pool, weights=None, seed=None):
+        self.rng = random.Random(seed)
+        self.items = {cat: tuple(words) for cat, words in pool.items()}
+        self.weights = {}
+        self.alias = {}
+        for cat, term_weights in (weights or {}).items():
+            words = self.items.get(cat)
+            if not words:
+                continue
+            ws = [max(float(term_weights.get(w, 1.0)), 0.0) for w in words]
+            # 全部等权 (或全部为 0) 时直接走均匀抽样
+            if len(set(ws)) > 1 and sum(ws) > 0:
+                self.weights[cat] = ws
+                self.alias[cat] = build_alias_table(ws)
+
+    def reseed(self, seed=None):
+        self.rng.seed(seed)
+
+    # --- 单类目 ---
+    def _draw_with_replacement(self, cat, k):
+        words = self.items[cat]
+        if cat not in self.alias:
+            return self.rng.choices(words, k=k)
+        prob, alias = self.alias[cat]
+        n = len(words)
+        rand = self.rng.random
+        out = []
+        for _ in range(k):
+            u = rand() * n
+            i = int(u)
+            out.append(words[i] if u - i < prob[i] else words[alias[i]])
+        return out
+
+    def _draw_unique(self, cat, k):
+        """不放回抽样；k 超过词数时按整轮补齐，每轮内部不重复"""
+        words = self.items[cat]
+        n = len(words)
+        out = []
+        while len(out) < k:
+            take = min(k - len(out), n)
+            if cat in self.weights:
+                # Efraimidis-Spirakis 加权不放回：key = u ** (1/w)，取最大的 take 个
+                rand = self.rng.random
+                keyed = ((rand() ** (1.0 / w) if w > 0 else -1.0, i)
+                         for i, w in enumerate(self.weights[cat]))
+                picked = [i for _, i in heapq.nlargest(take, keyed)]
+            else:
+                picked = self.rng.sample(range(n), take)
+            out.extend(words[i] for i in picked)
+        return out
+
+    def draw(self, cat, k=1, unique=False):
+        """从单个类目抽 k 个词，类目为空时返回 []"""
+        if not self.items.get(cat) or k <= 0:
+            return []
+        return self._draw_unique(cat, k) if unique else self._draw_with_replacement(cat, k)
+
+    # --- 整批 ---
+    def draw_batch(self, n, categories=SKELETON_ORDER, unique=False):
+        """返回 n 行 {类目: 词 | None}，空类目对应 None"""
+        columns = {cat: self.draw(cat, n, unique=unique) for cat in categories}
+        return [{cat: (col[r] if col else None) for cat, col in columns.items()} for r in range(n)]
@@ -0,0 +1,483 @@
+import base64
+import gzip
+import json
+import urllib.parse
+import uuid
+
+from task_parser import parse_tasks, task_texts
+
+# ==========================================
+# 1. 等待策略参数
+# ==========================================
+# fixed:    原有策略，isBusy() 轮询结束后强制冷却 cooldownSec 秒
+# adaptive: MutationObserver 监听回复区域，静默 quietMs 且不忙即视为完成，
+#           之后只保留 minGapSec 的最小间隔；检测到限流提示时才指数退避并重发
+DEFAULT_SCRIPT_CONFIG = {
+    "mode": "fixed",
+    "cooldownSec": 60,
+    "minGapSec": 3,
+    "quietMs": 2500,
+    "startTimeoutSec": 20,
+    "maxWaitSec": 600,
+    "backoffBaseSec": 30,
+    "backoffMaxSec": 600,
+    "maxRateLimitRetries": 3,
+    "containerSelector": "",
+}
+
+# ==========================================
+# 2. 任务载荷编码
+# ==========================================
+# gzip:  gzip + base64，浏览器端用 DecompressionStream 解压 (中文任务约为 quote 的 1/10 ~ 1/5)
+# json:  直接嵌入 JSON 字面量 (不压缩，UTF-8 原文)
+# quote: 原有的 encodeURIComponent 形式 (每个汉字膨胀为 9 个字符)
+PAYLOAD_ENCODINGS = ("gzip", "json", "quote")
+DEFAULT_CHUNK_SIZE = 200
+
+# 脚本导出的完成报告标识 (见 parse_report)
+REPORT_KIND = "kvAutomationReport"
+REPORT_STATUSES = ("done", "failed")
+
+
+def encode_tasks(task_list, encoding="gzip"):
+    """任务列表 -> 嵌入脚本的载荷 {"enc", "data"}"""
+    if encoding == "gzip":
+        raw = json.dumps(task_list, ensure_ascii=False).encode("utf-8")
+        data = base64.b64encode(gzip.compress(raw, compresslevel=9, mtime=0)).decode("ascii")
+    elif encoding == "json":
+        data = task_list
+    elif encoding == "quote":
+        data = urllib.parse.quote(json.dumps(task_list))
+    else:
+        raise ValueError(f"Unknown payload encoding: {encoding}")
+    return {"enc": encoding, "data": data}
+
+
+def _js_literal(obj):
+    # U+2028/2029 在旧版 JS 引擎的字符串字面量里非法
+    return (json.dumps(obj, ensure_ascii=False)
+            .replace("\u2028", "\\u2028").replace("\u2029", "\\u2029"))
+
+# ==========================================
+# 3. JS 模板
+# ==========================================
+# 用 __CONFIG__ / __RUN__ / __PAYLOAD__ 占位，避免 f-string 大括号转义。
+# RUN = {id, offset, total, chunk, chunks, sources}：offset 为本段第一个任务在整批中的序号，
+# sources 为本段各任务对应的队列任务 id (可为 null)。
+# localStorage["kvAuto:" + id] 保存整批的逐任务进度 {"任务序号": {status, source, startedAt, endedAt,
+# latencyMs, reason, attempts}}，每完成一个任务写一次；重新粘贴任一段时跳过 status 为 done 的任务。
+# 完成报告 (REPORT_KIND) 覆盖整批已记录的任务，可导入 Automation 页把队列任务标记为 done / failed。
+_JS_TEMPLATE = r"""(async function() {
+    console.clear();
+    const CFG = __CONFIG__;
+    const RUN = __RUN__;
+    console.log("%c Safe Automation Started (" + CFG.mode + ", chunk " + RUN.chunk + "/" + RUN.chunks + ") ", "background: #000; color: #0f0; font-size: 14px");
+    window.kill = false;
+
+    async function decodeTasks(p) {
+        if (p.enc === "json") return p.data;
+        if (p.enc === "quote") return JSON.parse(decodeURIComponent(p.data));
+        const bin = Uint8Array.from(atob(p.data), c => c.charCodeAt(0));
+        const stream = new Blob([bin]).stream().pipeThrough(new DecompressionStream("gzip"));
+        return JSON.parse(await new Response(stream).text());
+    }
+    const tasks = await decodeTasks(__PAYLOAD__);
+
+    const PROGRESS_KEY = "kvAuto:" + RUN.id;
+    function readProgress() {
+        try {
+            const p = JSON.parse(localStorage.getItem(PROGRESS_KEY) || "null");
+            if (p && p.tasks) return p;
+        } catch(e) {}
+        return { total: RUN.total, created: Date.now(), tasks: {} };
+    }
+    const progress = readProgress();
+    function saveProgress() {
+        progress.updated = Date.now();
+        try { localStorage.setItem(PROGRESS_KEY, JSON.stringify(progress)); } catch(e) {}
+    }
+    function checkpoint(n, entry) {
+        const prev = progress.tasks[n];
+        entry.attempts = (prev ? prev.attempts || 0 : 0) + 1;
+        entry.source = RUN.sources ? RUN.sources[n - 1 - RUN.offset] : null;
+        progress.tasks[n] = entry;
+        saveProgress();
+    }
+    const isDone = n => (progress.tasks[n] || {}).status === "done";
+    const sleep = ms => new Promise(r => setTimeout(r, ms));
+    const RATE_LIMIT_RE = /rate limit|too many requests|usage limit|try again later|请求过于频繁|请求太频繁|稍后再试|达到.{0,6}上限/i;
+
+    function showStatus(text, color = "#333") {
+        let el = document.getElementById('magic-status-bar');
+        if (!el) {
+            el = document.createElement('div');
+            el.id = 'magic-status-bar';
+            el.style.cssText = "position:fixed; top:20px; left:50%; transform:translateX(-50%); z-index:999999; padding:8px 16px; border-radius:4px; font-family:sans-serif; font-size:13px; font-weight:bold; color:#fff; box-shadow:0 5px 15px rgba(0,0,0,0.3); transition: all 0.3s;";
+            document.body.appendChild(el);
+        }
+        el.textContent = text;
+        el.style.backgroundColor = color;
+    }
+
+    function getInputBox() {
+        const selectors = ['#prompt-textarea', '[contenteditable="true"]', 'textarea', '[data-testid="text-input"]', '.chat-input-textarea', '.rich-textarea'];
+        for (let s of selectors) {
+            let el = document.querySelector(s);
+            if (el) return el;
+        }
+        return null;
+    }
+
+    function getSendBtn() {
+        let btn = document.querySelector('[data-testid="send-button"]');
+        if (btn) return btn;
+        btn = document.querySelector('button[aria-label="Send prompt"]') ||
+              document.querySelector('button[aria-label="发送"]') ||
+              document.querySelector('button[aria-label="Send"]');
+        if (btn) return btn;
+        let allBtns = Array.from(document.querySelectorAll('button'));
+        return allBtns.find(b => {
+            let t = (b.innerText || b.ariaLabel || "").toLowerCase();
+            let html = b.innerHTML;
+            if (t.includes('stop') || t.includes('停止')) return false;
+            return t.includes('send') || t.includes('发送') || html.includes('path') || html.includes('svg');
+        });
+    }
+
+    function isBusy() {
+        let stopBtn = document.querySelector('[aria-label="Stop generating"]') ||
+                      document.querySelector('.stop-button') ||
+                      document.querySelector('button[aria-label="停止"]') ||
+                      document.querySelector('button[aria-label="Stop"]');
+        if (stopBtn) return true;
+
+        let sendBtn = getSendBtn();
+        if (sendBtn && sendBtn.disabled) return true;
+
+        if (document.querySelector('.result-streaming')) return true;
+        return false;
+    }
+
+    function getResponseContainer() {
+        if (CFG.containerSelector) {
+            let el = document.querySelector(CFG.containerSelector);
+            if (el) return el;
+        }
+        return document.querySelector('main') || document.querySelector('[role="main"]') || document.body;
+    }
+
+    // --- 固定模式：轮询 isBusy() + 强制冷却 ---
+    async function waitFixed(i, startedAt) {
+        showStatus("Starting...", "#616161");
+        await sleep(5000);
+
+        let waitSec = 0;
+        while(true) {
+            if (window.kill) break;
+            if (isBusy()) {
+                showStatus("Generating (" + waitSec + "s)...", "#7b1fa2");
+                await sleep(1000);
+                waitSec++;
+            } else {
+                await sleep(2000);
+                if (!isBusy()) break;
+            }
+        }
+        const latencyMs = Date.now() - startedAt;
+
+        // 强制冷却
+        for (let s = CFG.cooldownSec; s > 0; s--) {
+             if (window.kill) break;
+             showStatus("☕ Cooldown: " + s + "s", "#f57c00");
+             await sleep(1000);
+        }
+        return { latencyMs: latencyMs, reason: "fixed", rateLimited: false };
+    }
+
+    // --- 自适应模式：MutationObserver 判定回复结束 ---
+    function waitForResponse(startedAt) {
+        return new Promise(resolve => {
+            const root = getResponseContainer();
+            const statusEl = () => document.getElementById('magic-status-bar');
+            let lastMutation = startedAt;
+            let sawMutation = false;
+            const obs = new MutationObserver(records => {
+                const bar = statusEl();
+                if (records.some(r => !bar || !bar.contains(r.target))) {
+                    lastMutation = Date.now();
+                    sawMutation = true;
+                }
+            });
+            obs.observe(root, { childList: true, subtree: true, characterData: true });
+
+            const timer = setInterval(() => {
+                const now = Date.now();
+                let reason = null;
+                if (window.kill) reason = "killed";
+                else if (sawMutation && !isBusy() && now - lastMutation >= CFG.quietMs) reason = "idle";
+                else if (!sawMutation && !isBusy() && now - startedAt >= CFG.startTimeoutSec * 1000) reason = "no-response";
+                else if (now - startedAt >= CFG.maxWaitSec * 1000) reason = "timeout";
+
+                if (reason) {
+                    clearInterval(timer);
+                    obs.disconnect();
+                    const end = reason === "idle" ? lastMutation : now;
+                    resolve({ latencyMs: end - startedAt, reason: reason });
+                } else {
+                    showStatus("Generating (" + Math.round((now - startedAt) / 1000) + "s)...", "#7b1fa2");
+                }
+            }, 250);
+        });
+    }
+
+    function pageTextLength() {
+        return (getResponseContainer().innerText || "").length;
+    }
+
+    // 只检查本次发送之后新增的文本，避免旧的限流提示被重复命中
+    function sawRateLimit(baseline) {
+        const text = (getResponseContainer().innerText || "").slice(baseline).slice(-2000);
+        return RATE_LIMIT_RE.test(text);
+    }
+
+    let strikes = 0;
+    async function waitAdaptive(i, startedAt, baseline) {
+        const res = await waitForResponse(startedAt);
+        res.rateLimited = sawRateLimit(baseline);
+        let gap = CFG.minGapSec;
+        if (res.rateLimited) {
+            gap = Math.min(CFG.backoffMaxSec, CFG.backoffBaseSec * Math.pow(2, strikes));
+            strikes++;
+        } else {
+            strikes = 0;
+        }
+        for (let s = Math.ceil(gap); s > 0; s--) {
+            if (window.kill) break;
+            showStatus((res.rateLimited ? "⏳ Rate limited, backoff: " : "Next in ") + s + "s", res.rateLimited ? "#d32f2f" : "#616161");
+            await sleep(1000);
+        }
+        return res;
+    }
+
+    function percentile(sorted, p) {
+        if (!sorted.length) return null;
+        return sorted[Math.min(sorted.length - 1, Math.floor(p * sorted.length))];
+    }
+
+    // 完成报告：整批 (所有已粘贴分段) 的逐任务进度 + 本次运行的耗时统计
+    function buildReport(records, runStarted) {
+        const lat = records.filter(r => r.latencyMs != null).map(r => r.latencyMs).sort((a, b) => a - b);
+        const entries = Object.keys(progress.tasks).map(Number).sort((a, b) => a - b)
+            .map(n => Object.assign({ task: n }, progress.tasks[n]));
+        return {
+            kind: "__REPORT_KIND__",
+            version: 1,
+            run: RUN.id,
+            mode: CFG.mode,
+            total: RUN.total,
+            exportedAt: Date.now(),
+            done: entries.filter(e => e.status === "done").length,
+            failed: entries.filter(e => e.status === "failed").length,
+            chunk: RUN.chunk,
+            chunks: RUN.chunks,
+            tasks: tasks.length,
+            completed: records.length,
+            rateLimitHits: records.filter(r => r.rateLimited).length,
+            totalSec: Math.round((Date.now() - runStarted) / 1000),
+            latencyMs: {
+                avg: lat.length ? Math.round(lat.reduce((a, b) => a + b, 0) / lat.length) : null,
+                p50: percentile(lat, 0.5),
+                p95: percentile(lat, 0.95),
+                max: lat.length ? lat[lat.length - 1] : null
+            },
+            records: records,
+            progress: entries
+        };
+    }
+
+    const runStarted = Date.now();
+    const records = [];
+
+    // 随时可在控制台调用 kvExport() 下载当前进度的报告文件
+    window.kvExport = function() {
+        const text = JSON.stringify(buildReport(records, runStarted));
+        const a = document.createElement("a");
+        a.href = URL.createObjectURL(new Blob([text], { type: "application/json" }));
+        a.download = "kv_report_" + RUN.id + ".json";
+        document.body.appendChild(a);
+        a.click();
+        return text.length;
+    };
+
+    async function report() {
+        const summary = buildReport(records, runStarted);
+        window.__kvSummary = summary;
+        console.table(records);
+        const text = JSON.stringify(summary, null, 2);
+        console.log(text);
+        try { copy(text); } catch(e) {
+            try { await navigator.clipboard.writeText(text); } catch(e2) {}
+        }
+        return summary;
+    }
+
+    const todo = [];
+    for (let i = 0; i < tasks.length; i++) if (!isDone(RUN.offset + i + 1)) todo.push(i);
+    if (!todo.length) {
+        showStatus("Chunk " + RUN.chunk + "/" + RUN.chunks + " already done · kvExport() for the report", "#2e7d32");
+        return;
+    }
+    const skipped = tasks.length - todo.length;
+    showStatus("Loaded " + tasks.length + " tasks" + (skipped ? ", skipping " + skipped + " done" : ""), "#444");
+    let retries = 0;
+
+    for (let k = 0; k < todo.length; k++) {
+        const i = todo[k];
+        const n = RUN.offset + i + 1;   // 整批中的任务序号 (从 1 开始)
+        if (window.kill) { showStatus("🛑 Stopped", "#d32f2f"); break; }
+
+        let box = getInputBox();
+        if (!box) {
+            showStatus("Waiting for Input Box...", "#f57c00");
+            await sleep(2000);
+            box = getInputBox();
+        }
+
+        const startedAt = Date.now();
+        const baseline = CFG.mode === "adaptive" ? pageTextLength() : 0;
+        if (box) {
+            showStatus("Writing Task " + n + "/" + RUN.total, "#1976d2");
+            box.focus();
+
+            let success = false;
+            try { success = document.execCommand('insertText', false, tasks[i]); } catch(e){}
+
+            if (!success) {
+                if (box.tagName === 'DIV' || box.contentEditable === "true") {
+                    box.innerText = tasks[i];
+                } else {
+                    box.value = tasks[i];
+                }
+                box.dispatchEvent(new Event('input', { bubbles: true }));
+            }
+
+            await sleep(1000);
+
+            let sendBtn = getSendBtn();
+            if (sendBtn && !sendBtn.disabled) {
+                sendBtn.click();
+            } else {
+                box.dispatchEvent(new KeyboardEvent('keydown', { key: 'Enter', code: 'Enter', keyCode: 13, bubbles: true }));
+            }
+        }
+
+        let res;
+        if (CFG.mode === "adaptive") {
+            res = await waitAdaptive(i, Date.now(), baseline);
+            records.push({ task: n, latencyMs: res.latencyMs, reason: res.reason, rateLimited: res.rateLimited });
+            // 限流时同一任务重发，超过次数后记为失败并跳过
+            if (res.rateLimited && retries < CFG.maxRateLimitRetries) { retries++; k--; continue; }
+            retries = 0;
+        } else if (n < RUN.total) {
+            res = await waitFixed(i, startedAt);
+            records.push({ task: n, latencyMs: res.latencyMs, reason: res.reason, rateLimited: false });
+        } else {
+            res = { latencyMs: null, reason: "last", rateLimited: false };
+            records.push({ task: n, latencyMs: null, reason: "last", rateLimited: false });
+        }
+        // 被手动停止的任务不记进度，续跑时重发
+        if (window.kill) { showStatus("🛑 Stopped", "#d32f2f"); break; }
+        const failed = !box || res.rateLimited || res.reason === "no-response" || res.reason === "timeout";
+        checkpoint(n, { status: failed ? "failed" : "done", startedAt: startedAt, endedAt: Date.now(),
+                        latencyMs: res.latencyMs, reason: box ? res.reason : "no-input" });
+    }
+    const summary = await report();
+    if (!window.kill) {
+        const next = RUN.chunk < RUN.chunks ? " · paste chunk " + (RUN.chunk + 1) + "/" + RUN.chunks : "";
+        const failedNote = summary.failed ? " · " + summary.failed + " failed" : "";
+        showStatus((next ? "Chunk Done!" : "All Done!") + " avg " + Math.round((summary.latencyMs.avg || 0) / 1000) + "s/task" + failedNote + " · report copied" + next, "#2e7d32");
+    }
+})();"""
+
+# ==========================================
+# 4. 对外接口
+# ==========================================
+def clean_tasks(texts, skip_flags=()):
+    """队列文本 -> 脚本任务：逐条去掉 '**方案N：**' 前缀与错误尾注，过短的片段丢弃 (见 task_parser)"""
+    return task_texts(parse_tasks(enumerate(texts)), skip_flags)
+
+
+def _script_config(options):
+    config = dict(DEFAULT_SCRIPT_CONFIG)
+    unknown = set(options) - set(config)
+    if unknown:
+        raise ValueError(f"Unknown script options: {', '.join(sorted(unknown))}")
+    config.update(options)
+    return config
+
+
+def _render(config, run, payload):
+    # 载荷最后替换，避免任务文本里恰好出现其他占位符
+    return (_JS_TEMPLATE
+            .replace("__CONFIG__", json.dumps(config))
+            .replace("__RUN__", json.dumps(run))
+            .replace("__REPORT_KIND__", REPORT_KIND)
+            .replace("__PAYLOAD__", _js_literal(payload)))
+
+
+def new_run_id():
+    return uuid.uuid4().hex[:10]
+
+
+def build_safe_wait_script(task_list, encoding="gzip", run_id=None, sources=None, **options):
+    """
+    生成控制台自动化脚本。options 覆盖 DEFAULT_SCRIPT_CONFIG 中的同名字段；
+    encoding 见 PAYLOAD_ENCODINGS。
+    脚本结束时输出完成报告 (window.__kvSummary，并尝试复制到剪贴板)，见 parse_report。
+    """
+    return build_chunked_scripts(task_list, chunk_size=max(len(task_list), 1), encoding=encoding,
+                                 run_id=run_id, sources=sources, **options)[0]
+
+
+def build_chunked_scripts(task_list, chunk_size=DEFAULT_CHUNK_SIZE, encoding="gzip", run_id=None, sources=None,
+                          **options):
+    """
+    把长队列切成若干段脚本，按顺序粘贴执行；各段共用同一个 run_id 的 localStorage 进度，
+    中断或刷新页面后重新粘贴当前段即跳过已完成的任务继续。
+    sources: 与 task_list 一一对应的队列任务 id，写入完成报告，导入时据此回写队列状态。
+    """
+    if sources is not None and len(sources) != len(task_list):
+        raise ValueError("sources must match task_list one to one")
+    config = _script_config(options)
+    run_id = run_id or new_run_id()
+    starts = range(0, len(task_list), chunk_size) if task_list else [0]
+    return [
+        _render(config, {"id": run_id, "offset": start, "total": len(task_list), "chunk": n + 1,
+                         "chunks": len(starts),
+                         "sources": list(sources[start:start + chunk_size]) if sources is not None else None},
+                encode_tasks(task_list[start:start + chunk_size], encoding))
+        for n, start in enumerate(starts)
+    ]
+
+# ==========================================
+# 5. 完成报告
+# ==========================================
+def parse_report(text):
+    """
+    解析脚本导出的完成报告 (剪贴板文本或 kvExport() 下载的文件)，返回
+        {"run", "total", "tasks": {任务序号: {"status", "source", "attempts", ...}}}
+    只保留 status 为 done / failed 的任务；格式不对时抛 ValueError。
+    """
+    if isinstance(text, bytes):
+        text = text.decode("utf-8-sig")
+    try:
+        data = json.loads(text)
+    except ValueError as e:
+        raise ValueError(f"Report is not valid JSON: {e}") from None
+    if not isinstance(data, dict) or data.get("kind") != REPORT_KIND or not isinstance(data.get("progress"), list):
+        raise ValueError("Not an automation completion report")
+    tasks = {}
+    for entry in data["progress"]:
+        if isinstance(entry, dict) and entry.get("status") in REPORT_STATUSES and isinstance(entry.get("task"), int):
+            tasks[entry["task"]] = entry
+    return {"run": str(data.get("run") or ""), "total": int(data.get("total") or 0), "tasks": tasks}
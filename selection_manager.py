@@ -0,0 +1,138 @@
+from itertools import compress
+
+try:
+    from pypinyin import lazy_pinyin, Style
+except ImportError:
+    # 拼音检索为可选能力，缺少 pypinyin 时退化为纯子串匹配
+    lazy_pinyin = None
+
+# ==========================================
+# 1. 类目选择位图
+# ==========================================
+# 每个类目一个 bytearray，下标即词在词库 tuple 中的位置 (1 = 选中)。
+# 全选/清空/反选都是整块的字节操作，不再逐词写 session_state。
+_ON = b"\x01"
+_INVERT = bytes.maketrans(b"\x00\x01", b"\x01\x00")
+
+
+class SelectionMask:
+    """单个类目的选择状态"""
+
+    __slots__ = ("words", "bits", "version", "_search_keys")
+
+    def __init__(self, words, selected=True):
+        self.words = words
+        self.bits = bytearray(_ON * len(words)) if selected else bytearray(len(words))
+        # 每次批量操作递增，用于让前端复选框整体换 key 重新取值
+        self.version = 0
+        self._search_keys = None
+
+    def __len__(self):
+        return len(self.bits)
+
+    # --- 批量操作 (O(1) 次 Python 调用) ---
+    def select_all(self):
+        self.bits = bytearray(_ON * len(self.bits))
+        self.version += 1
+
+    def clear(self):
+        self.bits = bytearray(len(self.bits))
+        self.version += 1
+
+    def invert(self):
+        self.bits = self.bits.translate(_INVERT)
+        self.version += 1
+
+    def deselect(self, indices):
+        """批量取消勾选指定下标 (如查重后剔除重复词)"""
+        for i in indices:
+            self.bits[i] = 0
+        self.version += 1
+
+    def apply(self, action):
+        """action: all / none / invert"""
+        if action == "all":
+            self.select_all()
+        elif action == "none":
+            self.clear()
+        elif action == "invert":
+            self.invert()
+
+    # --- 单词读写 ---
+    def get(self, i):
+        return bool(self.bits[i])
+
+    def set(self, i, value):
+        self.bits[i] = 1 if value else 0
+
+    # --- 结果 ---
+    def count(self):
+        return self.bits.count(1)
+
+    def selected(self):
+        """按位图筛出选中的词 (保持词库顺序)"""
+        return list(compress(self.words, self.bits))
+
+    def rebase(self, words):
+        """
+        词库文件变化后按词重新对齐位图：
+        原来取消勾选的词保持取消，新增的词默认选中。
+        """
+        if words is self.words:
+            return
+        if words == self.words:
+            self.words = words
+            return
+        unselected = set(compress(self.words, self.bits.translate(_INVERT)))
+        self.bits = bytearray(0 if w in unselected else 1 for w in words)
+        self.words = words
+        self.version += 1
+        self._search_keys = None
+
+    # --- 检索 ---
+    def search(self, query):
+        """
+        返回匹配 query 的词下标列表 (子串匹配，忽略大小写与空格；
+        安装 pypinyin 时同时匹配全拼与首字母)。
+        """
+        q = _normalize(query)
+        if not q:
+            return range(len(self.words))
+        if self._search_keys is None:
+            self._search_keys = [_search_key(w) for w in self.words]
+        return [i for i, key in enumerate(self._search_keys) if q in key]
+
+
+def _normalize(text):
+    return "".join(text.split()).lower()
+
+
+def _search_key(word):
+    """词的检索串：原文 + 全拼 + 首字母，三段之间用 NUL 分隔，避免跨段误匹配"""
+    text = _normalize(word)
+    if lazy_pinyin is None:
+        return text
+    full = "".join(lazy_pinyin(text)).lower()
+    initials = "".join(lazy_pinyin(text, style=Style.FIRST_LETTER)).lower()
+    return "\x00".join((text, full, initials))
+
+
+def build_masks(db, categories):
+    """为每个类目创建全选状态的位图"""
+    return {cat: SelectionMask(db.get(cat, ())) for cat in categories}
+
+
+def sync_masks(masks, db, categories):
+    """确保每个类目都有位图，并与当前词库对齐"""
+    for cat in categories:
+        words = db.get(cat, ())
+        if cat in masks:
+            masks[cat].rebase(words)
+        else:
+            masks[cat] = SelectionMask(words)
+    return masks
+
+
+def build_active_pool(masks):
+    """位图 -> {类目: [选中的词]}"""
+    return {cat: mask.selected() for cat, mask in masks.items()}
@@ -0,0 +1,110 @@
+import re
+
+# ==========================================
+# 1. 词法规则
+# ==========================================
+# 分段头用 str.find 定位后再匹配编号，空行单独一个正则，错误尾注用 str.find / in；
+# 不合并成一个多分支正则 (没有公共前缀时 re 要在每个位置逐个尝试各分支)。
+_HEADER_RE = re.compile(r"\*\*方案(\d+)：\*\*")
+_BLANK_RE = re.compile(r"\n[ \t\r]*\n")
+_HEADER_HINT = "**方案"
+
+# 尾注 -> 标记名；前两种在分段文本中会截断任务，后两种只做标记
+ERROR_FLAGS = {"Invalid": "invalid", "Connection": "connection", "Error": "error", "AI Offline": "offline"}
+_MARKERS = (("(Invalid", "invalid", True), ("(Connection", "connection", True),
+            ("(Error)", "error", False), ("(AI Offline)", "offline", False))
+
+MIN_LEN_SEGMENT = 3   # 带分段头的文本：片段至少 3 个字符 (与原清洗逻辑一致)
+MIN_LEN_PLAIN = 6     # 纯文本任务：至少 6 个字符
+
+# ==========================================
+# 2. 解析
+# ==========================================
+def _boundaries(text, segmented, paragraphs):
+    """分隔点 [(起点, 终点, 分段编号 | None)]，分段头带编号，空行为 None；按位置排序"""
+    marks = []
+    if segmented:
+        # str.find 定位 '**方案'，只在命中处尝试完整匹配，比 finditer 整段扫描快
+        find, match = text.find, _HEADER_RE.match
+        pos = find(_HEADER_HINT)
+        while pos >= 0:
+            m = match(text, pos)
+            if m is not None:
+                marks.append((pos, m.end(), int(m.group(1))))
+                pos = find(_HEADER_HINT, m.end())
+            else:
+                pos = find(_HEADER_HINT, pos + 1)
+    if paragraphs and "\n" in text:
+        marks.extend((m.start(), m.end(), None) for m in _BLANK_RE.finditer(text))
+        marks.sort()
+    return marks
+
+
+def parse_text(text, source=None, paragraphs=False, first_id=0):
+    """
+    把一段文本切成任务记录，每条为
+        {"id", "source", "plan", "text", "start", "end", "span", "flags"}
+    - text:       清洗后的任务文本 (分段模式下换行替换为空格)
+    - start/end:  清洗后文本在原文中的区间；span 为含分段头的原始区间
+    - plan:       '**方案N：**' 中的 N，没有分段头时为 None
+    - flags:      出现过的错误标记 (invalid / connection / error / offline)
+    含 '**方案' 的文本按分段头切分，并在 '(Invalid' / '(Connection' 处截断；
+    否则整段作为一个任务。paragraphs=True 时空行也作为分隔 (手动粘贴多个任务)。
+    """
+    segmented = _HEADER_HINT in text
+    min_len = MIN_LEN_SEGMENT if segmented else MIN_LEN_PLAIN
+    # 绝大多数文本不含任何尾注：整段先查一遍，之后只在出现过的尾注里逐段查找
+    present = [m for m in _MARKERS if m[0] in text] if "(" in text else ()
+    records = []
+    seg_start, header_start, plan = 0, None, None
+
+    for mark_start, mark_end, mark_plan in _boundaries(text, segmented, paragraphs) + [(len(text), None, None)]:
+        cut, flags = mark_start, ()
+        if present:
+            found = []
+            for marker, flag, cuts in present:
+                pos = text.find(marker, seg_start, mark_start)
+                if pos >= 0:
+                    found.append(flag)
+                    if cuts and segmented and pos < cut:
+                        cut = pos
+            flags = tuple(sorted(found))
+        body = text[seg_start:cut]
+        task = body.lstrip()
+        start = seg_start + len(body) - len(task)
+        task = task.rstrip()
+        if len(task) >= min_len:
+            stop = start + len(task)
+            records.append({
+                "id": first_id + len(records), "source": source, "plan": plan,
+                "text": task.replace("\n", " ") if segmented else task,
+                "start": start, "end": stop,
+                "span": (header_start if header_start is not None else start, stop),
+                "flags": flags,
+            })
+        if mark_end is not None:
+            seg_start, plan = mark_end, mark_plan
+            header_start = mark_start if mark_plan is not None else None
+    return records
+
+
+def parse_tasks(items, paragraphs=False):
+    """
+    items: 可迭代的 (source, text)，source 一般为队列任务 id。
+    返回所有记录，id 在整批内连续编号。
+    """
+    records = []
+    for source, text in items:
+        records.extend(parse_text(text, source=source, paragraphs=paragraphs, first_id=len(records)))
+    return records
+
+
+def keep_records(records, skip_flags=()):
+    """丢弃 skip_flags 中任一标记命中的记录"""
+    skip = set(skip_flags)
+    return [r for r in records if not skip.intersection(r["flags"])] if skip else list(records)
+
+
+def task_texts(records, skip_flags=()):
+    """记录 -> 脚本任务文本；skip_flags 中任一标记命中的记录被丢弃"""
+    return [r["text"] for r in keep_records(records, skip_flags)]
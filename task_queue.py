@@ -0,0 +1,192 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from task_parser import parse_text
+
+# ==========================================
+# 1. 队列配置
+# ==========================================
+QUEUE_PATH = "data/queue/tasks.sqlite3"
+STATUSES = ("pending", "sent", "done", "failed")
+
+# ==========================================
+# 2. 持久化任务队列
+# ==========================================
+class TaskQueue:
+    """
+    本地持久化的自动化任务队列 (SQLite, WAL)：
+    每条任务有自增 id 与状态 pending / sent / done / failed。
+    所有读取都按页或按状态进行，单次交互的开销与队列总长度无关。
+    runs 表记录每次生成脚本时 "脚本任务序号 -> 队列任务 id" 的对应关系，用于导入完成报告。
+    """
+
+    def __init__(self, path=QUEUE_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS tasks ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT, text TEXT NOT NULL,"
+                " status TEXT NOT NULL DEFAULT 'pending', created REAL NOT NULL, updated REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks(status, id)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS runs (id TEXT PRIMARY KEY, sources TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            self._conn.commit()
+
+    # --- 写入 ---
+    def enqueue(self, texts):
+        """批量入队，返回新任务 id 列表 (空文本会被跳过)"""
+        now = time.time()
+        ids = []
+        with self._lock:
+            for text in texts:
+                text = text.strip()
+                if not text:
+                    continue
+                cur = self._conn.execute(
+                    "INSERT INTO tasks (text, status, created, updated) VALUES (?, 'pending', ?, ?)",
+                    (text, now, now)
+                )
+                ids.append(cur.lastrowid)
+            self._conn.commit()
+        return ids
+
+    def enqueue_text(self, text, paragraphs=True):
+        """整段粘贴的文本按 task_parser 切分后入队 (保留 '**方案N：**' 分段头原文)"""
+        return self.enqueue(text[r["span"][0]:r["span"][1]] for r in parse_text(text, paragraphs=paragraphs))
+
+    def set_status(self, ids, status):
+        if status not in STATUSES:
+            raise ValueError(f"Unknown task status: {status}")
+        ids = list(ids)
+        if not ids:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE tasks SET status = ?, updated = ? WHERE id = ?",
+                [(status, time.time(), i) for i in ids]
+            )
+            self._conn.commit()
+
+    def update_text(self, task_id, text):
+        with self._lock:
+            self._conn.execute("UPDATE tasks SET text = ?, updated = ? WHERE id = ?", (text, time.time(), task_id))
+            self._conn.commit()
+
+    def delete(self, ids):
+        with self._lock:
+            self._conn.executemany("DELETE FROM tasks WHERE id = ?", [(i,) for i in ids])
+            self._conn.commit()
+
+    def clear(self, status=None):
+        """清空队列 (指定 status 时只清该状态)"""
+        with self._lock:
+            if status is None:
+                self._conn.execute("DELETE FROM tasks")
+            else:
+                self._conn.execute("DELETE FROM tasks WHERE status = ?", (status,))
+            self._conn.commit()
+
+    # --- 脚本运行 ---
+    def record_run(self, run_id, sources):
+        """登记一次脚本运行：sources[k] 为第 k+1 个脚本任务对应的队列任务 id"""
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO runs (id, sources, created) VALUES (?, ?, ?)",
+                               (run_id, json.dumps(list(sources)), time.time()))
+            self._conn.commit()
+
+    def run_sources(self, run_id):
+        with self._lock:
+            row = self._conn.execute("SELECT sources FROM runs WHERE id = ?", (run_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def apply_report(self, report):
+        """
+        按完成报告 (script_builder.parse_report 的结果) 回写队列状态：
+        一个队列任务可能切成多个脚本任务，全部 done 才标记 done，任一 failed 且其余都已结束时标记 failed，
+        还有未执行的脚本任务则保持不变。只处理仍存在的任务。
+        返回 {"done": [...], "failed": [...], "unfinished": 队列任务数, "known_run": bool}
+        """
+        tasks = report["tasks"]
+        sources = self.run_sources(report["run"])
+        known = sources is not None
+        if not known:
+            # 未登记的批次 (如换了机器)：只能依据报告里自带的 source，无法判断同一任务的其他片段
+            sources = [None] * max([report["total"], *tasks] or [0])
+            for n, entry in tasks.items():
+                sources[n - 1] = entry.get("source")
+
+        by_source = {}
+        for n, source in enumerate(sources, start=1):
+            if source is not None:
+                by_source.setdefault(source, []).append((tasks.get(n) or {}).get("status"))
+        done, failed, unfinished = [], [], 0
+        for source, statuses in by_source.items():
+            if all(st == "done" for st in statuses):
+                done.append(source)
+            elif None in statuses:
+                unfinished += 1
+            else:
+                failed.append(source)
+
+        with self._lock:
+            existing = {row[0] for row in self._conn.execute(
+                "SELECT id FROM tasks WHERE id IN (SELECT value FROM json_each(?))", (json.dumps(done + failed),))}
+        done = [i for i in done if i in existing]
+        failed = [i for i in failed if i in existing]
+        self.set_status(done, "done")
+        self.set_status(failed, "failed")
+        return {"done": done, "failed": failed, "unfinished": unfinished, "known_run": known}
+
+    # --- 读取 ---
+    def counts(self):
+        """{status: 数量}，未出现的状态为 0"""
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM tasks GROUP BY status").fetchall()
+        result = dict.fromkeys(STATUSES, 0)
+        result.update({row[0]: row[1] for row in rows})
+        return result
+
+    def page(self, offset=0, limit=50, status=None):
+        """按 id 顺序取一页任务"""
+        with self._lock:
+            if status is None:
+                rows = self._conn.execute(
+                    "SELECT id, text, status FROM tasks ORDER BY id LIMIT ? OFFSET ?", (limit, offset)
+                ).fetchall()
+            else:
+                rows = self._conn.execute(
+                    "SELECT id, text, status FROM tasks WHERE status = ? ORDER BY id LIMIT ? OFFSET ?",
+                    (status, limit, offset)
+                ).fetchall()
+        return [dict(row) for row in rows]
+
+    def fetch(self, status="pending", limit=None):
+        """取出某个状态的全部 (或前 limit 条) 任务"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, text, status FROM tasks WHERE status = ? ORDER BY id LIMIT ?",
+                (status, -1 if limit is None else limit)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def get_queue(path=QUEUE_PATH):
+    """进程级共享的队列实例"""
+    with _shared_lock:
+        if path not in _shared:
+            _shared[path] = TaskQueue(path)
+        return _shared[path]
@@ -0,0 +1,50 @@
+from combination_engine import ComboGenerator
+
+import pytest
+
+
+def _pool(*sizes):
+    return {f"C{c}": [f"t{c}_{i}" for i in range(n)] for c, n in enumerate(sizes)}
+
+
+def _generator(sizes, strategy, seed=3):
+    return ComboGenerator(_pool(*sizes), categories=[f"C{c}" for c in range(len(sizes))],
+                          strategy=strategy, seed=seed)
+
+
+@pytest.mark.parametrize("strategy", ["round_robin", "min_overlap"])
+@pytest.mark.parametrize("sizes", [(60, 60, 60), (100, 100, 10), (300, 300)])
+def test_take_large_space_returns_n_rows(sizes, strategy):
+    # 组合空间 > 65536，随机重试撞满后仍须沿步长排列继续产出
+    gen = _generator(sizes, strategy)
+    assert gen.space_size > 1 << 16
+    rows = gen.take(20000)
+    assert len(rows) == 20000
+    assert len({tuple(r.values()) for r in rows}) == 20000
+
+
+@pytest.mark.parametrize("strategy", ["round_robin", "min_overlap"])
+def test_rows_exhaust_small_space(strategy):
+    gen = _generator((7, 5, 3), strategy)
+    rows = list(gen.rows())
+    assert len(rows) == gen.space_size == 105
+    assert len({tuple(r.values()) for r in rows}) == 105
+    assert gen.take(1) == []
+
+
+def test_take_across_batches_stays_unique():
+    gen = _generator((40, 40), "round_robin", seed=11)
+    seen = set()
+    for _ in range(4):
+        for row in gen.take(400):
+            key = tuple(row.values())
+            assert key not in seen
+            seen.add(key)
+    assert len(seen) == 1600 == gen.space_size
+
+
+def test_crc32_colliding_words_get_distinct_keys():
+    # "plumless" 与 "buckeroo" 的 crc32 相同；指纹撞上时第二个组合会被当成已发出
+    gen = ComboGenerator({"A": ["plumless", "buckeroo"], "B": ["x"]}, categories=["A", "B"], seed=1)
+    assert gen._key(0, 0) != gen._key(0, 1)
+    assert len(list(gen.rows())) == gen.space_size == 2
@@ -0,0 +1,44 @@
+import asyncio
+
+from usage_ledger import UsageMeter
+
+
+def test_reserve_waits_for_in_flight_instead_of_refusing():
+    async def main():
+        meter = UsageMeter(budget=1000)
+        assert await meter.reserve(600)
+        second = asyncio.ensure_future(meter.reserve(600))
+        await asyncio.sleep(0)
+        assert not second.done()          # 只是在途预占放不下：等待而不是拒绝
+        meter.commit(600, 100, 100)       # 实际只花了 200
+        assert await second
+        assert not meter.exhausted and meter.refused == 0
+        return meter
+
+    meter = asyncio.run(main())
+    assert meter.reserved == 600 and meter.spent == 200
+
+
+def test_reserve_refuses_once_spent_exceeds_budget():
+    async def main():
+        meter = UsageMeter(budget=1000)
+        assert await meter.reserve(300)
+        meter.commit(300, 400, 400)
+        assert not await meter.reserve(300)
+        assert meter.exhausted
+        assert not await meter.reserve(1)     # 用尽后一律拒绝
+        return meter
+
+    assert asyncio.run(main()).refused == 2
+
+
+def test_waiter_resolves_when_in_flight_released():
+    async def main():
+        meter = UsageMeter(budget=500)
+        assert await meter.reserve(400)
+        waiter = asyncio.ensure_future(meter.reserve(400))
+        await asyncio.sleep(0)
+        meter.release(400)
+        return await waiter
+
+    assert asyncio.run(main())
@@ -0,0 +1,226 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+
+# ==========================================
+# 1. 配置
+# ==========================================
+LEDGER_PATH = "data/usage/usage.sqlite3"
+
+# 元 / 百万 tokens (按 DeepSeek 官网价目表的缓存未命中价填写，仅用于估算，以实际账单为准)
+DEFAULT_PRICES = {
+    "deepseek-chat": {"input": 2.0, "output": 8.0},
+    "deepseek-reasoner": {"input": 4.0, "output": 16.0},
+}
+BUDGET_SCOPES = ("batch", "session", "day")
+
+
+def today():
+    return time.strftime("%Y-%m-%d")
+
+
+def cost_of(prompt_tokens, completion_tokens, model, prices=None):
+    """按价目表估算费用 (元)，未知模型按 deepseek-chat 计"""
+    table = prices or DEFAULT_PRICES
+    price = table.get(model) or table.get("deepseek-chat") or {"input": 0.0, "output": 0.0}
+    return (prompt_tokens * price["input"] + completion_tokens * price["output"]) / 1e6
+
+# ==========================================
+# 2. 用量账本 (SQLite)
+# ==========================================
+class UsageLedger:
+    """
+    每次真实 API 调用记一行：{ts, day, session, batch, idx, items, model, prompt_tokens,
+    completion_tokens, estimated, status}。
+    estimated=1 表示服务端没有返回 usage，token 数由 estimate_tokens 估算。
+    单连接 + 锁，可在多个会话线程间共享。
+    """
+
+    def __init__(self, path=LEDGER_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS usage ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT, ts REAL NOT NULL, day TEXT NOT NULL,"
+                " session TEXT, batch TEXT, idx INTEGER, items INTEGER NOT NULL DEFAULT 1, model TEXT,"
+                " prompt_tokens INTEGER NOT NULL, completion_tokens INTEGER NOT NULL,"
+                " estimated INTEGER NOT NULL DEFAULT 0, status TEXT)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_usage_day ON usage(day)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_usage_session ON usage(session)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_usage_batch ON usage(batch)")
+            self._conn.commit()
+
+    def record(self, prompt_tokens, completion_tokens, model=None, session=None, batch=None, idx=None,
+               items=1, estimated=False, status="ok"):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO usage (ts, day, session, batch, idx, items, model, prompt_tokens, completion_tokens,"
+                " estimated, status) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (now, time.strftime("%Y-%m-%d", time.localtime(now)), session, batch, idx, items, model,
+                 int(prompt_tokens), int(completion_tokens), int(bool(estimated)), status)
+            )
+            self._conn.commit()
+
+    def totals(self, day=None, session=None, batch=None, prices=None):
+        """
+        按条件汇总 (条件之间为 AND，都不传时为全部)：
+        {"calls", "items", "prompt_tokens", "completion_tokens", "total_tokens", "estimated_calls", "cost"}
+        """
+        where, args = [], []
+        for column, value in (("day", day), ("session", session), ("batch", batch)):
+            if value is not None:
+                where.append(f"{column} = ?")
+                args.append(value)
+        sql = ("SELECT model, COUNT(*), COALESCE(SUM(items), 0), COALESCE(SUM(prompt_tokens), 0),"
+               " COALESCE(SUM(completion_tokens), 0), COALESCE(SUM(estimated), 0) FROM usage"
+               + (" WHERE " + " AND ".join(where) if where else "") + " GROUP BY model")
+        with self._lock:
+            rows = self._conn.execute(sql, args).fetchall()
+        result = {"calls": 0, "items": 0, "prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0,
+                  "estimated_calls": 0, "cost": 0.0}
+        for model, calls, items, prompt, completion, estimated in rows:
+            result["calls"] += calls
+            result["items"] += items
+            result["prompt_tokens"] += prompt
+            result["completion_tokens"] += completion
+            result["estimated_calls"] += estimated
+            result["cost"] += cost_of(prompt, completion, model, prices)
+        result["total_tokens"] = result["prompt_tokens"] + result["completion_tokens"]
+        return result
+
+    def daily(self, days=7):
+        """最近 days 天每天的 token 数 [{"day", "calls", "prompt_tokens", "completion_tokens"}]"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT day, COUNT(*), SUM(prompt_tokens), SUM(completion_tokens) FROM usage"
+                " GROUP BY day ORDER BY day DESC LIMIT ?", (days,)
+            ).fetchall()
+        return [{"day": d, "calls": c, "prompt_tokens": p, "completion_tokens": o} for d, c, p, o in rows]
+
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def get_ledger(path=LEDGER_PATH):
+    """进程级共享的用量账本"""
+    with _shared_lock:
+        if path not in _shared:
+            _shared[path] = UsageLedger(path)
+        return _shared[path]
+
+# ==========================================
+# 3. 单批计量 + 预算
+# ==========================================
+class UsageMeter:
+    """
+    一次批量生成的计量器 (传给 generation_engine 的 meter 参数)：
+    - await reserve(est) 在请求前按预估 token 占用额度：已花费 + est 超出 budget 时返回 False，
+      该请求不再发出，且本批后续请求一律拒绝 (不会出现预算用尽后又零星放行的情况)；
+      只是加上在途请求的预占才超出时不拒绝，等在途请求 commit / release 之后再判断；
+    - commit(...) 在请求结束 (含被取消) 后释放预占、按实际 usage 记账；release(est) 只释放 (没有产生用量时)。
+    budget 为 token 上限 (0 / None 不限)，scope 决定与哪部分历史用量合并计算：
+    batch 只算本批，session 加上本会话之前的用量，day 加上今天全部会话的用量。
+    """
+
+    def __init__(self, ledger=None, session=None, batch=None, budget=None, scope="batch", model=None):
+        if scope not in BUDGET_SCOPES:
+            raise ValueError(f"Unknown budget scope: {scope}")
+        self.ledger = ledger
+        self.session = session
+        self.batch = batch
+        self.budget = int(budget or 0)
+        self.scope = scope
+        self.model = model
+        self._lock = threading.Lock()
+        self.base = 0
+        if self.budget and ledger is not None and scope != "batch":
+            past = ledger.totals(day=today()) if scope == "day" else ledger.totals(session=session)
+            self.base = past["total_tokens"]
+        self.reserved = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.calls = 0
+        self.refused = 0
+        self.exhausted = False
+        self._waiters = []    # 等在途预占结算的 (事件循环, future)
+
+    @property
+    def spent(self):
+        return self.base + self.prompt_tokens + self.completion_tokens
+
+    def remaining(self):
+        """预算剩余 token (不限时为 None)"""
+        return max(0, self.budget - self.spent - self.reserved) if self.budget else None
+
+    def _try_reserve(self, est_tokens):
+        """True 已占用，False 预算用尽，None 表示只是在途预占放不下 (须在锁内调用)"""
+        if self.budget and not self.exhausted and self.spent + est_tokens > self.budget:
+            self.exhausted = True
+        if self.exhausted:
+            self.refused += 1
+            return False
+        if self.budget and self.spent + self.reserved + est_tokens > self.budget:
+            return None
+        self.reserved += est_tokens
+        return True
+
+    async def reserve(self, est_tokens):
+        while True:
+            with self._lock:
+                ok = self._try_reserve(est_tokens)
+                if ok is not None:
+                    return ok
+                loop = asyncio.get_running_loop()
+                waiter = loop.create_future()
+                self._waiters.append((loop, waiter))
+            await waiter
+
+    def _wake(self):
+        """有预占结算后唤醒等待者重新判断 (须在锁内调用)；在途预占清零时必有结论，不会一直等"""
+        waiters, self._waiters = self._waiters, []
+        for loop, waiter in waiters:
+            try:
+                loop.call_soon_threadsafe(_resolve, waiter)
+            except RuntimeError:    # 等待者所在的事件循环已关闭
+                pass
+
+    def release(self, est_tokens):
+        with self._lock:
+            self.reserved = max(0, self.reserved - est_tokens)
+            self._wake()
+
+    def commit(self, est_tokens, prompt_tokens, completion_tokens, estimated=False, idx=None, items=1,
+               model=None, status="ok"):
+        with self._lock:
+            self.reserved = max(0, self.reserved - est_tokens)
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+            self.calls += 1
+            self._wake()
+        if self.ledger is not None:
+            self.ledger.record(prompt_tokens, completion_tokens, model=model or self.model, session=self.session,
+                               batch=self.batch, idx=idx, items=items, estimated=estimated, status=status)
+
+    def summary(self, prices=None):
+        """{"calls", "refused", "prompt_tokens", "completion_tokens", "total_tokens", "cost", "budget", "spent"}"""
+        with self._lock:
+            prompt, completion = self.prompt_tokens, self.completion_tokens
+            result = {"calls": self.calls, "refused": self.refused, "prompt_tokens": prompt,
+                      "completion_tokens": completion, "total_tokens": prompt + completion,
+                      "budget": self.budget, "scope": self.scope, "spent": self.spent}
+        result["cost"] = cost_of(prompt, completion, self.model, prices)
+        return result
+
+
+def _resolve(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
@@ -0,0 +1,166 @@
+"""
+词库二进制快照：把 WAREHOUSE 全部类目编译成一个可 mmap 的文件，冷启动时免去逐行解析。
+
+    python vocab_snapshot.py            # 手动构建 (平时由 vocab_store 在源文件变化后自动重建)
+
+文件布局 (小端)：
+    b"KVSNAP01" | uint32 头长度 | JSON 头 | 补齐到 4 字节 | uint32 偏移表 (N+1) | UTF-8 字符串池
+JSON 头记录每个源文件的签名 (mtime_ns/size，含增量日志) 与各类目在偏移表中的区间；
+第 i 个词占字符串池 [off[i], off[i+1] - 1)，末尾的 1 字节是换行分隔符，
+因此整个类目可以一次 decode + split 取出。
+"""
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+
+MAGIC = b"KVSNAP01"
+SNAPSHOT_PATH = "data/cache/vocab.snapshot"
+
+_LEN = struct.Struct("<I")
+
+# ==========================================
+# 1. 构建
+# ==========================================
+def _normalize_sources(sources):
+    """签名统一成 JSON 形式 (tuple -> list)，便于与文件头比较"""
+    return json.loads(json.dumps(sources))
+
+
+def write_snapshot(path, categories, sources):
+    """
+    categories: {类目: [词]}，sources: {源文件路径: 签名}。
+    写临时文件后 os.replace，正在 mmap 旧快照的进程不受影响。
+    """
+    offsets = array("I", [0])
+    pool = bytearray()
+    layout = {}
+    for cat, words in categories.items():
+        layout[cat] = [len(offsets) - 1, len(words)]
+        for word in words:
+            pool += word.encode("utf-8") + b"\n"
+            offsets.append(len(pool))
+    if sys.byteorder != "little":
+        offsets.byteswap()
+
+    header = json.dumps({
+        "sources": _normalize_sources(sources),
+        "categories": layout,
+        "terms": len(offsets) - 1,
+    }, ensure_ascii=False).encode("utf-8")
+    pad = -(len(MAGIC) + _LEN.size + len(header)) % 4
+
+    folder = os.path.dirname(path) or "."
+    os.makedirs(folder, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=folder, prefix=".tmp_", suffix=".snapshot")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(MAGIC + _LEN.pack(len(header)) + header + b"\0" * pad)
+            f.write(offsets.tobytes())
+            f.write(pool)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+# ==========================================
+# 2. 读取
+# ==========================================
+class VocabSnapshot:
+    """
+    只读快照。打开时只解析很小的 JSON 头；偏移表直接映射为 memoryview，
+    词条按需从字符串池解码。
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if self._mm[:len(MAGIC)] != MAGIC:
+                raise ValueError(f"Not a vocabulary snapshot: {path}")
+            start = len(MAGIC) + _LEN.size
+            (header_len,) = _LEN.unpack_from(self._mm, len(MAGIC))
+            header = json.loads(self._mm[start:start + header_len].decode("utf-8"))
+            self.sources = header["sources"]
+            self.layout = {cat: tuple(span) for cat, span in header["categories"].items()}
+
+            off_start = start + header_len + (-(start + header_len) % 4)
+            off_end = off_start + (header["terms"] + 1) * 4
+            raw = memoryview(self._mm)[off_start:off_end]
+            if sys.byteorder == "little":
+                self._offsets = raw.cast("I")
+            else:
+                self._offsets = array("I", raw.tobytes())
+                self._offsets.byteswap()
+                raw.release()
+            self._pool_start = off_end
+        except Exception:
+            self.close()
+            raise
+
+    def close(self):
+        offsets = getattr(self, "_offsets", None)
+        if isinstance(offsets, memoryview):
+            offsets.release()
+        self._mm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def counts(self):
+        """{类目: 词数}，只读文件头"""
+        return {cat: span[1] for cat, span in self.layout.items()}
+
+    def category(self, cat):
+        """整个类目一次解码，返回 tuple"""
+        first, count = self.layout.get(cat, (0, 0))
+        if not count:
+            return ()
+        lo = self._pool_start + self._offsets[first]
+        hi = self._pool_start + self._offsets[first + count]
+        return tuple(self._mm[lo:hi - 1].decode("utf-8").split("\n"))
+
+    def term(self, cat, i):
+        """随机读取单个词"""
+        first, count = self.layout[cat]
+        if not 0 <= i < count:
+            raise IndexError(i)
+        lo = self._pool_start + self._offsets[first + i]
+        hi = self._pool_start + self._offsets[first + i + 1]
+        return self._mm[lo:hi - 1].decode("utf-8")
+
+
+def open_snapshot(path, sources):
+    """快照存在且源文件签名一致时返回 VocabSnapshot，否则 (缺失/过期/损坏) 返回 None"""
+    try:
+        snap = VocabSnapshot(path)
+    except (OSError, ValueError, KeyError, struct.error):
+        return None
+    if snap.sources != _normalize_sources(sources):
+        snap.close()
+        return None
+    return snap
+
+# ==========================================
+# 3. 命令行构建
+# ==========================================
+def main():
+    import vocab_store
+    vocab_store.invalidate()
+    vocab_store.get_vocab()   # 签名不一致时自动重建
+    with VocabSnapshot(SNAPSHOT_PATH) as snap:
+        counts = snap.counts()
+    print(f"{SNAPSHOT_PATH}: {len(counts)} categories, {sum(counts.values())} terms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,318 @@
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from types import MappingProxyType
+
+import vocab_snapshot
+
+try:
+    import fcntl
+except ImportError:
+    # Windows 下没有 fcntl，跨进程锁退化为进程内锁
+    fcntl = None
+
+# ==========================================
+# 1. 本地仓库映射 (已移除 Text Studio 相关路径)
+# ==========================================
+WAREHOUSE = {
+    # --- Graphic Core ---
+    "Subject":       "data/graphic/subjects.txt",
+    "Action":        "data/graphic/actions.txt",
+    "Lighting":        "data/graphic/lighting.txt",
+    "LensLanguage":     "data/graphic/lens_language.txt",
+
+    # --- Style Matrix ---
+    "Reference":   "data/graphic/styles_reference.txt",
+    "Color":         "data/graphic/styles_color.txt",
+    "Scene":       "data/graphic/styles_scene.txt",
+    "Composition":   "data/graphic/styles_composition.txt",
+    "Elements":        "data/graphic/styles_elements.txt",
+    "LookLike":        "data/graphic/styles_lookLike.txt",
+
+    # --- Atmosphere ---
+    "Mood":          "data/common/moods.txt",
+    "Usage":         "data/common/usage.txt"
+}
+
+# 路径 -> 类目 (保存时按路径反查，不再线性扫描 WAREHOUSE)
+PATH_TO_KEY = {path: key for key, path in WAREHOUSE.items()}
+
+# ==========================================
+# 2. 文件读取
+# ==========================================
+def read_local_file(filepath):
+    """直接读取本地 txt 文件"""
+    if os.path.exists(filepath):
+        try:
+            with open(filepath, "r", encoding="utf-8") as f:
+                return [line.strip() for line in f.readlines() if line.strip()]
+        except:
+            return []
+    return []
+
+# ==========================================
+# 3. 增量日志 (journal)
+# ==========================================
+# 每个词库文件旁有一个 <file>.journal，按行记录 add / remove / rename 操作。
+# 读取时 = 基础文件 + 回放日志；日志过长时压缩：写临时文件 -> fsync -> os.replace
+# 原子替换基础文件，再删除日志。所有操作都是幂等的，压缩中途崩溃导致日志被
+# 重复回放也不会改变结果。
+JOURNAL_SUFFIX = ".journal"
+COMPACT_AFTER_BYTES = 64 * 1024
+
+_write_lock = threading.Lock()
+
+
+def journal_path(path):
+    return path + JOURNAL_SUFFIX
+
+
+@contextmanager
+def _file_lock(path):
+    """同一词库文件的写锁：进程内用线程锁，进程间用 flock"""
+    with _write_lock:
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path + ".lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _apply_op(words, op):
+    """在 list 上原地回放一条日志操作"""
+    kind = op.get("op")
+    if kind == "add":
+        if op["term"] not in words:
+            words.append(op["term"])
+    elif kind == "remove":
+        words[:] = [w for w in words if w != op["term"]]
+    elif kind == "rename":
+        old, new = op["old"], op["new"]
+        if old in words:
+            if new in words:
+                words[:] = [w for w in words if w != old]
+            else:
+                words[:] = [new if w == old else w for w in words]
+
+
+def _replay(path):
+    """基础文件 + 日志回放后的完整词表 (读取失败直接抛出，避免压缩时写回残缺数据)"""
+    words = []
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            words = [line.strip() for line in f if line.strip()]
+    jpath = journal_path(path)
+    if os.path.exists(jpath):
+        with open(jpath, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    op = json.loads(line)
+                except ValueError:
+                    continue   # 崩溃时写了一半的最后一行
+                _apply_op(words, op)
+    return words
+
+
+def _atomic_write(path, words):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=".tmp_", suffix=".txt")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write("\n".join(words))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def _compact_locked(path):
+    _atomic_write(path, _replay(path))
+    jpath = journal_path(path)
+    if os.path.exists(jpath):
+        os.remove(jpath)
+
+
+def append_ops(path, ops):
+    """追加日志操作 (O(操作数) 的写入)，日志超过阈值时自动压缩"""
+    ops = list(ops)
+    if not ops:
+        return
+    with _file_lock(path):
+        jpath = journal_path(path)
+        with open(jpath, "a", encoding="utf-8") as f:
+            for op in ops:
+                f.write(json.dumps(op, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.getsize(jpath) > COMPACT_AFTER_BYTES:
+            _compact_locked(path)
+    invalidate(path)
+
+
+def compact(path):
+    """把日志合并进基础文件 (原子替换)"""
+    with _file_lock(path):
+        _compact_locked(path)
+    invalidate(path)
+
+
+def replace_all(path, words):
+    """整表覆盖写入 (原子替换，并丢弃旧日志)"""
+    with _file_lock(path):
+        _atomic_write(path, words)
+        jpath = journal_path(path)
+        if os.path.exists(jpath):
+            os.remove(jpath)
+    invalidate(path)
+
+
+def add_terms(path, terms):
+    append_ops(path, ({"op": "add", "term": t} for t in terms))
+
+
+def remove_terms(path, terms):
+    append_ops(path, ({"op": "remove", "term": t} for t in terms))
+
+
+def rename_term(path, old, new):
+    append_ops(path, [{"op": "rename", "old": old, "new": new}])
+
+
+def save_list(path, new_list):
+    """
+    保存整张词表：若新表恰好等于 "旧表删掉若干词 + 末尾追加若干词"，
+    只写入对应的增量日志；否则 (例如调整了顺序) 原子整表重写。
+    """
+    old = list(load_category(path))
+    new_set = set(new_list)
+    old_set = set(old)
+    removed = [w for w in dict.fromkeys(old) if w not in new_set]
+    added = [w for w in dict.fromkeys(new_list) if w not in old_set]
+    expected = [w for w in old if w in new_set] + added
+    if expected == list(new_list):
+        append_ops(path, [{"op": "remove", "term": w} for w in removed] +
+                         [{"op": "add", "term": w} for w in added])
+    else:
+        replace_all(path, new_list)
+
+# ==========================================
+# 4. 进程级共享词库 (按 mtime/size 失效)
+# ==========================================
+# 所有会话共用同一份解析结果：每个文件在进程内只解析一次，
+# 基础文件或日志的 mtime / size 变化后才重新读取。
+# 冷启动时优先从二进制快照 (vocab_snapshot) 读取，源文件有变化时自动重建快照。
+_lock = threading.Lock()
+_files = {}        # path -> (signature, tuple(words))
+_snapshot = None   # (signatures, MappingProxyType)
+_mapped = None     # (signatures, VocabSnapshot)
+
+
+def _stat(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def _signature(path):
+    """基础文件 + 日志的联合签名，两者都不存在时为 None"""
+    base, journal = _stat(path), _stat(journal_path(path))
+    if base is None and journal is None:
+        return None
+    return (base, journal)
+
+
+def load_category(path):
+    """读取单个词库文件，返回不可变的 tuple (命中缓存时不触碰文件内容)"""
+    sig = _signature(path)
+    with _lock:
+        cached = _files.get(path)
+    if cached is not None and cached[0] == sig:
+        return cached[1]
+
+    try:
+        words = tuple(_replay(path)) if sig else ()
+    except (OSError, UnicodeDecodeError):
+        words = ()
+    with _lock:
+        _files[path] = (sig, words)
+    return words
+
+
+def get_vocab():
+    """
+    返回全部类目的只读视图 {类目: tuple(词)}。
+    文件未变化时，所有会话拿到的是同一个对象，内存不随会话数增长。
+    """
+    global _snapshot
+    sigs = tuple(_signature(p) for p in WAREHOUSE.values())
+    snap = _snapshot
+    if snap is not None and snap[0] == sigs:
+        return snap[1]
+
+    mapped = _open_mapped(sigs)
+    if mapped is not None:
+        data = {key: mapped.category(key) for key in WAREHOUSE}
+        with _lock:
+            for (key, path), sig in zip(WAREHOUSE.items(), sigs):
+                _files[path] = (sig, data[key])
+    else:
+        data = {key: load_category(path) for key, path in WAREHOUSE.items()}
+        _rebuild_snapshot(sigs, data)
+
+    view = MappingProxyType(data)
+    with _lock:
+        _snapshot = (sigs, view)
+    return view
+
+
+def get_counts():
+    """{类目: 词数}：快照有效时只读文件头，不解码任何词条"""
+    sigs = tuple(_signature(p) for p in WAREHOUSE.values())
+    snap = _open_mapped(sigs)
+    if snap is not None:
+        return snap.counts()
+    return {key: len(words) for key, words in get_vocab().items()}
+
+
+def _open_mapped(sigs):
+    """返回与当前源文件签名一致的已映射快照 (进程内复用同一个 mmap)"""
+    global _mapped
+    mapped = _mapped
+    if mapped is not None and mapped[0] == sigs:
+        return mapped[1]
+    snap = vocab_snapshot.open_snapshot(vocab_snapshot.SNAPSHOT_PATH, dict(zip(WAREHOUSE.values(), sigs)))
+    with _lock:
+        _mapped = (sigs, snap) if snap is not None else None
+    # 旧的 mmap 不主动 close：其他线程可能仍在读，交给 GC 回收
+    return snap
+
+
+def _rebuild_snapshot(sigs, data):
+    try:
+        vocab_snapshot.write_snapshot(vocab_snapshot.SNAPSHOT_PATH, data, dict(zip(WAREHOUSE.values(), sigs)))
+    except OSError:
+        pass   # 只读目录等情况下退回文本解析，不影响使用
+
+
+def invalidate(path=None):
+    """丢弃缓存 (path 为空时清空全部)，下次读取强制重新解析"""
+    global _snapshot, _mapped
+    with _lock:
+        if path is None:
+            _files.clear()
+        else:
+            _files.pop(path, None)
+        _snapshot = None
+        _mapped = None